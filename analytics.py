@@ -0,0 +1,323 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+from timestamps import epoch_sql
+
+# Daily rollups of customers and purchases.  Triggers keep them current on
+# every insert, update and delete of the base tables, so reports read one
+# row per day (or per day and product) however many visits there are.
+# Days are the UTC dates of the stored datetime('now') values.
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS daily_visits (
+        day TEXT PRIMARY KEY,
+        visits INTEGER NOT NULL DEFAULT 0,
+        exits INTEGER NOT NULL DEFAULT 0,
+        dwell_seconds INTEGER NOT NULL DEFAULT 0,
+        buyers INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS hourly_footfall (
+        day TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        entries INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, hour)
+    );
+    CREATE TABLE IF NOT EXISTS daily_product_sales (
+        day TEXT NOT NULL,
+        product_id TEXT NOT NULL,
+        product_name TEXT,
+        orders INTEGER NOT NULL DEFAULT 0,
+        units INTEGER NOT NULL DEFAULT 0,
+        revenue REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, product_id)
+    );
+    -- Holds a row while deletes must leave the rollups alone; see rollups_held()
+    CREATE TABLE IF NOT EXISTS rollup_hold (held INTEGER);
+"""
+
+ROLLUP_TABLES = ('daily_visits', 'hourly_footfall', 'daily_product_sales')
+
+
+def visit_delta(row, sign):
+    """Statements adding (sign 1) or removing (sign -1) one customers row from the rollups"""
+    dwell = f"{epoch_sql(row + '.exit_time')} - {epoch_sql(row + '.entry_time')}"
+    return f"""
+        INSERT INTO daily_visits (day, visits, exits, dwell_seconds, buyers)
+        SELECT date({row}.entry_time), {sign},
+               {sign} * ({epoch_sql(row + '.exit_time')} IS NOT NULL),
+               {sign} * COALESCE({dwell}, 0),
+               {sign} * EXISTS (SELECT 1 FROM purchases p WHERE p.customer_id = {row}.customer_id)
+        WHERE date({row}.entry_time) IS NOT NULL
+        ON CONFLICT(day) DO UPDATE SET
+            visits = visits + excluded.visits,
+            exits = exits + excluded.exits,
+            dwell_seconds = dwell_seconds + excluded.dwell_seconds,
+            buyers = buyers + excluded.buyers;
+        INSERT INTO hourly_footfall (day, hour, entries)
+        SELECT date({row}.entry_time), CAST(strftime('%H', {row}.entry_time) AS INTEGER), {sign}
+        WHERE date({row}.entry_time) IS NOT NULL
+        ON CONFLICT(day, hour) DO UPDATE SET entries = entries + excluded.entries;
+    """
+
+
+def sale_delta(row, sign):
+    """Statements adding or removing one purchases row from the product rollup"""
+    quantity = f"COALESCE({row}.quantity, 1)"
+    return f"""
+        INSERT INTO daily_product_sales (day, product_id, product_name, orders, units, revenue)
+        SELECT date({row}.purchase_time), {row}.product_id, {row}.product_name, {sign},
+               {sign} * {quantity}, {sign} * COALESCE({row}.product_price, 0) * {quantity}
+        WHERE date({row}.purchase_time) IS NOT NULL AND {row}.product_id IS NOT NULL
+        ON CONFLICT(day, product_id) DO UPDATE SET
+            product_name = COALESCE(excluded.product_name, product_name),
+            orders = orders + excluded.orders,
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue;
+    """
+
+
+def buyer_delta(row, sign):
+    """Statement counting a visit as converted on its first purchase, and back on its last"""
+    others = f"p.customer_id = {row}.customer_id"
+    if sign > 0:
+        others += f" AND p.purchase_id <> {row}.purchase_id"
+    return f"""
+        UPDATE daily_visits SET buyers = buyers + {sign}
+        WHERE day = (SELECT date(entry_time) FROM customers WHERE customer_id = {row}.customer_id)
+          AND NOT EXISTS (SELECT 1 FROM purchases p WHERE {others});
+    """
+
+
+TRIGGERS = f"""
+    CREATE TRIGGER IF NOT EXISTS customers_rollup_insert AFTER INSERT ON customers BEGIN
+        {visit_delta('new', 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS customers_rollup_update
+    AFTER UPDATE OF entry_time, exit_time ON customers BEGIN
+        {visit_delta('old', -1)}
+        {visit_delta('new', 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS customers_rollup_delete AFTER DELETE ON customers
+    WHEN NOT EXISTS (SELECT 1 FROM rollup_hold) BEGIN
+        {visit_delta('old', -1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS purchases_rollup_insert AFTER INSERT ON purchases BEGIN
+        {sale_delta('new', 1)}
+        {buyer_delta('new', 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS purchases_rollup_update
+    AFTER UPDATE OF purchase_time, product_id, product_price, quantity ON purchases BEGIN
+        {sale_delta('old', -1)}
+        {sale_delta('new', 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS purchases_rollup_move
+    AFTER UPDATE OF customer_id ON purchases WHEN old.customer_id IS NOT new.customer_id BEGIN
+        {buyer_delta('old', -1)}
+        {buyer_delta('new', 1)}
+    END;
+    CREATE TRIGGER IF NOT EXISTS purchases_rollup_delete AFTER DELETE ON purchases
+    WHEN NOT EXISTS (SELECT 1 FROM rollup_hold) BEGIN
+        {sale_delta('old', -1)}
+        {buyer_delta('old', -1)}
+    END;
+"""
+
+
+def setup_analytics(conn):
+    """Create the rollup tables and their triggers, backfilling them the first time.
+
+    Needs the purchases.quantity column, so run it after setup_checkout_tables.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'daily_visits'")
+    exists = cursor.fetchone() is not None
+    conn.executescript(SCHEMA)
+    # Delete triggers from before the hold existed are replaced
+    conn.executescript("""
+        DROP TRIGGER IF EXISTS customers_rollup_delete;
+        DROP TRIGGER IF EXISTS purchases_rollup_delete;
+    """)
+    conn.executescript(TRIGGERS)
+    if not exists:
+        rebuild_rollups(conn)
+    conn.commit()
+
+
+@contextmanager
+def rollups_held(conn):
+    """Leave the rollups unchanged by rows deleted inside the block.
+
+    Used when visits move to the archive: they still happened, so reports
+    keep counting them.  Run it inside the caller's write transaction.
+    """
+    conn.execute("INSERT INTO rollup_hold (held) VALUES (1)")
+    try:
+        yield
+    finally:
+        conn.execute("DELETE FROM rollup_hold")
+
+
+def subtract_from_rollups(conn, schema, where, params=()):
+    """Take the visits of ``schema`` matching ``where``, and their purchases, out of the rollups.
+
+    For rows about to be deleted from a database without rollup triggers,
+    such as the archive.  ``where`` filters ``{schema}.customers``.  Runs
+    inside the caller's write transaction, before the delete.
+    """
+    visits = f"FROM {schema}.customers c WHERE ({where}) AND date(c.entry_time) IS NOT NULL"
+    bought = f"EXISTS (SELECT 1 FROM {schema}.purchases p WHERE p.customer_id = c.customer_id)"
+    conn.execute(f"""
+        INSERT INTO daily_visits (day, visits, exits, dwell_seconds, buyers)
+        SELECT date(c.entry_time), -COUNT(*),
+               -SUM({epoch_sql('c.exit_time')} IS NOT NULL),
+               -SUM(COALESCE({epoch_sql('c.exit_time')} - {epoch_sql('c.entry_time')}, 0)),
+               -SUM({bought})
+        {visits}
+        GROUP BY 1
+        ON CONFLICT(day) DO UPDATE SET
+            visits = visits + excluded.visits,
+            exits = exits + excluded.exits,
+            dwell_seconds = dwell_seconds + excluded.dwell_seconds,
+            buyers = buyers + excluded.buyers
+    """, params)
+    conn.execute(f"""
+        INSERT INTO hourly_footfall (day, hour, entries)
+        SELECT date(c.entry_time), CAST(strftime('%H', c.entry_time) AS INTEGER), -COUNT(*)
+        {visits}
+        GROUP BY 1, 2
+        ON CONFLICT(day, hour) DO UPDATE SET entries = entries + excluded.entries
+    """, params)
+    conn.execute(f"""
+        INSERT INTO daily_product_sales (day, product_id, product_name, orders, units, revenue)
+        SELECT date(purchase_time), product_id, NULL, -COUNT(*),
+               -SUM(COALESCE(quantity, 1)),
+               -SUM(COALESCE(product_price, 0) * COALESCE(quantity, 1))
+        FROM {schema}.purchases
+        WHERE customer_id IN (SELECT c.customer_id FROM {schema}.customers c WHERE {where})
+          AND date(purchase_time) IS NOT NULL AND product_id IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT(day, product_id) DO UPDATE SET
+            orders = orders + excluded.orders,
+            units = units + excluded.units,
+            revenue = revenue + excluded.revenue
+    """, params)
+
+
+def _union(table, columns, schemas):
+    if len(schemas) == 1:
+        return f"{schemas[0]}.{table}"
+    return "(" + " UNION ALL ".join(f"SELECT {columns} FROM {schema}.{table}" for schema in schemas) + ")"
+
+
+def rebuild_rollups(conn, schemas=('main',)):
+    """Recompute every rollup from the base tables in one pass each.
+
+    ``schemas`` names every attached database holding customers and
+    purchases rows, e.g. ('main', 'archive') once visits have been archived.
+    """
+    for table in ROLLUP_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+    customers = _union('customers', 'customer_id, entry_time, exit_time', schemas)
+    purchases = _union('purchases', 'product_id, product_name, product_price, quantity, purchase_time', schemas)
+    bought = " OR ".join(f"EXISTS (SELECT 1 FROM {schema}.purchases p WHERE p.customer_id = c.customer_id)"
+                         for schema in schemas)
+    conn.execute(f"""
+        INSERT INTO daily_visits (day, visits, exits, dwell_seconds, buyers)
+        SELECT date(entry_time), COUNT(*),
+               SUM({epoch_sql('exit_time')} IS NOT NULL),
+               SUM(COALESCE({epoch_sql('exit_time')} - {epoch_sql('entry_time')}, 0)),
+               SUM({bought})
+        FROM {customers} c
+        WHERE date(entry_time) IS NOT NULL
+        GROUP BY date(entry_time)
+    """)
+    conn.execute(f"""
+        INSERT INTO hourly_footfall (day, hour, entries)
+        SELECT date(entry_time), CAST(strftime('%H', entry_time) AS INTEGER), COUNT(*)
+        FROM {customers}
+        WHERE date(entry_time) IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    conn.execute(f"""
+        INSERT INTO daily_product_sales (day, product_id, product_name, orders, units, revenue)
+        SELECT date(purchase_time), product_id, MAX(product_name), COUNT(*),
+               SUM(COALESCE(quantity, 1)),
+               SUM(COALESCE(product_price, 0) * COALESCE(quantity, 1))
+        FROM {purchases}
+        WHERE date(purchase_time) IS NOT NULL AND product_id IS NOT NULL
+        GROUP BY 1, 2
+    """)
+    conn.commit()
+
+
+def _period(since):
+    return ("WHERE day >= ?", (since,)) if since else ("", ())
+
+
+def daily_report(conn, since=None):
+    """Return per-day columns as NumPy arrays plus totals over the period.
+
+    ``since`` is an inclusive 'YYYY-MM-DD' day.  Dwell is averaged over
+    visits that have ended; conversion is buying visits over all visits.
+    """
+    where, params = _period(since)
+    rows = conn.execute(f"""
+        SELECT day, visits, exits, dwell_seconds, buyers
+        FROM daily_visits {where} ORDER BY day
+    """, params).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * 5
+    days = np.array(columns[0], dtype='datetime64[D]')
+    visits, exits, dwell, buyers = (np.array(column, dtype=np.int64) for column in columns[1:])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_dwell = np.where(exits > 0, dwell / np.maximum(exits, 1) / 60, np.nan)
+        conversion = np.where(visits > 0, buyers / np.maximum(visits, 1), np.nan)
+    total_visits, total_exits = int(visits.sum()), int(exits.sum())
+    return {
+        'days': days,
+        'visits': visits,
+        'exits': exits,
+        'buyers': buyers,
+        'avg_dwell_minutes': avg_dwell,
+        'conversion': conversion,
+        'total_visits': total_visits,
+        'total_buyers': int(buyers.sum()),
+        'avg_dwell_minutes_total': dwell.sum() / total_exits / 60 if total_exits else float('nan'),
+        'conversion_total': buyers.sum() / total_visits if total_visits else float('nan'),
+    }
+
+
+def peak_hours(conn, since=None):
+    """Return (entries per hour of day, mean entries per hour per day) as 24-element arrays"""
+    where, params = _period(since)
+    rows = conn.execute(f"""
+        SELECT hour, SUM(entries) FROM hourly_footfall {where} GROUP BY hour
+    """, params).fetchall()
+    totals = np.zeros(24, dtype=np.int64)
+    if rows:
+        hours, entries = (np.array(column, dtype=np.int64) for column in zip(*rows))
+        np.add.at(totals, hours, entries)
+    days = conn.execute(f"SELECT COUNT(DISTINCT day) FROM hourly_footfall {where}", params).fetchone()[0]
+    return totals, totals / max(days, 1)
+
+
+def product_report(conn, since=None):
+    """Return per-product sales over the period, best sellers by revenue first.
+
+    Each row is (product_id, product_name, orders, units, revenue,
+    conversion) where conversion is orders over all visits in the period.
+    """
+    where, params = _period(since)
+    rows = conn.execute(f"""
+        SELECT product_id, MAX(product_name), SUM(orders), SUM(units), SUM(revenue)
+        FROM daily_product_sales {where}
+        GROUP BY product_id
+        HAVING SUM(orders) > 0
+        ORDER BY SUM(revenue) DESC
+    """, params).fetchall()
+    visits = conn.execute(f"SELECT COALESCE(SUM(visits), 0) FROM daily_visits {where}", params).fetchone()[0]
+    if not rows:
+        return []
+    orders = np.array([row[2] for row in rows], dtype=np.float64)
+    conversion = orders / visits if visits else np.full(len(rows), np.nan)
+    return [row + (float(rate),) for row, rate in zip(rows, conversion)]
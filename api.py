@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from analytics import daily_report, peak_hours
+from retention import total_visits_sql
+
+# Loopback only by default; bind the shop LAN address to serve the POS and tablets
+API_HOST = '127.0.0.1'
+API_PORT = 8765
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class ApiServer:
+    """Read-only JSON API for other systems in the shop, on its own asyncio loop.
+
+    Endpoints answer from ``state()``, a snapshot of in-memory state that the
+    dashboard republishes every second (occupancy, gallery and pipeline
+    metrics), or from the read-only connections of ``pool``, which run on a
+    small thread pool so a query never blocks the loop.  Every response is
+    cached for its endpoint's TTL, and concurrent requests for an expired
+    entry share one computation.  Connections are kept alive (HTTP/1.1)
+    until ``idle_timeout`` seconds pass without a request.
+
+    Endpoints: /health, /occupancy, /metrics, /customers?name=,
+    /footfall/today and /sales/recent?limit=.
+    """
+
+    def __init__(self, pool, state=dict, host=API_HOST, port=API_PORT, cache=True, idle_timeout=15.0):
+        self.pool = pool
+        self.state = state
+        self.host = host
+        self.port = port
+        self.cache_enabled = cache
+        self.idle_timeout = idle_timeout
+        # path -> (handler, seconds a response stays fresh)
+        self.routes = {
+            '/health': (self.health, 0),
+            '/occupancy': (self.occupancy, 1),
+            '/metrics': (self.metrics, 1),
+            '/customers': (self.customer, 2),
+            '/footfall/today': (self.footfall_today, 5),
+            '/sales/recent': (self.recent_sales, 2),
+        }
+        self.cache = {}
+        self.inflight = {}
+        self.stats = {'requests': 0, 'cache_hits': 0, 'not_modified': 0, 'errors': 0, 'connections': 0}
+        self.executor = ThreadPoolExecutor(max_workers=pool.max_readers if pool else 1,
+                                           thread_name_prefix="ApiReader")
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Serve on a background thread; returns once the port is bound"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            try:
+                self.server = self.loop.run_until_complete(
+                    asyncio.start_server(self.handle_connection, self.host, self.port))
+                self.port = self.server.sockets[0].getsockname()[1]
+            except OSError as e:
+                errors.append(e)
+                started.set()
+                return
+            started.set()
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="ApiServer", daemon=True)
+        self.thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        return self
+
+    def close(self):
+        if self.loop is not None and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop)
+            self.thread.join(5)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def shutdown(self):
+        """Stop accepting, drop open connections, then stop the loop"""
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+    async def handle_connection(self, reader, writer):
+        self.stats['connections'] += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.idle_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    return
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    await self.respond(writer, 400, {'error': 'malformed request line'}, keep_alive=False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    key, _, value = line.partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                if headers.get('content-length'):
+                    await reader.readexactly(int(headers['content-length']))
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                await self.handle_request(writer, method, target, headers, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.CancelledError):
+            # Cancelled by shutdown; ending quietly keeps the stream callback from logging it
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, writer, method, target, headers, keep_alive):
+        self.stats['requests'] += 1
+        if method not in ('GET', 'HEAD'):
+            await self.respond(writer, 405, {'error': 'read-only API'}, keep_alive)
+            return
+        url = urlsplit(target)
+        route = self.routes.get(url.path.rstrip('/') or '/')
+        if route is None:
+            await self.respond(writer, 404, {'error': f'no endpoint {url.path}',
+                                             'endpoints': sorted(self.routes)}, keep_alive)
+            return
+        handler, ttl = route
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            body, etag = await self.cached(url.path + '?' + url.query, handler, query, ttl)
+        except ValueError as e:
+            await self.respond(writer, 400, {'error': str(e)}, keep_alive)
+            return
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"API error on {target}: {e}")
+            await self.respond(writer, 500, {'error': 'internal error'}, keep_alive)
+            return
+        if headers.get('if-none-match') == etag:
+            self.stats['not_modified'] += 1
+            await self.send(writer, 304, b'', etag, ttl, keep_alive)
+        else:
+            await self.send(writer, 200, b'' if method == 'HEAD' else body, etag, ttl, keep_alive,
+                            len(body))
+
+    async def cached(self, key, handler, query, ttl):
+        """Return (body, etag), computing the response at most once per TTL"""
+        now = time.monotonic()
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] > now:
+            self.stats['cache_hits'] += 1
+            return entry[1], entry[2]
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.stats['cache_hits'] += 1
+            return await asyncio.shield(pending)
+
+        async def compute():
+            result = handler(query)
+            if asyncio.iscoroutine(result):
+                result = await result
+            body = json.dumps(result, default=str, separators=(',', ':')).encode('utf-8')
+            etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+            if self.cache_enabled and ttl:
+                self.cache[key] = (time.monotonic() + ttl, body, etag)
+                if len(self.cache) > 1024:
+                    self.cache = {k: v for k, v in self.cache.items() if v[0] > time.monotonic()}
+            return body, etag
+
+        task = self.loop.create_task(compute())
+        self.inflight[key] = task
+        try:
+            return await task
+        finally:
+            self.inflight.pop(key, None)
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        await self.send(writer, status, body, None, 0, keep_alive)
+
+    async def send(self, writer, status, body, etag, ttl, keep_alive, length=None):
+        headers = [
+            f"HTTP/1.1 {status} {REASONS[status]}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body) if length is None else length}",
+            f"Cache-Control: max-age={ttl}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if etag:
+            headers.append(f"ETag: {etag}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def read(self, fn, *args):
+        """Run ``fn(conn, *args)`` on a pooled read-only connection off the loop"""
+        def run():
+            with self.pool.reader() as conn:
+                return fn(conn, *args)
+        return await self.loop.run_in_executor(self.executor, run)
+
+    def health(self, query):
+        return {'ok': True, 'time': time.time()}
+
+    def occupancy(self, query):
+        return self.state().get('occupancy', {})
+
+    def metrics(self, query):
+        metrics = dict(self.state().get('metrics', {}))
+        metrics['api'] = dict(self.stats, cached_responses=len(self.cache))
+        return metrics
+
+    async def customer(self, query):
+        name = query.get('name', '').strip()
+        if not name:
+            raise ValueError("name is required")
+        row = await self.read(lambda conn: conn.execute(f"""
+            SELECT customer_id, name, entry_ts, exit_ts, {total_visits_sql('c1.name')}
+            FROM main.customers c1 WHERE name = ?
+            ORDER BY customer_id DESC LIMIT 1
+        """, (name,)).fetchone())
+        if row is None:
+            return {'name': name, 'known': False}
+        customer_id, name, entry_ts, exit_ts, total_visits = row
+        occupant = next((o for o in self.state().get('occupancy', {}).get('occupants', [])
+                         if o['name'] == name), None)
+        return {'name': name, 'known': True, 'customer_id': customer_id, 'last_entry_ts': entry_ts,
+                'last_exit_ts': exit_ts, 'total_visits': total_visits, 'in_store': exit_ts is None,
+                'last_seen': occupant and occupant['last_seen'], 'camera': occupant and occupant['camera']}
+
+    async def footfall_today(self, query):
+        def load(conn):
+            today = conn.execute("SELECT date('now')").fetchone()[0]
+            report = daily_report(conn, today)
+            totals, _ = peak_hours(conn, today)
+            return today, report, totals
+
+        today, report, totals = await self.read(load)
+        dwell = report['avg_dwell_minutes_total']
+        return {'day': today, 'visits': report['total_visits'], 'buyers': report['total_buyers'],
+                'avg_dwell_minutes': None if dwell != dwell else round(dwell, 1),
+                'entries_by_hour': totals.tolist()}
+
+    async def recent_sales(self, query):
+        try:
+            limit = min(max(int(query.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValueError("limit must be a number")
+        rows = await self.read(lambda conn: conn.execute("""
+            SELECT p.purchase_ts, c.name, p.product_id, p.product_name, p.product_price,
+                   COALESCE(p.quantity, 1), p.sale_id
+            FROM main.purchases p LEFT JOIN main.customers c ON c.customer_id = p.customer_id
+            ORDER BY p.purchase_ts DESC LIMIT ?
+        """, (limit,)).fetchall())
+        keys = ('ts', 'customer', 'product_id', 'product_name', 'price', 'quantity', 'sale_id')
+        return {'sales': [dict(zip(keys, row)) for row in rows]}
@@ -1,27 +1,30 @@
 import gradio as gr
-import google.generativeai as genai
-from huggingface_hub import InferenceClient
 from PIL import Image
 import io
 from dotenv import load_dotenv
+from functools import lru_cache
 import os
 
-# Initialize Gemini
 # Load environment variables
 load_dotenv()
 
-# Initialize Gemini
-GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GOOGLE_API_KEY)
+@lru_cache(maxsize=None)
+def clients():
+    """Configure Gemini and build the Inference Client on first use, not at startup"""
+    import google.generativeai as genai
+    from huggingface_hub import InferenceClient
 
-# Initialize the Inference Client
-client = InferenceClient(
-    provider="hf-inference",
-    api_key=os.getenv("HUGGINGFACE_API_KEY"),
-)
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    client = InferenceClient(
+        provider="hf-inference",
+        api_key=os.getenv("HUGGINGFACE_API_KEY"),
+    )
+    return genai, client
 
 def process_and_generate(image):
     try:
+        genai, client = clients()
+        
         # Step 1: Analyze the image
         prompt = """
         Analyze this image in great detail. Please provide:
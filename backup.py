@@ -0,0 +1,197 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+from checkout import INVENTORY_SCHEMA
+from db_pool import connect
+from retention import ARCHIVE_DB, ARCHIVE_SCHEMA
+
+# Databases backed up together, by the schema name they are ATTACHed under
+DATABASES = {
+    'main': 'jewelry_shop.db',
+    INVENTORY_SCHEMA: 'jewelry_inventory.db',
+    ARCHIVE_SCHEMA: ARCHIVE_DB,
+}
+BACKUP_DIR = 'backups'
+BACKUP_NAME = re.compile(r'^(?P<name>.+)-(?P<stamp>\d{8}T\d{6})\.db(?P<failed>\.failed)?$')
+STAMP_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def copy_database(source, schema, target, pages=256, pause=0.005, progress=None):
+    """Copy one schema of ``source`` into the file ``target`` with the backup API.
+
+    The copy runs ``pages`` pages per step and sleeps ``pause`` seconds
+    after each, so the disk and CPU are shared with the camera loop and
+    checkout.  ``progress(copied, total)`` is called after every step.
+    Returns (steps, pages copied, seconds).
+    """
+    dest = sqlite3.connect(target)
+    steps = 0
+    copied = 0
+
+    def step(status, remaining, total):
+        nonlocal steps, copied
+        steps += 1
+        copied = total - remaining
+        if progress:
+            progress(copied, total)
+        time.sleep(pause)
+
+    started = time.perf_counter()
+    try:
+        source.backup(dest, pages=pages, progress=step, name=schema)
+        # The copy inherits WAL mode; a backup is a standalone file
+        dest.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        dest.close()
+    return steps, copied, time.perf_counter() - started
+
+
+def verify(path, full=False):
+    """Return the integrity check result of a backup file ('ok' if it is sound)"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("PRAGMA integrity_check" if full else "PRAGMA quick_check").fetchall()
+    finally:
+        conn.close()
+    return "; ".join(row[0] for row in rows)
+
+
+def backup_all(dest_dir=BACKUP_DIR, databases=None, pages=256, pause=0.005, full_check=False,
+               keep_daily=7, keep_weekly=4, progress=None):
+    """Back up every database into ``dest_dir`` while the shop keeps trading.
+
+    All databases are read from one read transaction, so the set is a
+    single consistent point in time even across a checkout's two
+    databases.  In WAL mode that snapshot never blocks writers, and it keeps
+    the backup from restarting when they commit.  The WAL cannot be
+    checkpointed past the snapshot until the copy finishes.
+
+    Each copy is written as ``.partial`` and renamed once it passes the
+    integrity check (quick_check unless ``full_check``).  A failed copy is
+    kept as ``.failed`` until a later copy fails, and old backups are only
+    rotated after a fully verified set.  ``progress(name, copied, total)``
+    reports pages.  Returns one report dict per database.
+    """
+    databases = {schema: path for schema, path in (databases or DATABASES).items()
+                 if os.path.exists(path)}
+    os.makedirs(dest_dir, exist_ok=True)
+    stamp = time.strftime(STAMP_FORMAT)
+    source = connect(databases['main'], readonly=True,
+                     attach={schema: path for schema, path in databases.items() if schema != 'main'})
+    source.isolation_level = None
+    reports = []
+    try:
+        source.execute("BEGIN")
+        for schema in databases:
+            source.execute(f"SELECT COUNT(*) FROM {schema}.sqlite_master").fetchone()
+        for schema, path in databases.items():
+            name = os.path.splitext(os.path.basename(path))[0]
+            target = os.path.join(dest_dir, f"{name}-{stamp}.db")
+            steps, copied, seconds = copy_database(
+                source, schema, target + '.partial', pages, pause,
+                progress and (lambda done, total, name=name: progress(name, done, total)))
+            reports.append({'database': path, 'file': target, 'pages': copied, 'steps': steps,
+                            'copy_seconds': seconds})
+        source.execute("COMMIT")
+    finally:
+        source.close()
+
+    for report in reports:
+        partial = report['file'] + '.partial'
+        started = time.perf_counter()
+        report['check'] = verify(partial, full_check)
+        report['check_seconds'] = time.perf_counter() - started
+        report['ok'] = report['check'] == 'ok'
+        if not report['ok']:
+            report['file'] += '.failed'
+        os.replace(partial, report['file'])
+        report['bytes'] = os.path.getsize(report['file'])
+
+    if all(report['ok'] for report in reports):
+        rotate(dest_dir, keep_daily, keep_weekly)
+    else:
+        prune_failed(dest_dir)
+    return reports
+
+
+def _backups(dest_dir, failed):
+    """Return {stamp: [file names]} of the backup files, or of the failed copies"""
+    sets = {}
+    for filename in os.listdir(dest_dir):
+        match = BACKUP_NAME.match(filename)
+        if match and bool(match['failed']) == failed:
+            sets.setdefault(match['stamp'], []).append(filename)
+    return sets
+
+
+def prune_failed(dest_dir=BACKUP_DIR):
+    """Delete failed copies except those of the latest failure; returns their names"""
+    failed = _backups(dest_dir, failed=True)
+    deleted = []
+    for stamp in sorted(failed)[:-1]:
+        for filename in failed[stamp]:
+            os.remove(os.path.join(dest_dir, filename))
+            deleted.append(filename)
+    return deleted
+
+
+def rotate(dest_dir=BACKUP_DIR, keep_daily=7, keep_weekly=4):
+    """Delete old backup sets, keeping the newest set of each recent day and week.
+
+    The newest set of each of the last ``keep_daily`` days with a backup is
+    kept, and so is the newest of each of the last ``keep_weekly`` ISO
+    weeks.  Failed copies are pruned to the latest failure.  Returns the
+    names of the deleted files.
+    """
+    sets = _backups(dest_dir, failed=False)
+
+    keep, days, weeks = set(), set(), set()
+    for stamp in sorted(sets, reverse=True):
+        taken = datetime.strptime(stamp, STAMP_FORMAT)
+        day, week = taken.date(), taken.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            keep.add(stamp)
+        if week not in weeks and len(weeks) < keep_weekly:
+            keep.add(stamp)
+        days.add(day)
+        weeks.add(week)
+
+    deleted = []
+    for stamp, filenames in sets.items():
+        if stamp not in keep:
+            for filename in filenames:
+                os.remove(os.path.join(dest_dir, filename))
+                deleted.append(filename)
+    return deleted + prune_failed(dest_dir)
+
+
+def format_report(reports):
+    lines = [f"{'Database':<24}{'Size':>10}{'Steps':>8}{'Copy':>9}{'Check':>9}  Result"]
+    for report in reports:
+        lines.append(f"{os.path.basename(report['database']):<24}{report['bytes'] / 1024:>7.0f} KB"
+                     f"{report['steps']:>8}{report['copy_seconds']:>8.2f}s{report['check_seconds']:>8.2f}s"
+                     f"  {'ok' if report['ok'] else report['check']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up the shop databases while the dashboard runs")
+    parser.add_argument('--dest', default=BACKUP_DIR)
+    parser.add_argument('--pages', type=int, default=256, help="pages copied per step")
+    parser.add_argument('--pause', type=float, default=0.005, help="seconds to sleep between steps")
+    parser.add_argument('--full-check', action='store_true', help="integrity_check instead of quick_check")
+    parser.add_argument('--keep-daily', type=int, default=7)
+    parser.add_argument('--keep-weekly', type=int, default=4)
+    args = parser.parse_args()
+    reports = backup_all(args.dest, pages=args.pages, pause=args.pause, full_check=args.full_check,
+                         keep_daily=args.keep_daily, keep_weekly=args.keep_weekly)
+    print(format_report(reports))
+    if not all(report['ok'] for report in reports):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compare reports computed from the raw tables with reports read from the rollups.
+
+Also measures what the rollup triggers add to each check-in and checkout
+write.  Run from the repository root:
+
+    python -m benchmarks.bench_analytics [visits]
+"""
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+from analytics import daily_report, peak_hours, product_report, setup_analytics
+from timestamps import epoch_sql
+
+SCHEMA = """
+    CREATE TABLE customers (
+        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        entry_time DATETIME,
+        exit_time DATETIME,
+        visit_count INTEGER DEFAULT 1
+    );
+    CREATE TABLE purchases (
+        purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER,
+        product_id TEXT,
+        product_name TEXT,
+        product_price REAL,
+        purchase_time DATETIME,
+        quantity INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE INDEX idx_purchases_customer ON purchases(customer_id, purchase_id);
+"""
+
+# The same report straight from the base tables: every visit is read each time
+RAW_DAILY = f"""
+    SELECT date(entry_time), COUNT(*),
+           SUM({epoch_sql('exit_time')} IS NOT NULL),
+           SUM(COALESCE({epoch_sql('exit_time')} - {epoch_sql('entry_time')}, 0)),
+           SUM(EXISTS (SELECT 1 FROM purchases p WHERE p.customer_id = c.customer_id))
+    FROM customers c GROUP BY 1 ORDER BY 1
+"""
+RAW_HOURS = "SELECT CAST(strftime('%H', entry_time) AS INTEGER), COUNT(*) FROM customers GROUP BY 1"
+RAW_PRODUCTS = """
+    SELECT product_id, MAX(product_name), COUNT(*), SUM(quantity), SUM(product_price * quantity)
+    FROM purchases GROUP BY product_id ORDER BY 5 DESC
+"""
+
+
+def generate(visits, rng):
+    start = datetime(2024, 1, 1)
+    for i in range(visits):
+        entry = start + timedelta(seconds=rng.randint(0, 365 * 86400))
+        exit_ = entry + timedelta(seconds=rng.randint(60, 2 * 3600))
+        yield (f"Customer {i % 5000}", entry.strftime('%Y-%m-%d %H:%M:%S'),
+               exit_.strftime('%Y-%m-%d %H:%M:%S'), rng.random() < 0.3)
+
+
+def load(conn, rows):
+    started = time.perf_counter()
+    for name, entry, exit_, bought in rows:
+        customer_id = conn.execute("INSERT INTO customers (name, entry_time) VALUES (?, ?)",
+                                   (name, entry)).lastrowid
+        conn.execute("UPDATE customers SET exit_time = ? WHERE customer_id = ?", (exit_, customer_id))
+        if bought:
+            conn.execute("""
+                INSERT INTO purchases (customer_id, product_id, product_name, product_price, purchase_time)
+                VALUES (?, 'J001', 'Gold Necklace', 599.99, ?)
+            """, (customer_id, exit_))
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def timed(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(visits=100000):
+    rows = list(generate(visits, random.Random(0)))
+    plain = sqlite3.connect(':memory:')
+    plain.executescript(SCHEMA)
+    plain_time = load(plain, rows)
+
+    rolled = sqlite3.connect(':memory:')
+    rolled.executescript(SCHEMA)
+    setup_analytics(rolled)
+    rolled_time = load(rolled, rows)
+    print(f"{visits} visits written in {plain_time:.2f}s without rollups, {rolled_time:.2f}s with "
+          f"({(rolled_time - plain_time) / visits * 1e6:.1f} us per visit)")
+
+    raw = timed(lambda: (plain.execute(RAW_DAILY).fetchall(), plain.execute(RAW_HOURS).fetchall(),
+                         plain.execute(RAW_PRODUCTS).fetchall()))
+    rollup = timed(lambda: (daily_report(rolled), peak_hours(rolled), product_report(rolled)))
+    print(f"Full report from raw tables {raw:8.1f} ms, from rollups {rollup:6.1f} ms ({raw / rollup:.0f}x)")
+
+    assert [row[1:] for row in plain.execute(RAW_DAILY)] == [
+        row[1:] for row in rolled.execute("SELECT * FROM daily_visits ORDER BY day")]
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
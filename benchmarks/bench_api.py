@@ -0,0 +1,111 @@
+"""Measure latency and throughput of the dashboard's HTTP API under a local load generator.
+
+Serves a populated shop database through ApiServer and drives it with
+concurrent asyncio clients cycling over every endpoint, with and without
+keep-alive and the response cache.  Run from the repository root:
+
+    python -m benchmarks.bench_api [requests] [connections]
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from analytics import setup_analytics
+from api import ApiServer
+from benchmarks.bench_analytics import SCHEMA, generate, load
+from db_pool import ConnectionPool
+from retention import SCHEMA as RETENTION_SCHEMA
+from timestamps import setup_epoch_columns
+
+# Columns and indexes the dashboard's migrations add to the analytics schema
+INDEXES = """
+    ALTER TABLE purchases ADD COLUMN sale_id TEXT;
+    CREATE INDEX idx_customers_name_id ON customers(name, customer_id);
+    CREATE INDEX idx_purchases_ts ON purchases(purchase_ts);
+"""
+
+
+def populate(path, visits):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA + RETENTION_SCHEMA)
+    setup_epoch_columns(conn)
+    conn.executescript(INDEXES)
+    setup_analytics(conn)
+    load(conn, generate(visits, random.Random(0)))
+    conn.close()
+
+
+def snapshot():
+    now = time.time()
+    occupants = [{'name': f"Customer {i}", 'customer_id': i, 'entry_ts': int(now) - 600,
+                  'dwell_seconds': 600, 'last_seen': now, 'camera': 'camera0'} for i in range(50)]
+    return {'occupancy': {'as_of': now, 'count': len(occupants), 'by_camera': {'camera0': 50},
+                          'occupants': occupants},
+            'metrics': {'gallery_size': 5000}}
+
+
+def paths(i):
+    return ('/occupancy', '/metrics', f"/customers?name=Customer%20{i % 5000}",
+            '/footfall/today', '/sales/recent?limit=20')[i % 5]
+
+
+async def client(port, start, count, keep_alive, latencies):
+    reader = writer = None
+    for i in range(start, start + count):
+        started = time.perf_counter()
+        if writer is None:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write((f"GET {paths(i)} HTTP/1.1\r\nHost: localhost\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode())
+        head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1')
+        length = int(head.lower().split('content-length:')[1].split('\r\n')[0])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - started)
+        if not keep_alive:
+            writer.close()
+            await writer.wait_closed()
+            writer = None
+    if writer is not None:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def drive(port, requests, connections, keep_alive):
+    latencies = []
+    per_client = requests // connections
+    started = time.perf_counter()
+    await asyncio.gather(*(client(port, n * per_client, per_client, keep_alive, latencies)
+                           for n in range(connections)))
+    return latencies, time.perf_counter() - started
+
+
+def main(requests=20000, connections=16):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'shop.db')
+        populate(path, 50000)
+        pool = ConnectionPool(path).start()
+        try:
+            print(f"{requests} requests over {connections} connections, endpoints in rotation")
+            for label, keep_alive, cache in (("keep-alive, cached", True, True),
+                                             ("keep-alive, no cache", True, False),
+                                             ("connection per request, cached", False, True)):
+                server = ApiServer(pool, state=snapshot, port=0, cache=cache).start()
+                try:
+                    asyncio.run(drive(server.port, 1000, connections, keep_alive))  # warm-up
+                    latencies, elapsed = asyncio.run(drive(server.port, requests, connections, keep_alive))
+                finally:
+                    server.close()
+                latencies.sort()
+                p = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000
+                print(f"{label:<32}{len(latencies) / elapsed:8.0f} req/s   p50 {p(0.5):6.2f} ms   "
+                      f"p95 {p(0.95):6.2f} ms   p99 {p(0.99):6.2f} ms")
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,121 @@
+"""Measure read and write latency while the camera loop, views and writes overlap.
+
+Compares the old setup (default rollback journal, one connection per caller,
+a commit per write) with the WAL connection pool and its group-committing
+writer.  Run from the repository root:
+
+    python -m benchmarks.bench_db_pool [seconds]
+"""
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from db_pool import ConnectionPool
+
+SCHEMA = """
+    CREATE TABLE customers (
+        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        face_encoding BLOB,
+        entry_time DATETIME,
+        exit_time DATETIME,
+        visit_count INTEGER DEFAULT 1
+    );
+    CREATE INDEX idx_customers_name_id ON customers(name, customer_id);
+"""
+
+# The per-frame lookup of update_camera and a long history scan
+CAMERA_QUERY = """
+    SELECT customer_id, name, face_encoding, exit_time FROM customers c1
+    WHERE customer_id IN (SELECT MAX(customer_id) FROM customers GROUP BY name)
+"""
+HISTORY_QUERY = "SELECT * FROM customers ORDER BY entry_time DESC"
+INSERT = """
+    INSERT INTO customers (name, face_encoding, entry_time)
+    VALUES (?, zeroblob(1024), datetime('now'))
+"""
+
+
+def populate(path, rows=20000):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO customers (name, face_encoding, entry_time) VALUES (?, zeroblob(1024), datetime('now'))",
+                     [(f"Customer {i % 2000}",) for i in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] * 1000 if values else float('nan')
+
+
+def run(path, duration, use_pool):
+    stop = threading.Event()
+    reads, writes, errors = [], [], []
+    pool = ConnectionPool(path, readers=3, checkpoint_interval=1).start() if use_pool else None
+
+    def reader(query):
+        conn = None if use_pool else sqlite3.connect(path, check_same_thread=False)
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                if use_pool:
+                    with pool.reader() as conn:
+                        conn.execute(query).fetchall()
+                else:
+                    conn.execute(query).fetchall()
+                reads.append(time.perf_counter() - started)
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+
+    def writer():
+        conn = None if use_pool else sqlite3.connect(path, check_same_thread=False)
+        i = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                if use_pool:
+                    pool.writer.execute(INSERT, (f"Visitor {i}",)).result()
+                else:
+                    conn.execute(INSERT, (f"Visitor {i}",))
+                    conn.commit()
+                writes.append(time.perf_counter() - started)
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+            i += 1
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=reader, args=(CAMERA_QUERY,)),
+               threading.Thread(target=reader, args=(HISTORY_QUERY,)),
+               threading.Thread(target=writer), threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if pool:
+        pool.close()
+
+    label = "WAL pool" if use_pool else "rollback journal"
+    print(f"{label:<18}{len(reads):>7}{percentile(reads, 0.5):>10.2f}{percentile(reads, 0.95):>10.2f}"
+          f"{len(writes):>8}{percentile(writes, 0.5):>10.2f}{percentile(writes, 0.95):>10.2f}{len(errors):>8}")
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'':<18}{'reads':>7}{'p50 ms':>10}{'p95 ms':>10}{'writes':>8}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for use_pool in (False, True):
+            path = os.path.join(tmp, f"bench_{use_pool}.db")
+            populate(path)
+            run(path, duration, use_pool)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Measure the threshold evaluation's all-pairs scoring as the number of faces grows.
+
+Scores synthetic unit vectors (several faces per identity) with the tiled
+histograms of evaluation.py and reports time, pair throughput and peak
+memory, next to the full similarity matrix it replaces.  Run from the
+repository root:
+
+    python -m benchmarks.bench_evaluation [faces ...]
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from evaluation import similarity_histograms
+
+DIMENSIONS = 128
+
+
+def faces(n, rng):
+    labels = rng.integers(0, max(1, n // 5), n)
+    centers = rng.normal(size=(labels.max() + 1, DIMENSIONS)).astype(np.float32)
+    features = centers[labels] + rng.normal(scale=0.6, size=(n, DIMENSIONS)).astype(np.float32)
+    features /= np.linalg.norm(features, axis=1, keepdims=True)
+    return features, labels
+
+
+def main(sizes=(10000, 30000, 100000)):
+    rng = np.random.default_rng(0)
+    print(f"{DIMENSIONS}-value descriptors, 64 MB tiles")
+    print(f"{'faces':>8}{'pairs':>16}{'seconds':>10}{'Mpairs/s':>10}{'peak MB':>10}{'n x n MB':>10}")
+    for n in sizes:
+        features, labels = faces(n, rng)
+        tracemalloc.start()
+        started = time.perf_counter()
+        genuine, impostor = similarity_histograms(features, labels)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        pairs = int(genuine.sum() + impostor.sum())
+        assert pairs == n * (n - 1) // 2
+        print(f"{n:>8}{pairs:>16}{elapsed:>10.1f}{pairs / elapsed / 1e6:>10.0f}"
+              f"{peak / 2 ** 20:>10.0f}{n * n * 4 / 2 ** 20:>10.0f}")
+
+
+if __name__ == "__main__":
+    main(tuple(int(arg) for arg in sys.argv[1:]) or (10000, 30000, 100000))
@@ -0,0 +1,118 @@
+"""Compare a naive history dump with the streaming columnar export.
+
+The naive dump is what exporting by hand looked like: ``SELECT *`` with
+the image and face BLOBs, ``fetchall()`` and one CSV write.  Peak Python
+memory is measured with tracemalloc (pyarrow's own buffers are not
+included).  Run from the repository root:
+
+    python -m benchmarks.bench_export [visits]
+"""
+import csv
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from export import FORMATS, export_history, pa
+from timestamps import setup_epoch_columns
+
+SCHEMA = """
+    CREATE TABLE customers (
+        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        face_encoding BLOB,
+        entry_time DATETIME,
+        exit_time DATETIME,
+        visit_count INTEGER DEFAULT 1
+    );
+    CREATE TABLE purchases (
+        purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER,
+        product_id TEXT,
+        product_name TEXT,
+        product_price REAL,
+        product_image BLOB,
+        image_hash TEXT,
+        purchase_time DATETIME,
+        sale_id TEXT,
+        quantity INTEGER NOT NULL DEFAULT 1
+    );
+"""
+
+
+def populate(path, visits):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    rng = random.Random(0)
+    conn.executemany("""
+        INSERT INTO customers (name, face_encoding, entry_time, exit_time)
+        VALUES (?, randomblob(1024), datetime('2024-01-01', ?), datetime('2024-01-01', ?))
+    """, [(f"Customer {i % 5000}", f"+{i * 300} seconds", f"+{i * 300 + 1800} seconds")
+          for i in range(visits)])
+    conn.executemany("""
+        INSERT INTO purchases (customer_id, product_id, product_name, product_price,
+                               product_image, image_hash, purchase_time, sale_id)
+        VALUES (?, 'J001', 'Gold Necklace', 599.99, randomblob(16384), hex(randomblob(32)),
+                datetime('2024-01-01', ?), hex(randomblob(16)))
+    """, [(i + 1, f"+{i * 300 + 1800} seconds") for i in range(visits) if rng.random() < 0.3])
+    conn.commit()
+    setup_epoch_columns(conn)
+    conn.close()
+
+
+def naive_dump(path, out_dir):
+    conn = sqlite3.connect(path)
+    for table in ('customers', 'purchases'):
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        rows = cursor.fetchall()
+        with open(os.path.join(out_dir, f"{table}.csv"), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([column[0] for column in cursor.description])
+            writer.writerows(rows)
+    conn.close()
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main(visits=100000):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'shop.db')
+        populate(db, visits)
+        print(f"{visits} visits, database {os.path.getsize(db) / 1024 / 1024:.0f} MB")
+
+        out = os.path.join(tmp, 'naive')
+        os.makedirs(out)
+        elapsed, peak = measure(lambda: naive_dump(db, out))
+        print(f"{'naive dump':<16}{elapsed:7.2f} s  peak {peak / 1024 / 1024:8.1f} MB  "
+              f"output {directory_size(out) / 1024 / 1024:7.1f} MB")
+
+        for file_format in FORMATS:
+            if file_format in ('parquet', 'arrow') and pa is None:
+                continue
+            out = os.path.join(tmp, file_format)
+            elapsed, peak = measure(lambda: export_history(out, db, file_format))
+            print(f"{file_format + ' export':<16}{elapsed:7.2f} s  peak {peak / 1024 / 1024:8.1f} MB  "
+                  f"output {directory_size(out) / 1024 / 1024:7.1f} MB")
+
+            # Nothing changed, so an incremental run only reads the id index
+            elapsed, _ = measure(lambda: export_history(out, db, file_format))
+            print(f"{'  incremental':<16}{elapsed:7.2f} s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,93 @@
+"""Compare checkout with inline purchase BLOBs against image-hash references.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_image_store [sales]
+"""
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from image_store import ImageStore, database_report
+
+PURCHASES = """
+    CREATE TABLE purchases (
+        purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER,
+        product_id TEXT,
+        product_name TEXT,
+        product_price REAL,
+        product_image BLOB,
+        image_hash TEXT,
+        purchase_time DATETIME
+    )
+"""
+INVENTORY = """
+    CREATE TABLE inventory (
+        product_id TEXT PRIMARY KEY,
+        product_name TEXT NOT NULL,
+        product_image BLOB,
+        price REAL NOT NULL,
+        quantity INTEGER NOT NULL,
+        image_hash TEXT
+    )
+"""
+
+
+def run(tmp, sales, image, use_store):
+    label = 'store' if use_store else 'inline'
+    shop_path = os.path.join(tmp, f'shop_{label}.db')
+    shop = sqlite3.connect(shop_path)
+    shop.execute(PURCHASES)
+    inventory = sqlite3.connect(os.path.join(tmp, f'inventory_{label}.db'))
+    inventory.execute(INVENTORY)
+    if use_store:
+        image_hash = ImageStore(inventory).put(image)
+        inventory.execute("INSERT INTO inventory VALUES ('J006', 'Ruby Ring', NULL, 999.99, ?, ?)",
+                          (sales, image_hash))
+    else:
+        inventory.execute("INSERT INTO inventory VALUES ('J006', 'Ruby Ring', ?, 999.99, ?, NULL)",
+                          (image, sales))
+    inventory.commit()
+
+    column = 'image_hash' if use_store else 'product_image'
+    latencies = []
+    for _ in range(sales):
+        started = time.perf_counter()
+        name, price, _, value = inventory.execute(f"""
+            SELECT product_name, price, quantity, {column} FROM inventory WHERE product_id = 'J006'
+        """).fetchone()
+        shop.execute(f"""
+            INSERT INTO purchases (customer_id, product_id, product_name, product_price, {column}, purchase_time)
+            VALUES (1, 'J006', ?, ?, ?, datetime('now'))
+        """, (name, price, value))
+        inventory.execute("UPDATE inventory SET quantity = quantity - 1 WHERE product_id = 'J006'")
+        shop.commit()
+        inventory.commit()
+        latencies.append(time.perf_counter() - started)
+    shop.close()
+    inventory.close()
+
+    size, backup = database_report(shop_path)
+    latencies.sort()
+    print(f"{label:<8}{statistics.median(latencies) * 1000:>10.2f} ms"
+          f"{latencies[int(len(latencies) * 0.95)] * 1000:>10.2f} ms"
+          f"{size / 1024 / 1024:>12.1f} MB{backup * 1000:>12.1f} ms")
+
+
+def main():
+    sales = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with open('jewel6.jpg', 'rb') as f:
+        image = f.read()
+    print(f"{sales} sales of a {len(image) / 1024 / 1024:.1f} MB product image\n")
+    print(f"{'':<8}{'p50 exit':>13}{'p95 exit':>13}{'shop db':>15}{'backup':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        run(tmp, sales, image, use_store=False)
+        run(tmp, sales, image, use_store=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Benchmark the paged customer list and history views against full loads.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_paged_table [rows]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from paged_table import KeysetPager
+
+SCHEMA = """
+    CREATE TABLE customers (
+        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        face_encoding BLOB,
+        entry_time DATETIME,
+        exit_time DATETIME,
+        visit_count INTEGER DEFAULT 1
+    );
+    CREATE TABLE purchases (
+        purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER,
+        product_id TEXT,
+        product_name TEXT,
+        product_price REAL,
+        product_image BLOB,
+        purchase_time DATETIME
+    );
+    CREATE INDEX idx_customers_name_id ON customers(name, customer_id);
+    CREATE INDEX idx_customers_name_entry ON customers(name, entry_time, customer_id);
+    CREATE INDEX idx_customers_entry ON customers(entry_time, customer_id);
+    CREATE INDEX idx_customers_exit ON customers(COALESCE(exit_time, ''), customer_id);
+    CREATE INDEX idx_customers_status ON customers((exit_time IS NULL), entry_time, customer_id);
+    CREATE INDEX idx_purchases_customer ON purchases(customer_id, purchase_id);
+"""
+
+LOYAL_CUSTOMER = "Customer 00000"
+
+
+def build_database(path, rows, image_size=64 * 1024):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    start = datetime(2024, 1, 1)
+    names = max(rows // 4, 1)
+    visits = []
+    for i in range(rows):
+        entry = start + timedelta(minutes=7 * i)
+        exit_time = None if i >= rows - 50 else (entry + timedelta(minutes=25)).strftime('%Y-%m-%d %H:%M:%S')
+        visits.append((f"Customer {i % names:05d}", entry.strftime('%Y-%m-%d %H:%M:%S'), exit_time))
+    conn.executemany("INSERT INTO customers (name, entry_time, exit_time) VALUES (?, ?, ?)", visits)
+    # Give one loyal customer a long history with an image on every purchase
+    image = os.urandom(image_size)
+    conn.executemany("""
+        INSERT INTO customers (name, entry_time, exit_time) VALUES (?, ?, ?)
+    """, [(LOYAL_CUSTOMER, f"2023-01-01 10:{i % 60:02d}:00", f"2023-01-01 11:{i % 60:02d}:00")
+          for i in range(1000)])
+    conn.execute("""
+        INSERT INTO purchases (customer_id, product_id, product_name, product_price, product_image, purchase_time)
+        SELECT customer_id, 'J001', 'Gold Necklace', 599.99, ?, exit_time
+        FROM customers WHERE name = ?
+    """, (image, LOYAL_CUSTOMER))
+    conn.commit()
+    return conn
+
+
+def format_time(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %I:%M %p') if value else "-"
+    except (TypeError, ValueError):
+        return "-"
+
+
+def legacy_customer_list(conn):
+    rows = conn.execute("""
+        SELECT c1.customer_id, c1.name, c1.entry_time, c1.exit_time, c1.visit_count,
+            (SELECT COUNT(*) FROM customers c2 WHERE c2.name = c1.name) as total_visits
+        FROM customers c1
+        WHERE c1.customer_id IN (SELECT MAX(customer_id) FROM customers GROUP BY name)
+        ORDER BY CASE WHEN c1.exit_time IS NULL THEN 0 ELSE 1 END, c1.entry_time DESC
+    """).fetchall()
+    return [(r[0], r[1], format_time(r[2]), format_time(r[3])) for r in rows]
+
+
+def legacy_history(conn):
+    return conn.execute("""
+        SELECT c.customer_id, c.entry_time, c.exit_time, c.visit_count,
+               p.product_id, p.product_name, p.product_price, p.product_image
+        FROM customers c LEFT JOIN purchases p ON c.customer_id = p.customer_id
+        WHERE c.name = ? ORDER BY c.entry_time DESC
+    """, (LOYAL_CUSTOMER,)).fetchall()
+
+
+def customer_pager(conn):
+    return KeysetPager(
+        conn,
+        columns="""
+            c1.customer_id, c1.name, c1.entry_time, c1.exit_time, c1.visit_count,
+            (SELECT COUNT(*) FROM customers c2 WHERE c2.name = c1.name)
+        """,
+        source="customers c1",
+        where="c1.customer_id = (SELECT MAX(customer_id) FROM customers WHERE name = c1.name)",
+        sort_keys={
+            'ID': ('c1.customer_id',),
+            'Name': ('c1.name', 'c1.customer_id'),
+            'Entry Time': ('c1.entry_time', 'c1.customer_id'),
+            'Exit Time': ("COALESCE(c1.exit_time, '')", 'c1.customer_id'),
+            'Status': ('(c1.exit_time IS NULL)', 'c1.entry_time', 'c1.customer_id'),
+        },
+        default_sort='Status',
+        descending=True,
+        search_sql="c1.name LIKE ? ESCAPE '\\'"
+    )
+
+
+def history_pager(conn):
+    return KeysetPager(
+        conn,
+        columns="""
+            c.customer_id, c.entry_time, c.exit_time, c.visit_count,
+            p.purchase_id, p.product_id, p.product_name, p.product_price,
+            p.product_image IS NOT NULL
+        """,
+        source="customers c LEFT JOIN purchases p ON c.customer_id = p.customer_id",
+        where="c.name = ?",
+        params=(LOYAL_CUSTOMER,),
+        sort_keys={'Entry Time': ('c.entry_time', 'c.customer_id', 'COALESCE(p.purchase_id, 0)')},
+        default_sort='Entry Time',
+        descending=True
+    )
+
+
+def measure(label, fn, repeat=5):
+    tracemalloc.start()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<42} {min(timings) * 1000:10.2f} ms  peak {peak / 1024 / 1024:8.2f} MB")
+
+
+def scroll(pager, pages, page_size=100):
+    key = None
+    for _ in range(pages):
+        rows = pager.fetch(key, limit=page_size)
+        if not rows:
+            break
+        key = rows[-1][1]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(os.path.join(tmp, 'bench.db'), rows)
+        print(f"customers: {rows + 1000} rows\n")
+
+        pager = customer_pager(conn)
+        measure("customer list: full load (legacy)", lambda: legacy_customer_list(conn), repeat=3)
+        measure("customer list: first page", lambda: pager.fetch(limit=100))
+        measure("customer list: scroll 50 pages", lambda: scroll(pager, 50))
+        pager.order_by('Name', False)
+        measure("customer list: first page sorted by name", lambda: pager.fetch(limit=100))
+        pager.filter("0042")
+        measure("customer list: name search", lambda: pager.fetch(limit=100))
+
+        history = history_pager(conn)
+        measure("past records: full load with BLOBs (legacy)", lambda: legacy_history(conn), repeat=3)
+        measure("past records: first page", lambda: history.fetch(limit=100))
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Measure type-ahead latency of the FTS5 product index against a LIKE scan.
+
+Builds a synthetic catalogue, then replays every prefix of a few search
+terms the way the exit dialog picker issues them.  Run from the
+repository root:
+
+    python -m benchmarks.bench_product_search [products]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from product_search import search_products, setup_product_search
+
+METALS = ['Gold', 'Silver', 'Platinum', 'Rose Gold', 'White Gold']
+STONES = ['Diamond', 'Ruby', 'Emerald', 'Sapphire', 'Pearl', 'Opal', 'Topaz']
+KINDS = {'Ring': 'Rings', 'Necklace': 'Necklaces', 'Bracelet': 'Bracelets',
+         'Earrings': 'Earrings', 'Pendant': 'Pendants', 'Anklet': 'Anklets'}
+TERMS = ['sapphire bracelet', 'J01234', 'rose gold ring', 'opal']
+
+LIKE_QUERY = """
+    SELECT product_id, product_name, price, quantity, image_hash FROM inventory
+    WHERE quantity > 0 AND (product_id LIKE ? OR product_name LIKE ? OR category LIKE ?)
+    ORDER BY product_id LIMIT 8
+"""
+
+
+def populate(conn, products):
+    conn.execute("""
+        CREATE TABLE inventory (
+            product_id TEXT PRIMARY KEY,
+            product_name TEXT NOT NULL,
+            product_image BLOB,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            image_hash TEXT,
+            category TEXT
+        )
+    """)
+    setup_product_search(conn)
+    rng = random.Random(0)
+    rows = []
+    for i in range(products):
+        kind = rng.choice(list(KINDS))
+        name = f"{rng.choice(METALS)} {rng.choice(STONES)} {kind}"
+        rows.append((f"J{i:05d}", name, round(rng.uniform(50, 5000), 2), rng.randint(0, 20), KINDS[kind]))
+    started = time.perf_counter()
+    conn.executemany("""
+        INSERT INTO inventory (product_id, product_name, price, quantity, category)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+    conn.commit()
+    return time.perf_counter() - started
+
+
+def replay(search):
+    """Time ``search(prefix)`` for every prefix of every term, in ms"""
+    timings = []
+    for term in TERMS:
+        for end in range(1, len(term) + 1):
+            started = time.perf_counter()
+            search(term[:end])
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings
+
+
+def main(products=20000):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'inventory.db'))
+        elapsed = populate(conn, products)
+        print(f"Inserted {products} products through the FTS triggers in {elapsed:.2f}s")
+
+        def like(text):
+            pattern = f"%{text}%"
+            return conn.execute(LIKE_QUERY, (pattern, pattern, pattern)).fetchall()
+
+        for label, search in (("LIKE scan", like),
+                              ("FTS5", lambda text: search_products(conn, text, limit=8))):
+            timings = replay(search)
+            print(f"{label:<10} median {timings[len(timings) // 2]:7.2f} ms   "
+                  f"p95 {timings[int(len(timings) * 0.95)]:7.2f} ms   max {timings[-1]:7.2f} ms")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
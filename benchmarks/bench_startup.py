@@ -0,0 +1,86 @@
+"""Measure what starting the dashboard costs: module imports and time to first frame.
+
+Profiles ``import dashboard`` and ``import app`` with ``python -X importtime``
+and lists the slowest imports, then launches the dashboard and times the
+"window ready" and "first frame" lines it prints from process start (this
+needs a display and a camera).  The dashboard runs in ``shop_dir`` with
+the databases there, or in an empty temporary directory.  Run from the
+repository root:
+
+    python -m benchmarks.bench_startup [shop_dir]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('dashboard', 'app')
+TIMEOUT = 60
+
+
+def import_times(module):
+    """Return (total µs, [(cumulative µs, name)] of its direct imports), or an error line"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode:
+        return result.stderr.strip().splitlines()[-1]
+    total, direct = 0, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0 and name.strip() == module:
+            total = int(cumulative)
+        elif depth == 1:
+            direct.append((int(cumulative), name.strip()))
+    return total, sorted(direct, reverse=True)
+
+
+def first_frame(shop_dir):
+    """Return seconds from launch to the window and to the first frame (None if not seen)"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-u', os.path.join(ROOT, 'dashboard.py')], cwd=shop_dir,
+                               env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    window = frame = None
+    output = []
+    try:
+        for line in process.stdout:
+            output.append(line.rstrip())
+            if line.startswith("Startup: window ready"):
+                window = time.perf_counter() - started
+            elif line.startswith("Startup: first frame"):
+                frame = time.perf_counter() - started
+                break
+            if time.perf_counter() - started > TIMEOUT:
+                break
+    finally:
+        process.terminate()
+        process.wait()
+    return window, frame, output
+
+
+def main(shop_dir=None):
+    for module in MODULES:
+        times = import_times(module)
+        if isinstance(times, str):
+            print(f"import {module}: failed ({times})")
+            continue
+        total, direct = times
+        print(f"import {module}: {total / 1000:.0f} ms")
+        for cumulative, name in direct[:8]:
+            print(f"  {name:<24}{cumulative / 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        window, frame, output = first_frame(shop_dir or tmp)
+    print(f"window ready: {'%.2f s' % window if window is not None else 'not reached'}")
+    print(f"first frame:  {'%.2f s' % frame if frame is not None else 'not reached'}")
+    if frame is None and output:
+        print(f"  last output: {output[-1]}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,66 @@
+"""Compare full-resolution preview decoding with stored draft-mode thumbnails.
+
+Draft decoding only speeds up JPEG sources; PNGs (jewel1 and jewel6 are PNG
+despite their extension) still decode in full, which is what the stored
+thumbnails avoid on the Tk thread.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_thumbnails
+"""
+import glob
+import io
+import sqlite3
+import time
+
+from PIL import Image
+
+from image_cache import LRUCache
+from image_store import THUMBNAIL_SIZES, ImageStore, render_thumbnail
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def legacy_preview(data, size):
+    img = Image.open(io.BytesIO(data))
+    img.resize((size, size), Image.Resampling.LANCZOS)
+
+
+def main():
+    conn = sqlite3.connect(':memory:')
+    store = ImageStore(conn)
+    print(f"{'image':<14}{'format':>7}{'bytes':>10}{'size':>6}{'full decode':>14}{'draft render':>14}{'stored thumb':>14}")
+    hashes = []
+    for path in sorted(glob.glob('products/*.jpg')):
+        with open(path, 'rb') as f:
+            data = f.read()
+        image_hash = store.put(data)
+        hashes.append(image_hash)
+        for size in THUMBNAIL_SIZES:
+            full = best_of(lambda: legacy_preview(data, size))
+            draft = best_of(lambda: render_thumbnail(io.BytesIO(data), size))
+            store.thumbnail(image_hash, size)
+            stored = best_of(lambda: Image.open(io.BytesIO(store.thumbnail(image_hash, size))).load())
+            print(f"{path.split('/')[-1]:<14}{Image.open(path).format:>7}{len(data):>10}{size:>6}"
+                  f"{full:>11.1f} ms{draft:>11.1f} ms{stored:>11.2f} ms")
+
+    # Simulate a user flicking through the product combobox
+    cache = LRUCache(max_bytes=8 * 1024 * 1024, sizeof=lambda img: img.width * img.height * 3)
+    for i in range(500):
+        image_hash = hashes[(i * 7) % len(hashes)]
+        cache.get_or_load((image_hash, 150),
+                          lambda: Image.open(io.BytesIO(store.thumbnail(image_hash, 150))))
+    stats = cache.stats()
+    print(f"\nLRU after 500 previews: {stats['hit_rate']:.1%} hit rate, "
+          f"{stats['items']} items, {stats['bytes'] / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Compare per-row TEXT timestamp formatting with vectorized epoch formatting.
+
+Formats the full customer list and visit history result sets the way the
+views did before (datetime.strptime/strftime per row) and the way they do
+now (NumPy over the integer epoch columns).  Run from the repository root:
+
+    python -m benchmarks.bench_timestamps [rows]
+"""
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+from timestamps import format_durations, format_epochs, format_timestamp, setup_epoch_columns
+
+SCHEMA = """
+    CREATE TABLE customers (
+        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        entry_time DATETIME,
+        exit_time DATETIME,
+        visit_count INTEGER DEFAULT 1
+    );
+    CREATE TABLE purchases (
+        purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER,
+        product_name TEXT,
+        product_price REAL,
+        purchase_time DATETIME
+    );
+"""
+
+LIST_QUERY = "SELECT customer_id, name, {entry}, {exit}, visit_count FROM customers"
+HISTORY_QUERY = """
+    SELECT c.customer_id, c.{entry}, c.{exit}, c.visit_count, p.purchase_id, p.product_name, p.product_price
+    FROM customers c LEFT JOIN purchases p ON c.customer_id = p.customer_id
+"""
+
+
+def populate(conn, rows):
+    conn.executescript(SCHEMA)
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    customers, purchases = [], []
+    for i in range(1, rows + 1):
+        entry = start + timedelta(seconds=rng.randint(0, 365 * 86400))
+        exit_ = entry + timedelta(seconds=rng.randint(60, 3 * 3600)) if rng.random() < 0.95 else None
+        customers.append((f"Customer {i % 5000}", entry.strftime('%Y-%m-%d %H:%M:%S'),
+                          exit_.strftime('%Y-%m-%d %H:%M:%S') if exit_ else None))
+        if exit_ and rng.random() < 0.3:
+            purchases.append((i, "Gold Ring", 499.0, exit_.strftime('%Y-%m-%d %H:%M:%S')))
+    conn.executemany("INSERT INTO customers (name, entry_time, exit_time) VALUES (?, ?, ?)", customers)
+    conn.executemany("""
+        INSERT INTO purchases (customer_id, product_name, product_price, purchase_time) VALUES (?, ?, ?, ?)
+    """, purchases)
+    conn.commit()
+    started = time.perf_counter()
+    setup_epoch_columns(conn)
+    return time.perf_counter() - started
+
+
+def text_duration(entry_time, exit_time):
+    """The per-row duration logic the history view used before"""
+    if not exit_time:
+        return "In Progress"
+    try:
+        duration = (datetime.strptime(exit_time, '%Y-%m-%d %H:%M:%S')
+                    - datetime.strptime(entry_time, '%Y-%m-%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        return "-"
+    if duration.total_seconds() < 3600:
+        return f"{int(duration.total_seconds() / 60)} minutes"
+    return str(duration)
+
+
+def per_row_list(conn):
+    rows = conn.execute(LIST_QUERY.format(entry='entry_time', exit='exit_time')).fetchall()
+    return [(format_timestamp(entry), format_timestamp(exit_)) for _, _, entry, exit_, _ in rows]
+
+
+def vectorized_list(conn):
+    rows = conn.execute(LIST_QUERY.format(entry='entry_ts', exit='exit_ts')).fetchall()
+    columns = list(zip(*rows))
+    return list(zip(format_epochs(columns[2]), format_epochs(columns[3])))
+
+
+def per_row_history(conn):
+    rows = conn.execute(HISTORY_QUERY.format(entry='entry_time', exit='exit_time')).fetchall()
+    return [(format_timestamp(row[1]), format_timestamp(row[2]), text_duration(row[1], row[2]))
+            for row in rows]
+
+
+def vectorized_history(conn):
+    rows = conn.execute(HISTORY_QUERY.format(entry='entry_ts', exit='exit_ts')).fetchall()
+    columns = list(zip(*rows))
+    return list(zip(format_epochs(columns[1]), format_epochs(columns[2]),
+                    format_durations(columns[1], columns[2])))
+
+
+def best_of(fn, conn, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(conn)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(rows=100000):
+    conn = sqlite3.connect(':memory:')
+    migration = populate(conn, rows)
+    print(f"{rows} visits; epoch backfill and triggers took {migration:.2f}s")
+    for view, old, new in (("List view", per_row_list, vectorized_list),
+                           ("History view", per_row_history, vectorized_history)):
+        old_time, old_result = best_of(old, conn)
+        new_time, new_result = best_of(new, conn)
+        assert old_result == new_result, f"{view} output differs"
+        print(f"{view:<14} per-row {old_time * 1000:8.1f} ms   vectorized {new_time * 1000:8.1f} ms   "
+              f"{old_time / new_time:5.1f}x  ({len(new_result)} rows)")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,214 @@
+import uuid
+
+# Schema name the inventory database is ATTACHed under on the shop connection
+INVENTORY_SCHEMA = 'inv'
+
+
+class OutOfStockError(Exception):
+    """Raised when a sale would take a product's quantity below zero"""
+
+    def __init__(self, product_ids):
+        if isinstance(product_ids, str):
+            product_ids = [product_ids]
+        super().__init__(f"Not enough stock for {', '.join(product_ids)}")
+        self.product_ids = list(product_ids)
+
+
+def setup_checkout_tables(conn, inventory_conn):
+    """Create the bookkeeping tables checkout relies on in both databases"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(purchases)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if 'sale_id' not in columns:
+        cursor.execute("ALTER TABLE purchases ADD COLUMN sale_id TEXT")
+    if 'quantity' not in columns:
+        cursor.execute("ALTER TABLE purchases ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_purchases_sale ON purchases(sale_id)")
+    # Every sale this terminal committed; unlike purchases it is never
+    # deleted along with a customer, so reconciliation can trust it
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sales (
+            sale_id TEXT PRIMARY KEY,
+            customer_id INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # One row per product per sale, written in the same transaction as the
+    # stock decrement; it is what lets reconcile_sales() repair a checkout
+    # that only committed on one side
+    inventory_conn.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            sale_id TEXT NOT NULL,
+            product_id TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            terminal_id TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (sale_id, product_id)
+        )
+    """)
+    inventory_conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_movements_terminal
+            ON stock_movements(terminal_id, sale_id)
+    """)
+    conn.commit()
+    inventory_conn.commit()
+
+
+def terminal_id(conn):
+    """Return the id of the terminal owning this shop database, creating it once"""
+    conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('terminal_id', ?)",
+                 (uuid.uuid4().hex,))
+    return conn.execute("SELECT value FROM settings WHERE key = 'terminal_id'").fetchone()[0]
+
+
+def merge_items(items):
+    """Collapse (product_id, quantity) pairs into one positive line per product"""
+    merged = {}
+    for product_id, quantity in items:
+        quantity = int(quantity)
+        if quantity <= 0:
+            raise ValueError(f"Invalid quantity {quantity} for {product_id}")
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    return list(merged.items())
+
+
+def checkout(conn, customer_id, items, terminal, schema=INVENTORY_SCHEMA):
+    """Close a visit and record its sale as one transaction across both databases.
+
+    ``items`` is a list of (product_id, quantity) pairs; an empty list records
+    an exit without a purchase.  ``conn`` is the shop write connection with
+    the inventory database attached as ``schema`` and a write transaction
+    already open (the DatabaseWriter starts every batch with BEGIN IMMEDIATE,
+    which takes the write lock on every attached database, so concurrent
+    terminals queue up instead of interleaving).
+
+    The cart is loaded into a temp table with one executemany, validated
+    against stock in one query, and applied with one set-based UPDATE and
+    one INSERT ... SELECT per table, so the SQL cost does not grow with the
+    number of lines.  The stock UPDATE keeps a ``quantity >= needed`` guard,
+    so two terminals selling the last items cannot both succeed.
+
+    Returns the sale id, or None if the visit was already closed.  Raises
+    OutOfStockError or ValueError, leaving nothing changed once the caller's
+    savepoint is rolled back.
+    """
+    cursor = conn.execute("""
+        UPDATE customers
+        SET exit_time = datetime('now')
+        WHERE customer_id = ? AND exit_time IS NULL
+    """, (customer_id,))
+    if cursor.rowcount == 0:
+        return None
+
+    sale_id = uuid.uuid4().hex
+    items = merge_items(items)
+    if not items:
+        return sale_id
+
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS cart (
+            product_id TEXT PRIMARY KEY,
+            quantity INTEGER NOT NULL
+        )
+    """)
+    conn.execute("DELETE FROM temp.cart")
+    conn.executemany("INSERT INTO temp.cart (product_id, quantity) VALUES (?, ?)", items)
+
+    problems = conn.execute(f"""
+        SELECT c.product_id, i.product_id IS NULL
+        FROM temp.cart c LEFT JOIN {schema}.inventory i ON i.product_id = c.product_id
+        WHERE i.product_id IS NULL OR i.quantity < c.quantity
+    """).fetchall()
+    unknown = [product_id for product_id, missing in problems if missing]
+    if unknown:
+        raise ValueError(f"Invalid Product ID {', '.join(unknown)}")
+    if problems:
+        raise OutOfStockError([product_id for product_id, _ in problems])
+
+    cursor = conn.execute(f"""
+        UPDATE {schema}.inventory
+        SET quantity = quantity - (
+            SELECT c.quantity FROM temp.cart c WHERE c.product_id = inventory.product_id
+        )
+        WHERE product_id IN (SELECT product_id FROM temp.cart)
+          AND quantity >= (
+            SELECT c.quantity FROM temp.cart c WHERE c.product_id = inventory.product_id
+        )
+    """)
+    if cursor.rowcount != len(items):
+        raise OutOfStockError([product_id for product_id, _ in items])
+
+    conn.execute(f"""
+        INSERT INTO {schema}.stock_movements (sale_id, product_id, quantity, terminal_id)
+        SELECT ?, product_id, quantity, ? FROM temp.cart
+    """, (sale_id, terminal))
+    conn.execute("INSERT INTO sales (sale_id, customer_id) VALUES (?, ?)", (sale_id, customer_id))
+    conn.execute(f"""
+        INSERT INTO purchases
+        (customer_id, product_id, product_name, product_price, image_hash, purchase_time, sale_id, quantity)
+        SELECT ?, c.product_id, i.product_name, i.price, i.image_hash, datetime('now'), ?, c.quantity
+        FROM temp.cart c JOIN {schema}.inventory i ON i.product_id = c.product_id
+    """, (customer_id, sale_id))
+    return sale_id
+
+
+def reconcile_sales(conn, terminal, schema=INVENTORY_SCHEMA):
+    """Repair sales whose commit reached only one of the two databases.
+
+    In WAL mode a transaction spanning ATTACHed databases is atomic per
+    database but not across them, so a crash mid-commit can leave a sale
+    recorded without its stock movement or the reverse.  Run at startup,
+    before this terminal sells anything.  Returns the number of repairs.
+    """
+    repaired = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Stock taken by this terminal for a sale that never got recorded: put it back
+        orphaned = conn.execute(f"""
+            SELECT m.sale_id, m.product_id, m.quantity
+            FROM {schema}.stock_movements m
+            WHERE m.terminal_id = ? AND NOT EXISTS (
+                SELECT 1 FROM sales s WHERE s.sale_id = m.sale_id
+            )
+        """, (terminal,)).fetchall()
+        for sale_id, product_id, quantity in orphaned:
+            conn.execute(f"""
+                UPDATE {schema}.inventory SET quantity = quantity + ? WHERE product_id = ?
+            """, (quantity, product_id))
+            conn.execute(f"""
+                DELETE FROM {schema}.stock_movements WHERE sale_id = ? AND product_id = ?
+            """, (sale_id, product_id))
+            repaired += 1
+
+        # Sale recorded here but stock never taken: take it now.  Purchases
+        # replicated from another terminal keep its sale_id but have no row in
+        # this terminal's sales; that terminal took their stock already.
+        missing = conn.execute(f"""
+            SELECT p.sale_id, p.product_id, SUM(p.quantity)
+            FROM purchases p JOIN sales s ON s.sale_id = p.sale_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {schema}.stock_movements m
+                WHERE m.sale_id = p.sale_id AND m.product_id = p.product_id
+            )
+            GROUP BY p.sale_id, p.product_id
+        """).fetchall()
+        for sale_id, product_id, quantity in missing:
+            conn.execute(f"""
+                UPDATE {schema}.inventory SET quantity = quantity - ? WHERE product_id = ?
+            """, (quantity, product_id))
+            conn.execute(f"""
+                INSERT INTO {schema}.stock_movements (sale_id, product_id, quantity, terminal_id)
+                VALUES (?, ?, ?, ?)
+            """, (sale_id, product_id, quantity, terminal))
+            repaired += 1
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return repaired
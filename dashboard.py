@@ -5,14 +5,49 @@ from PIL import Image, ImageTk
 import sqlite3
 import os
 import uuid
-from datetime import datetime
 import numpy as np
 import time
 import io
-import requests
-import tempfile
-from gradio_client import Client, handle_file
-import webbrowser
+from paged_table import ChainedPager, KeysetPager, PagedTreeview
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from image_cache import LRUCache
+from image_store import ImageStore, warm_thumbnails
+from db_pool import ConnectionPool, connect
+from product_search import match_expression, search_products, setup_product_search
+from inventory import LOW_STOCK, setup_stock_levels
+from timestamps import format_durations, format_epochs, setup_epoch_columns
+from analytics import daily_report, peak_hours, product_report, setup_analytics
+from checkout import (INVENTORY_SCHEMA, OutOfStockError, checkout, reconcile_sales,
+                      setup_checkout_tables, terminal_id)
+from retention import (ARCHIVE_DB, ARCHIVE_SCHEMA, delete_archived, horizon_days, rename_archived,
+                       run_retention, setup_retention, total_visits_sql)
+from backup import backup_all, format_report
+from sync import setup_sync, sync_dir, sync_once
+from gallery import FaceGallery, match_threshold
+from face_features import extract_features
+from occupancy import OccupancyIndex, close_visits, exit_timeouts
+from recorder import EventRecorder
+from api import ApiServer
+
+# First archival run shortly after startup, then one a day
+RETENTION_DELAY_MS = 5 * 60 * 1000
+RETENTION_INTERVAL_MS = 24 * 60 * 60 * 1000
+# Scheduled backups likewise; "Backup Now" runs one on demand
+BACKUP_DELAY_MS = 10 * 60 * 1000
+BACKUP_INTERVAL_MS = 24 * 60 * 60 * 1000
+# Change exchange with the other terminals, once a sync directory is set
+SYNC_INTERVAL_MS = 5 * 1000
+# Sightings from the camera feed are recorded against this camera
+CAMERA_ID = 'camera0'
+OCCUPANCY_REFRESH_MS = 1000
+# Visits of customers unseen for their zone's timeout are closed by this sweep
+SWEEP_INTERVAL_MS = 60 * 1000
+# Disk space for event snapshots and clips; the oldest events are deleted beyond it
+RECORDINGS_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# A new registration this close below the match threshold to a known
+# customer asks whether it is them (see duplicates.py for existing ones)
+NEAR_DUPLICATE_MARGIN = 0.05
 
 class JewelryShopDashboard:
     def __init__(self, root):
@@ -25,6 +60,33 @@ class JewelryShopDashboard:
         
         self.registration_dialog = None
         self.detected_faces = []
+        # Callbacks of open inventory views, called with the product ids whose stock changed
+        self.inventory_listeners = []
+        # One backup at a time; further requests queue behind it
+        self.backup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Backup")
+        self.sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Sync")
+        # Camera, face detector and gallery load here once the window is up
+        self.startup_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="Startup")
+        self.started = time.perf_counter()
+        self.first_frame_shown = False
+        self.cap = None
+        self.face_cascade = None
+        self.gallery_ready = False
+        # Latest face encoding per customer, matched against every detected face
+        self.gallery = FaceGallery()
+        # Open visits by name, with when the camera last saw each person
+        self.occupancy = OccupancyIndex()
+        # Result of the last exit sweep that closed visits, shown with the occupancy
+        self.sweep_report = ""
+        self.recorder = None
+        # Snapshot of in-memory state served by the HTTP API, replaced every second
+        self.api_state = {}
+        self.api = None
+        # Ready-to-draw product thumbnails, bounded by their in-memory pixel size
+        self.image_cache = LRUCache(
+            max_bytes=32 * 1024 * 1024,
+            sizeof=lambda photo: photo.width() * photo.height() * 4
+        )
         
         self.main_container = ttk.Frame(root)
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -37,15 +99,56 @@ class JewelryShopDashboard:
         
         self.setup_database()
         self.setup_inventory_database()
+        self.migrate_inline_images()
+        self.setup_checkout()
+        self.setup_reports()
+        self.setup_retention()
+        self.setup_sync()
+        self.setup_occupancy()
+        self.setup_recorder()
+        self.setup_connection_pools()
+        self.setup_api()
+        threading.Thread(target=warm_thumbnails, args=(self.inventory_db,), daemon=True).start()
         self.create_camera_frame()
-        self.setup_camera()
+        self.create_occupancy_panel()
         self.create_customer_list()
         self.load_existing_customers()
+        self.root.after(RETENTION_DELAY_MS, self.schedule_retention)
+        self.root.after(BACKUP_DELAY_MS, self.schedule_backup)
+        self.root.after(SYNC_INTERVAL_MS, self.schedule_sync)
+        self.root.after(SWEEP_INTERVAL_MS, self.schedule_exit_sweep)
+        self.start_warm_up()
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def on_close(self):
+        """Release the camera and databases before closing the window"""
+        stats = self.image_cache.stats()
+        print(f"Thumbnail cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['items']} items, {stats['bytes']} bytes")
+        self.backup_executor.shutdown(wait=False, cancel_futures=True)
+        self.sync_executor.shutdown(wait=False, cancel_futures=True)
+        self.startup_executor.shutdown(wait=False, cancel_futures=True)
+        if self.api is not None:
+            self.api.close()
+            print(f"API: {self.api.stats}")
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"Recorder: {self.recorder.stats()}")
+        for pool in (self.shop_db, self.inventory_db):
+            print(f"{pool.path}: {pool.metrics()}")
+            pool.close()
+        if getattr(self, 'cap', None) is not None:
+            self.cap.release()
+        self.conn.close()
+        self.inventory_conn.close()
+        self.root.destroy()
 
     def setup_database(self):
         """Setup database with customers and purchases tables"""
         try:
-            self.conn = sqlite3.connect('jewelry_shop.db')
+            # Tk-thread connection: schema setup, then reads for the views
+            self.conn = connect('jewelry_shop.db', attach={ARCHIVE_SCHEMA: ARCHIVE_DB})
             cursor = self.conn.cursor()
             
             cursor.execute("""
@@ -77,6 +180,7 @@ class JewelryShopDashboard:
                         product_name TEXT,
                         product_price REAL,
                         product_image BLOB,
+                        image_hash TEXT,
                         purchase_time DATETIME,
                         FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
                     )
@@ -86,16 +190,263 @@ class JewelryShopDashboard:
                 columns = [col[1] for col in cursor.fetchall()]
                 if 'product_image' not in columns:
                     cursor.execute("ALTER TABLE purchases ADD COLUMN product_image BLOB")
+                if 'image_hash' not in columns:
+                    cursor.execute("ALTER TABLE purchases ADD COLUMN image_hash TEXT")
+            
+            setup_epoch_columns(self.conn)
+            
+            # Indexes backing the keyset-paginated customer list and history views;
+            # they sort on the integer epoch columns, which replaced the TEXT ones.
+            # entry_ts is NULL when an edited entry time does not parse, and a
+            # NULL seek key would end the page there, hence the COALESCE
+            cursor.executescript("""
+                DROP INDEX IF EXISTS idx_customers_name_entry;
+                DROP INDEX IF EXISTS idx_customers_entry;
+                DROP INDEX IF EXISTS idx_customers_exit;
+                DROP INDEX IF EXISTS idx_customers_status;
+                DROP INDEX IF EXISTS idx_customers_name_entry_ts;
+                DROP INDEX IF EXISTS idx_customers_entry_ts;
+                DROP INDEX IF EXISTS idx_customers_status_ts;
+                CREATE INDEX IF NOT EXISTS idx_customers_name_id
+                    ON customers(name, customer_id);
+                CREATE INDEX IF NOT EXISTS idx_customers_name_entry_key
+                    ON customers(name, COALESCE(entry_ts, 0), customer_id);
+                CREATE INDEX IF NOT EXISTS idx_customers_entry_key
+                    ON customers(COALESCE(entry_ts, 0), customer_id);
+                CREATE INDEX IF NOT EXISTS idx_customers_exit_ts
+                    ON customers(COALESCE(exit_ts, 0), customer_id);
+                CREATE INDEX IF NOT EXISTS idx_customers_status_key
+                    ON customers((exit_time IS NULL), COALESCE(entry_ts, 0), customer_id);
+                CREATE INDEX IF NOT EXISTS idx_purchases_customer
+                    ON purchases(customer_id, purchase_id);
+                CREATE INDEX IF NOT EXISTS idx_purchases_ts
+                    ON purchases(purchase_ts);
+            """)
             
             self.conn.commit()
                 
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to setup database: {e}")
 
+    def setup_checkout(self):
+        """Prepare single-transaction checkout and repair any half-committed sales"""
+        try:
+            setup_checkout_tables(self.conn, self.inventory_conn)
+            self.terminal_id = terminal_id(self.conn)
+            self.conn.commit()
+            conn = connect('jewelry_shop.db', attach={INVENTORY_SCHEMA: 'jewelry_inventory.db'})
+            conn.isolation_level = None
+            try:
+                repaired = reconcile_sales(conn, self.terminal_id)
+            finally:
+                conn.close()
+            if repaired:
+                print(f"Reconciled {repaired} half-committed sales")
+        except Exception as e:
+            messagebox.showerror("Database Error", f"Failed to setup checkout: {e}")
+
+    def setup_reports(self):
+        """Create the daily rollups the reports window reads"""
+        try:
+            setup_analytics(self.conn)
+        except Exception as e:
+            print(f"Analytics setup error: {e}")
+
+    def setup_retention(self):
+        """Create the archive that visits past the retention horizon move to"""
+        try:
+            setup_retention(self.conn)
+        except Exception as e:
+            print(f"Retention setup error: {e}")
+
+    def setup_sync(self):
+        """Log changes for the other terminals"""
+        try:
+            setup_sync(self.conn)
+        except Exception as e:
+            print(f"Sync setup error: {e}")
+
+    def setup_occupancy(self):
+        """Load who is in the store from the open visits"""
+        try:
+            self.occupancy.load(self.conn)
+        except Exception as e:
+            print(f"Occupancy load error: {e}")
+
+    def setup_recorder(self):
+        """Start recording snapshots and clips of unknown faces and check-ins"""
+        try:
+            self.recorder = EventRecorder(max_bytes=RECORDINGS_MAX_BYTES)
+        except Exception as e:
+            print(f"Recorder setup error: {e}")
+
+    def catch_up_changes(self):
+        """Bring the face gallery and occupancy index up to date with the change log.
+
+        Called after every write and on each camera frame, so replicated
+        changes are picked up as well.  Returns the names that changed.
+        """
+        if not self.gallery_ready:
+            return set()  # the gallery's load reads them, and occupancy is reloaded with it
+        names = self.gallery.catch_up(self.conn)
+        if names:
+            self.occupancy.refresh(self.conn, names)
+        return names
+
+    def schedule_exit_sweep(self):
+        """Close the visits of customers the camera has not seen for a while, every minute"""
+        self.root.after(SWEEP_INTERVAL_MS, self.schedule_exit_sweep)
+        if getattr(self, 'cap', None) is None or not self.cap.isOpened():
+            return  # without sightings everyone would look gone
+        try:
+            stale = self.occupancy.unseen(exit_timeouts(self.conn))
+        except Exception as e:
+            print(f"Exit sweep error: {e}")
+            return
+        if not stale:
+            return
+        
+        def on_success(closed):
+            if closed:
+                self.sweep_report = f"{closed} closed automatically at {time.strftime('%H:%M')}"
+                print(f"Exit sweep closed {closed} visits")
+                self.catch_up_changes()
+                self.load_existing_customers()
+        
+        def on_error(e):
+            print(f"Exit sweep error: {e}")
+        
+        # One batched UPDATE for the whole sweep
+        self.after_write(self.writer.submit(close_visits, stale), on_success, on_error)
+
+    def schedule_retention(self):
+        """Archive old visits on a background thread, then again a day later"""
+        days = horizon_days(self.conn)
+
+        def run():
+            try:
+                moved, freed, elapsed = run_retention(self.writer, days)
+                print(f"Archived {moved} visits older than {days} days and freed {freed} pages "
+                      f"in {elapsed:.2f}s")
+            except Exception as e:
+                print(f"Retention error: {e}")
+
+        threading.Thread(target=run, name="Retention", daemon=True).start()
+        self.root.after(RETENTION_INTERVAL_MS, self.schedule_retention)
+
+    def schedule_backup(self):
+        """Back up the databases in the background, then again a day later"""
+        self.after_write(
+            self.backup_executor.submit(backup_all),
+            lambda reports: print(format_report(reports)),
+            lambda e: print(f"Backup error: {e}")
+        )
+        self.root.after(BACKUP_INTERVAL_MS, self.schedule_backup)
+
+    def schedule_sync(self):
+        """Exchange changes with the other terminals in the background, then again shortly"""
+        directory = sync_dir(self.conn)
+        if not directory:
+            self.root.after(SYNC_INTERVAL_MS, self.schedule_sync)
+            return
+        
+        def on_success(result):
+            exported, applied = result
+            if applied:
+                self.catch_up_changes()
+                self.load_existing_customers()
+            self.root.after(SYNC_INTERVAL_MS, self.schedule_sync)
+        
+        def on_error(e):
+            print(f"Sync error: {e}")
+            self.root.after(SYNC_INTERVAL_MS, self.schedule_sync)
+        
+        self.after_write(self.sync_executor.submit(sync_once, self.writer, directory), on_success, on_error)
+
+    def backup_now(self):
+        """Back up the databases without stopping trading and report the result"""
+        def on_success(reports):
+            print(format_report(reports))
+            size = sum(report['bytes'] for report in reports) / (1024 * 1024)
+            seconds = sum(report['copy_seconds'] + report['check_seconds'] for report in reports)
+            failed = [report['database'] for report in reports if not report['ok']]
+            if failed:
+                messagebox.showerror("Backup Failed",
+                    f"Integrity check failed for {', '.join(failed)}; older backups were kept")
+            else:
+                messagebox.showinfo("Backup Complete",
+                    f"Backed up {len(reports)} databases ({size:.1f} MB) in {seconds:.1f}s\n"
+                    f"to {os.path.dirname(reports[0]['file'])}")
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Backup failed: {e}")
+            print(f"Backup error: {e}")
+        
+        self.after_write(self.backup_executor.submit(backup_all), on_success, on_error)
+
+    def setup_connection_pools(self):
+        """Start the writer, reader pool and WAL checkpointer of each database"""
+        self.shop_db = ConnectionPool(
+            'jewelry_shop.db',
+            attach={INVENTORY_SCHEMA: 'jewelry_inventory.db', ARCHIVE_SCHEMA: ARCHIVE_DB}
+        ).start()
+        self.inventory_db = ConnectionPool('jewelry_inventory.db').start()
+        self.writer = self.shop_db.writer
+        self.inventory_writer = self.inventory_db.writer
+
+    def setup_api(self):
+        """Serve occupancy, customer lookups and metrics as JSON for the POS and tablets"""
+        try:
+            self.api = ApiServer(self.shop_db, state=lambda: self.api_state).start()
+            print(f"API listening on http://{self.api.host}:{self.api.port}/")
+        except Exception as e:
+            print(f"API setup error: {e}")
+
+    def publish_api_state(self, now, occupants, counts):
+        """Hand the API a fresh snapshot; it never reads objects the Tk thread mutates"""
+        self.api_state = {
+            'occupancy': {
+                'as_of': now,
+                'count': len(occupants),
+                'by_camera': {camera or 'unseen': count for camera, count in counts.items()},
+                'occupants': [{
+                    'name': occupant.name,
+                    'customer_id': occupant.customer_id,
+                    'entry_ts': occupant.entry_ts,
+                    'dwell_seconds': int(now - occupant.entry_ts) if occupant.entry_ts else None,
+                    'last_seen': occupant.last_seen,
+                    'camera': occupant.camera,
+                } for occupant in occupants],
+            },
+            'metrics': {
+                'terminal_id': getattr(self, 'terminal_id', None),
+                'gallery_size': len(self.gallery),
+                'exit_sweep': self.sweep_report,
+                'recorder': self.recorder.stats() if self.recorder is not None else None,
+                'shop_db': self.shop_db.metrics(),
+                'inventory_db': self.inventory_db.metrics(),
+            },
+        }
+
+    def after_write(self, future, on_success=None, on_error=None):
+        """Run a callback on the Tk thread once a queued write (or other future) is done"""
+        def poll():
+            if not future.done():
+                self.root.after(10, poll)
+                return
+            error = future.exception()
+            if error is not None:
+                if on_error:
+                    on_error(error)
+            elif on_success:
+                on_success(future.result())
+        poll()
+
     def setup_inventory_database(self):
-        """Setup inventory database"""
+        """Setup inventory database and its content-addressed image store"""
         try:
-            self.inventory_conn = sqlite3.connect('jewelry_inventory.db')
+            self.inventory_conn = connect('jewelry_inventory.db')
+            self.image_store = ImageStore(self.inventory_conn)
             cursor = self.inventory_conn.cursor()
             
             cursor.execute("""
@@ -104,108 +455,164 @@ class JewelryShopDashboard:
                     product_name TEXT NOT NULL,
                     product_image BLOB,
                     price REAL NOT NULL,
-                    quantity INTEGER NOT NULL
+                    quantity INTEGER NOT NULL,
+                    image_hash TEXT,
+                    category TEXT,
+                    reorder_level INTEGER NOT NULL DEFAULT 2
                 )
             """)
+            cursor.execute("PRAGMA table_info(inventory)")
+            if 'image_hash' not in [col[1] for col in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE inventory ADD COLUMN image_hash TEXT")
+            setup_product_search(self.inventory_conn)
+            setup_stock_levels(self.inventory_conn)
             
             # Check if table is empty and populate with sample data if needed
             cursor.execute("SELECT COUNT(*) FROM inventory")
             if cursor.fetchone()[0] == 0:
                 sample_items = [
-                    ('J001', 'Gold Necklace', 'jewel1.jpg', 599.99, 5),
-                    ('J002', 'Diamond Ring', None, 1299.99, 3),
-                    ('J003', 'Silver Bracelet', None, 199.99, 8),
-                    ('J004', 'Pearl Earrings', None, 149.99, 6),
-                    ('J005', 'Emerald Pendant', None, 799.99, 4),
-                    ('J006', 'Ruby Ring', None, 999.99, 2),
-                    ('J007', 'Sapphire Bracelet', None, 399.99, 7),
-                    ('J008', 'Gold Chain', None, 349.99, 5),
-                    ('J009', 'Diamond Studs', None, 699.99, 3),
-                    ('J010', 'Silver Anklet', None, 99.99, 10)
+                    ('J001', 'Gold Necklace', 'jewel1.jpg', 599.99, 5, 'Necklaces'),
+                    ('J002', 'Diamond Ring', None, 1299.99, 3, 'Rings'),
+                    ('J003', 'Silver Bracelet', None, 199.99, 8, 'Bracelets'),
+                    ('J004', 'Pearl Earrings', None, 149.99, 6, 'Earrings'),
+                    ('J005', 'Emerald Pendant', None, 799.99, 4, 'Pendants'),
+                    ('J006', 'Ruby Ring', None, 999.99, 2, 'Rings'),
+                    ('J007', 'Sapphire Bracelet', None, 399.99, 7, 'Bracelets'),
+                    ('J008', 'Gold Chain', None, 349.99, 5, 'Necklaces'),
+                    ('J009', 'Diamond Studs', None, 699.99, 3, 'Earrings'),
+                    ('J010', 'Silver Anklet', None, 99.99, 10, 'Anklets')
                 ]
                 cursor.executemany("""
-                    INSERT INTO inventory (product_id, product_name, product_image, price, quantity)
-                    VALUES (?, ?, ?, ?, ?)
-                """, sample_items)
+                    INSERT INTO inventory (product_id, product_name, image_hash, price, quantity, category)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [
+                    (product_id, product_name,
+                     self.image_store.ingest_file(image_file) if image_file and os.path.exists(image_file) else None,
+                     price, quantity, category)
+                    for product_id, product_name, image_file, price, quantity, category in sample_items
+                ])
             
             self.inventory_conn.commit()
                 
         except Exception as e:
             messagebox.showerror("Inventory Database Error", f"Failed to setup inventory database: {e}")
 
-    def setup_camera(self):
-        """Setup camera and face detection"""
-        self.cap = cv2.VideoCapture(0)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_height)
-        
-        if not self.cap.isOpened():
-            messagebox.showerror("Error", "Could not open camera")
-            return
-            
-        self.face_cascade = cv2.CascadeClassifier(
+    def migrate_inline_images(self):
+        """Move any product BLOBs still stored inline into the image store"""
+        try:
+            for conn, table in ((self.inventory_conn, 'inventory'), (self.conn, 'purchases')):
+                migrated = self.image_store.migrate_table(conn, table)
+                if migrated:
+                    print(f"Moved {migrated} {table} images into the image store")
+        except Exception as e:
+            print(f"Image migration error: {e}")
+
+    def start_warm_up(self):
+        """Open the camera and load the face detector and gallery without holding up the window.
+
+        Each step runs on a startup thread and reports back through
+        after_write; the bar under the camera feed counts them down.  The
+        feed starts once the camera and detector are ready, and faces are
+        recognised once the gallery is.
+        """
+        self.warm_up_pending = {'camera': "opening camera", 'detector': "loading face detector",
+                                'faces': "loading customer faces"}
+        self.startup_progress['maximum'] = len(self.warm_up_pending)
+        self.update_warm_up()
+        
+        def camera_ready(cap):
+            self.cap = cap
+            if not cap.isOpened():
+                messagebox.showerror("Error", "Could not open camera")
+            self.update_warm_up('camera')
+        
+        def detector_ready(cascade):
+            self.face_cascade = cascade
+            self.update_warm_up('detector')
+        
+        def gallery_ready(gallery):
+            self.gallery = gallery
+            self.gallery_ready = True
+            # Visits that changed while the gallery loaded
+            self.occupancy.load(self.conn)
+            self.catch_up_changes()
+            self.update_warm_up('faces')
+        
+        def failed(step):
+            def on_error(e):
+                print(f"Startup error ({step}): {e}")
+                self.update_warm_up(step)
+            return on_error
+        
+        self.after_write(self.startup_executor.submit(self.open_camera), camera_ready, failed('camera'))
+        self.after_write(self.startup_executor.submit(self.load_face_detector), detector_ready,
+                         failed('detector'))
+        self.after_write(self.startup_executor.submit(self.load_gallery), gallery_ready, failed('faces'))
+
+    def update_warm_up(self, finished=None):
+        """Show the startup steps still running; starts the feed once it can"""
+        if finished is not None:
+            self.warm_up_pending.pop(finished, None)
+            self.startup_progress['value'] = self.startup_progress['maximum'] - len(self.warm_up_pending)
+        if self.warm_up_pending:
+            self.startup_var.set("Starting: " + ", ".join(self.warm_up_pending.values()) + "...")
+        else:
+            self.startup_frame.pack_forget()
+        
+        if finished in ('camera', 'detector') and not ({'camera', 'detector'} & self.warm_up_pending.keys()):
+            if self.cap is not None and self.cap.isOpened() and self.face_cascade is not None:
+                self.update_camera()
+
+    def open_camera(self):
+        """Open the camera (on a startup thread; this can take seconds)"""
+        cap = cv2.VideoCapture(0)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_height)
+        return cap
+
+    def load_face_detector(self):
+        return cv2.CascadeClassifier(
             cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
         )
-        
-        self.update_camera()
+
+    def load_gallery(self):
+        """Read every customer's latest face encoding (on a startup thread)"""
+        gallery = FaceGallery()
+        with self.shop_db.reader() as conn:
+            gallery.threshold = match_threshold(conn)
+            gallery.load(conn)
+        return gallery
 
     def load_existing_customers(self):
-        """Load and display customer list with only latest entry per customer"""
+        """Reload the visible page of the customer list, keeping the scroll position"""
         try:
-            self.tree.delete(*self.tree.get_children())
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT 
-                    c1.customer_id, 
-                    c1.name, 
-                    c1.entry_time, 
-                    c1.exit_time, 
-                    c1.visit_count,
-                    (SELECT COUNT(*) FROM customers c2 
-                    WHERE c2.name = c1.name) as total_visits
-                FROM customers c1
-                WHERE c1.customer_id IN (
-                    SELECT MAX(customer_id)
-                    FROM customers
-                    GROUP BY name
-                )
-                ORDER BY 
-                    CASE WHEN c1.exit_time IS NULL THEN 0 ELSE 1 END,
-                    c1.entry_time DESC
-            """)
-            
-            for row in cursor.fetchall():
-                customer_id, name, entry_time, exit_time, visit_count, total_visits = row
-                
-                status = "In Store" if exit_time is None else "Left"
-                
-                try:
-                    entry_time = datetime.strptime(entry_time, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %I:%M %p') if entry_time else "-"
-                except:
-                    entry_time = "-"
-                
-                try:
-                    exit_time = datetime.strptime(exit_time, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %I:%M %p') if exit_time else "-"
-                except:
-                    exit_time = "-"
-                
-                tags = ('exited',) if status == "Left" else ('active',)
-                self.tree.insert('', 'end', values=(
-                    customer_id,
-                    name,
-                    entry_time,
-                    exit_time,
-                    status,
-                    total_visits  # Show total visits instead of visit_count/total_visits
-                ), tags=tags)
-            
-            self.tree.tag_configure('active', foreground='green')
-            self.tree.tag_configure('exited', foreground='gray')
-            
+            self.tree.refresh()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load customers: {e}")
             print(f"Loading error: {e}")
 
+    def format_customer_rows(self, rows):
+        """Map a page of customer list rows to Treeview values and tags"""
+        if not rows:
+            return []
+        columns = list(zip(*rows))
+        entries = format_epochs(columns[2])
+        exits = format_epochs(columns[3])
+        formatted = []
+        for row, entry_str, exit_str in zip(rows, entries, exits):
+            customer_id, name, _, _, visit_count, total_visits, in_store = row
+            status = "In Store" if in_store else "Left"
+            tags = ('exited',) if status == "Left" else ('active',)
+            formatted.append(((
+                customer_id,
+                name,
+                entry_str,
+                exit_str,
+                status,
+                total_visits  # Show total visits instead of visit_count/total_visits
+            ), tags))
+        return formatted
+
     def create_camera_frame(self):
         """Create camera frame with click functionality"""
         camera_container = ttk.LabelFrame(self.left_panel, text="Live Camera Feed")
@@ -221,6 +628,14 @@ class JewelryShopDashboard:
         
         self.camera_canvas.bind('<Button-1>', self.on_camera_click)
         
+        # Shown until the camera, face detector and gallery have loaded
+        self.startup_frame = ttk.Frame(camera_container)
+        self.startup_frame.pack(fill=tk.X, padx=5)
+        self.startup_var = tk.StringVar()
+        ttk.Label(self.startup_frame, textvariable=self.startup_var).pack(side=tk.LEFT)
+        self.startup_progress = ttk.Progressbar(self.startup_frame, mode='determinate', length=200)
+        self.startup_progress.pack(side=tk.RIGHT)
+        
         reg_frame = ttk.Frame(camera_container)
         reg_frame.pack(fill=tk.X, pady=5)
         
@@ -236,13 +651,96 @@ class JewelryShopDashboard:
         )
         self.register_button.pack(side=tk.LEFT, padx=5)
 
+    def create_occupancy_panel(self):
+        """Create the live list of who is in the store and for how long"""
+        container = ttk.LabelFrame(self.left_panel, text="In Store Now")
+        container.pack(fill=tk.X, pady=5)
+        
+        self.occupancy_var = tk.StringVar()
+        ttk.Label(container, textvariable=self.occupancy_var).pack(side=tk.TOP, anchor=tk.W, padx=5)
+        
+        columns = ('Name', 'Entered', 'Dwell', 'Last Seen', 'Camera')
+        self.occupancy_tree = ttk.Treeview(container, columns=columns, show='headings', height=5)
+        for column, width in zip(columns, (120, 150, 100, 80, 80)):
+            self.occupancy_tree.heading(column, text=column)
+            self.occupancy_tree.column(column, width=width)
+        self.occupancy_tree.pack(fill=tk.X, padx=5, pady=5)
+        
+        self.update_occupancy_panel()
+
+    def update_occupancy_panel(self):
+        """Redraw occupancy counts and dwell timers from the in-memory index, every second"""
+        now = time.time()
+        occupants = self.occupancy.by_entry()
+        counts = self.occupancy.counts()
+        per_camera = ", ".join(f"{camera}: {count}" for camera, count in sorted(counts.items())
+                               if camera is not None)
+        self.publish_api_state(now, occupants, counts)
+        self.occupancy_var.set(f"{len(occupants)} in store"
+                               + (f" (last seen at {per_camera})" if per_camera else "")
+                               + (f"; {self.sweep_report}" if self.sweep_report else ""))
+        
+        entries = format_epochs([occupant.entry_ts for occupant in occupants])
+        dwells = format_durations([occupant.entry_ts for occupant in occupants], [now] * len(occupants))
+        rows = {}
+        for occupant, entry_str, dwell in zip(occupants, entries, dwells):
+            rows[str(occupant.customer_id)] = (
+                occupant.name,
+                entry_str,
+                dwell,
+                f"{int(now - occupant.last_seen)}s ago",
+                occupant.camera or "-"
+            )
+        for iid in self.occupancy_tree.get_children():
+            if iid not in rows:
+                self.occupancy_tree.delete(iid)
+        for index, (iid, values) in enumerate(rows.items()):
+            if self.occupancy_tree.exists(iid):
+                self.occupancy_tree.item(iid, values=values)
+                self.occupancy_tree.move(iid, '', index)
+            else:
+                self.occupancy_tree.insert('', index, iid=iid, values=values)
+        
+        self.root.after(OCCUPANCY_REFRESH_MS, self.update_occupancy_panel)
+
     def create_customer_list(self):
         """Create customer list with edit, delete, exit, past records, and show inventory buttons"""
         list_container = ttk.LabelFrame(self.right_panel, text="Customer Records")
         list_container.pack(fill=tk.BOTH, expand=True, pady=5)
         
+        search_frame = ttk.Frame(list_container)
+        search_frame.pack(side=tk.TOP, fill=tk.X, pady=5)
+        ttk.Label(search_frame, text="Search:").pack(side=tk.LEFT, padx=5)
+        self.search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.search_var.trace('w', lambda *args: self.tree.search(self.search_var.get()))
+        
+        # Only the latest visit of each customer is listed; rows are paged in
+        # from SQL as the list scrolls instead of being inserted all at once
+        pager = KeysetPager(
+            self.conn,
+            columns=f"""
+                c1.customer_id, c1.name, c1.entry_ts, c1.exit_ts, c1.visit_count,
+                {total_visits_sql('c1.name')},
+                c1.exit_time IS NULL
+            """,
+            source="customers c1",
+            where="c1.customer_id = (SELECT MAX(customer_id) FROM customers WHERE name = c1.name)",
+            sort_keys={
+                'ID': ('c1.customer_id',),
+                'Name': ('c1.name', 'c1.customer_id'),
+                'Entry Time': ('COALESCE(c1.entry_ts, 0)', 'c1.customer_id'),
+                'Exit Time': ('COALESCE(c1.exit_ts, 0)', 'c1.customer_id'),
+                'Status': ('(c1.exit_time IS NULL)', 'COALESCE(c1.entry_ts, 0)', 'c1.customer_id'),
+            },
+            default_sort='Status',
+            descending=True,
+            search_sql="c1.name LIKE ? ESCAPE '\\'"
+        )
+        
         columns = ('ID', 'Name', 'Entry Time', 'Exit Time', 'Status', 'Visits')
-        self.tree = ttk.Treeview(list_container, columns=columns, show='headings')
+        self.tree = PagedTreeview(list_container, pager, format_rows=self.format_customer_rows,
+                                  columns=columns, show='headings')
         
         self.tree.heading('ID', text='ID')
         self.tree.heading('Name', text='Name')
@@ -250,6 +748,7 @@ class JewelryShopDashboard:
         self.tree.heading('Exit Time', text='Exit Time')
         self.tree.heading('Status', text='Status')
         self.tree.heading('Visits', text='Visits')
+        self.tree.enable_sorting()
         
         self.tree.column('ID', width=50)
         self.tree.column('Name', width=100)
@@ -258,8 +757,11 @@ class JewelryShopDashboard:
         self.tree.column('Status', width=80)
         self.tree.column('Visits', width=50)
         
-        scrollbar = ttk.Scrollbar(list_container, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.tag_configure('active', foreground='green')
+        self.tree.tag_configure('exited', foreground='gray')
+        
+        scrollbar = ttk.Scrollbar(list_container, orient=tk.VERTICAL)
+        self.tree.attach_scrollbar(scrollbar)
         
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -295,6 +797,24 @@ class JewelryShopDashboard:
             command=self.show_inventory
         ).pack(fill=tk.X, pady=5)
         
+        ttk.Button(
+            buttons_frame, 
+            text="Reports", 
+            command=self.show_reports
+        ).pack(fill=tk.X, pady=5)
+        
+        ttk.Button(
+            buttons_frame, 
+            text="Recordings", 
+            command=self.show_recordings
+        ).pack(fill=tk.X, pady=5)
+        
+        ttk.Button(
+            buttons_frame, 
+            text="Backup Now", 
+            command=self.backup_now
+        ).pack(fill=tk.X, pady=5)
+        
         ttk.Button(
             buttons_frame, 
             text="Delete Selected", 
@@ -305,12 +825,7 @@ class JewelryShopDashboard:
 
     def extract_face_features(self, face_img):
         """Extract features from face image"""
-        face_img = cv2.resize(face_img, (128, 128))
-        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.equalizeHist(gray)
-        features = gray.flatten().astype(np.float64)
-        features = features / np.linalg.norm(features)
-        return features
+        return extract_features(face_img)
 
     def update_camera(self):
         """Update camera feed with clear status indicators"""
@@ -327,45 +842,37 @@ class JewelryShopDashboard:
             )
             
             self.detected_faces = []
-            cursor = self.conn.cursor()
+            # Pick up visits changed here or replicated since the last frame
+            self.catch_up_changes()
             
             for (x, y, w, h) in faces:
                 face_img = frame[y:y+h, x:x+w]
                 
                 try:
                     current_features = self.extract_face_features(face_img)
-                    is_known = False
-                    
-                    cursor.execute("""
-                        SELECT customer_id, name, face_encoding, exit_time
-                        FROM customers c1
-                        WHERE customer_id IN (
-                            SELECT MAX(customer_id) 
-                            FROM customers 
-                            GROUP BY name
-                        )
-                    """)
-                    customers = cursor.fetchall()
-                    
-                    for customer_id, name, stored_features, exit_time in customers:
-                        if stored_features is not None:
-                            stored_features = np.frombuffer(stored_features, dtype=np.float64)
-                            if self.compare_features(current_features, stored_features):
-                                is_known = True
-                                if exit_time is not None:
-                                    cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 165, 0), 2)
-                                    cv2.putText(frame, f"Click to Check-in: {name}", (x, y-10),
-                                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 165, 0), 2)
-                                else:
-                                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                                    cv2.putText(frame, f"Checked-in: {name}", (x, y-10),
-                                              cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                                break
+                    match = self.gallery.match(current_features) if self.gallery_ready else None
+                    is_known = match is not None
                     
-                    if not is_known:
+                    if not self.gallery_ready:
+                        cv2.rectangle(frame, (x, y), (x+w, y+h), (160, 160, 160), 2)
+                        cv2.putText(frame, "Loading customers...", (x, y-10),
+                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (160, 160, 160), 2)
+                    elif is_known:
+                        name, _ = match
+                        if self.occupancy.seen(name, CAMERA_ID) is None:
+                            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 165, 0), 2)
+                            cv2.putText(frame, f"Click to Check-in: {name}", (x, y-10),
+                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 165, 0), 2)
+                        else:
+                            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                            cv2.putText(frame, f"Checked-in: {name}", (x, y-10),
+                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                    else:
                         cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 255), 2)
                         cv2.putText(frame, "Click to Register New", (x, y-10),
                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+                        if self.recorder is not None:
+                            self.recorder.trigger('unknown_face', camera=CAMERA_ID)
                     
                     self.detected_faces.append({
                         'bbox': (x, y, w, h),
@@ -377,22 +884,20 @@ class JewelryShopDashboard:
                     print(f"Error processing face: {e}")
                     continue
             
+            if self.recorder is not None:
+                # Only keeps a reference; encoding happens on the recorder's threads
+                self.recorder.add_frame(frame)
+            
             cv2_im = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             img_tk = ImageTk.PhotoImage(Image.fromarray(cv2_im))
             self.camera_canvas.create_image(0, 0, image=img_tk, anchor=tk.NW)
             self.camera_canvas.image = img_tk
+            if not self.first_frame_shown:
+                self.first_frame_shown = True
+                print(f"Startup: first frame after {time.perf_counter() - self.started:.2f}s")
             
         self.root.after(10, self.update_camera)
 
-    def compare_features(self, features1, features2, threshold=0.85):
-        """Compare two sets of face features"""
-        if features1 is None or features2 is None:
-            return False
-        if features1.shape != features2.shape:
-            return False
-        similarity = np.dot(features1, features2)
-        return similarity > threshold
-
     def register_current_face(self):
         """Register the current face"""
         if not self.detected_faces:
@@ -407,44 +912,61 @@ class JewelryShopDashboard:
         self.register_face(face_data, self.manual_name_var.get().strip())
 
     def register_face(self, face_data, name):
-        """Enhanced register face with better error handling"""
-        try:
-            cursor = self.conn.cursor()
-            
-            cursor.execute("""
+        """Queue registration of a face; the list refreshes once it commits"""
+        if name not in self.gallery:
+            nearest = self.gallery.nearest(face_data['features'],
+                                           self.gallery.threshold - NEAR_DUPLICATE_MARGIN)
+            if nearest is not None:
+                other, customer_id, similarity = nearest
+                answer = messagebox.askyesnocancel("Possible Duplicate",
+                    f"This face looks like {other} (similarity {similarity:.2f}).\n\n"
+                    f"Yes: check in {other}\nNo: register {name} as a new customer")
+                if answer is None:
+                    return
+                if answer:
+                    self.check_in_match(other, customer_id)
+                    return
+        
+        def write(conn):
+            existing = conn.execute("""
                 SELECT customer_id, exit_time 
                 FROM customers 
                 WHERE name = ? 
                 ORDER BY customer_id DESC 
                 LIMIT 1
-            """, (name,))
-            existing = cursor.fetchone()
+            """, (name,)).fetchone()
             
             if existing:
                 customer_id, exit_time = existing
                 if exit_time is not None:  # Only add new entry if last visit has ended
-                    cursor.execute("""
+                    conn.execute(f"""
                         INSERT INTO customers 
                         (name, face_encoding, entry_time, visit_count)
-                        VALUES (?, ?, datetime('now'), 
-                            (SELECT COUNT(*) + 1 FROM customers WHERE name = ?))
-                    """, (name, face_data['features'].tobytes(), name))
+                        VALUES (:name, :features, datetime('now'), 
+                            {total_visits_sql(':name')} + 1)
+                    """, {'name': name, 'features': face_data['features'].tobytes()})
                 # If customer is currently in store, don't create new entry
             else:
-                cursor.execute("""
+                conn.execute("""
                     INSERT INTO customers 
                     (name, face_encoding, entry_time, visit_count)
                     VALUES (?, ?, datetime('now'), 1)
                 """, (name, face_data['features'].tobytes()))
-            
-            self.conn.commit()
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Failed to register face: {e}")
+            print(f"Registration error: {e}")
+        
+        def on_success(result):
             messagebox.showinfo("Success", f"Successfully registered {name}")
-            self.manual_name_var.set("")
+            self.catch_up_changes()
             self.load_existing_customers()
-            
+        
+        try:
+            self.manual_name_var.set("")
+            self.after_write(self.writer.submit(write), on_success, on_error)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to register face: {e}")
-            print(f"Registration error: {e}")
+            on_error(e)
 
     def delete_customer(self):
         """Delete all records of the selected customer"""
@@ -459,20 +981,30 @@ class JewelryShopDashboard:
                                 f"Are you sure you want to delete all records for {customer_name}?"):
             return
         
-        try:
-            cursor = self.conn.cursor()
+        def write(conn):
             # Delete all purchases and customer records related to the selected customer
-            cursor.execute("DELETE FROM purchases WHERE customer_id IN (SELECT customer_id FROM customers WHERE name = ?)", (customer_name,))
-            cursor.execute("DELETE FROM customers WHERE name = ?", (customer_name,))
-            self.conn.commit()
-            
-            self.tree.delete(selected_item)
+            conn.execute("DELETE FROM purchases WHERE customer_id IN (SELECT customer_id FROM customers WHERE name = ?)", (customer_name,))
+            conn.execute("DELETE FROM customers WHERE name = ?", (customer_name,))
+            delete_archived(conn, customer_name)
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Failed to delete customer records: {e}")
+            print(f"Delete error: {e}")
+            self.catch_up_changes()
+            self.load_existing_customers()
+        
+        def on_success(result):
             messagebox.showinfo("Success", f"Successfully deleted all records for {customer_name}")
+            self.catch_up_changes()
             self.load_existing_customers()
-            
+        
+        try:
+            future = self.writer.submit(write)
+            # Drop the row straight away; a failed delete reloads it
+            self.tree.delete(selected_item)
+            self.after_write(future, on_success, on_error)
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete customer records: {e}")
-            print(f"Delete error: {e}")
+            on_error(e)
 
     def edit_customer(self):
         """Edit customer with name propagation to all entries"""
@@ -566,32 +1098,44 @@ class JewelryShopDashboard:
                             f"Are you sure you want to change the name from '{old_name}' to '{new_name}'?\n\n"
                             f"This will update {len(related_ids)} visit records for this customer."):
                             return
-                        
-                        cursor.execute("""
-                            UPDATE customers 
-                            SET name = ?
-                            WHERE name = ?
-                        """, (new_name, old_name))
                     
-                    cursor.execute("""
-                        UPDATE customers 
-                        SET entry_time = ?,
-                            exit_time = ?,
-                            visit_count = ?
-                        WHERE customer_id = ?
-                    """, (
+                    values = (
                         entry_time_var.get(),
                         exit_time_var.get() if exit_time_var.get() else None,
                         int(visit_count_var.get()),
                         customer_id
-                    ))
+                    )
                     
-                    self.conn.commit()
-                    messagebox.showinfo("Success", 
-                        "Customer information updated successfully\n"
-                        f"Updated {len(related_ids)} visit records")
+                    def write(conn):
+                        if new_name != old_name:
+                            conn.execute("""
+                                UPDATE customers 
+                                SET name = ?
+                                WHERE name = ?
+                            """, (new_name, old_name))
+                            rename_archived(conn, old_name, new_name)
+                        
+                        conn.execute("""
+                            UPDATE customers 
+                            SET entry_time = ?,
+                                exit_time = ?,
+                                visit_count = ?
+                            WHERE customer_id = ?
+                        """, values)
+                    
+                    def on_success(result):
+                        messagebox.showinfo("Success", 
+                            "Customer information updated successfully\n"
+                            f"Updated {len(related_ids)} visit records")
+                        self.catch_up_changes()
+                        self.load_existing_customers()
+                    
+                    def on_error(e):
+                        messagebox.showerror("Error", f"Failed to update customer: {e}")
+                        print(f"Update error: {e}")
+                    
+                    self.after_write(self.writer.submit(write), on_success, on_error)
                     dialog.destroy()
-                    self.load_existing_customers()
                     
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to update customer: {e}")
@@ -622,55 +1166,23 @@ class JewelryShopDashboard:
         if not self.detected_faces:
             messagebox.showinfo("Info", "No faces detected to register!")
             return
+        if not self.gallery_ready:
+            messagebox.showinfo("Info", "Customer faces are still loading, please try again shortly")
+            return
             
         for face_data in self.detected_faces:
             x, y, w, h = face_data['bbox']
             if (x <= event.x <= x + w) and (y <= event.y <= y + h):
                 try:
-                    cursor = self.conn.cursor()
-                    cursor.execute("""
-                        SELECT customer_id, name, face_encoding, exit_time,
-                            (SELECT COUNT(*) FROM customers c2 
-                                WHERE c2.name = c1.name) as total_visits
-                        FROM customers c1
-                        WHERE customer_id IN (
-                            SELECT MAX(customer_id) 
-                            FROM customers 
-                            GROUP BY name
-                        )
-                    """)
-                    customers = cursor.fetchall()
-                    
-                    is_known = False
-                    for customer_id, name, stored_features, exit_time, total_visits in customers:
-                        if stored_features is not None:
-                            stored_features = np.frombuffer(stored_features, dtype=np.float64)
-                            if self.compare_features(face_data['features'], stored_features):
-                                is_known = True
-                                if exit_time is not None:
-                                    cursor.execute("""
-                                        SELECT customer_id FROM customers 
-                                        WHERE name = ? AND exit_time IS NULL
-                                    """, (name,))
-                                    active_entry = cursor.fetchone()
-                                    
-                                    if not active_entry:
-                                        cursor.execute("""
-                                            INSERT INTO customers 
-                                            (name, face_encoding, entry_time, visit_count)
-                                            VALUES (?, ?, datetime('now'), ?)
-                                        """, (name, stored_features, total_visits + 1))
-                                        self.conn.commit()
-                                        messagebox.showinfo("Welcome Back", 
-                                            f"Welcome back {name}!\nVisit #{total_visits + 1}")
-                                        self.load_existing_customers()
-                                    else:
-                                        messagebox.showinfo("Info", 
-                                            f"{name} is already checked in!")
-                                else:
-                                    messagebox.showinfo("Info", 
-                                        f"{name} is already checked in!")
-                                break
+                    match = self.gallery.match(face_data['features'])
+                    is_known = match is not None
+                    if is_known:
+                        name, customer_id = match
+                        if name not in self.occupancy:
+                            self.check_in_match(name, customer_id)
+                        else:
+                            messagebox.showinfo("Info", 
+                                f"{name} is already checked in!")
                     
                     if not is_known:
                         self.show_registration_dialog(face_data)
@@ -680,6 +1192,61 @@ class JewelryShopDashboard:
                     print(f"Face processing error: {e}")
                 break
 
+    def check_in_match(self, name, customer_id):
+        """Check in a recognised customer with the encoding of their latest visit"""
+        if name in self.occupancy:
+            messagebox.showinfo("Info", f"{name} is already checked in!")
+            return
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT face_encoding, {total_visits_sql('c1.name')} as total_visits
+            FROM customers c1
+            WHERE customer_id = ?
+        """, (customer_id,))
+        row = cursor.fetchone()
+        if row is None or row[0] is None:
+            # Archived, merged or deleted since the face was matched
+            messagebox.showwarning("Warning", f"The visit {name} was matched to no longer exists.\n"
+                                              "Try again, or register them as a new customer.")
+            return
+        stored_features, total_visits = row
+        stored_features = np.frombuffer(stored_features, dtype=np.float64)
+        self.check_in(name, stored_features, total_visits)
+
+    def check_in(self, name, features, total_visits):
+        """Queue a new visit for a returning customer unless one is already open"""
+        def write(conn):
+            active_entry = conn.execute("""
+                SELECT customer_id FROM customers 
+                WHERE name = ? AND exit_time IS NULL
+            """, (name,)).fetchone()
+            if active_entry:
+                return False
+            conn.execute("""
+                INSERT INTO customers 
+                (name, face_encoding, entry_time, visit_count)
+                VALUES (?, ?, datetime('now'), ?)
+            """, (name, features.tobytes(), total_visits + 1))
+            return True
+        
+        def on_success(checked_in):
+            if checked_in:
+                if self.recorder is not None:
+                    self.recorder.trigger('check_in', name, CAMERA_ID)
+                messagebox.showinfo("Welcome Back", 
+                    f"Welcome back {name}!\nVisit #{total_visits + 1}")
+                self.catch_up_changes()
+                self.load_existing_customers()
+            else:
+                messagebox.showinfo("Info", 
+                    f"{name} is already checked in!")
+        
+        def on_error(e):
+            messagebox.showerror("Error", f"Error processing face: {e}")
+            print(f"Check-in error: {e}")
+        
+        self.after_write(self.writer.submit(write), on_success, on_error)
+
     def show_registration_dialog(self, face_data):
         """Show registration dialog only for new faces"""
         if self.registration_dialog is not None:
@@ -767,7 +1334,7 @@ class JewelryShopDashboard:
         
         dialog = tk.Toplevel(self.root)
         dialog.title(f"Exit Details for {customer_name}")
-        dialog.geometry("400x500")
+        dialog.geometry("450x700")
         dialog.transient(self.root)
         dialog.grab_set()
         
@@ -792,42 +1359,156 @@ class JewelryShopDashboard:
         purchase_frame = ttk.Frame(form_frame)
         purchase_frame.grid(row=2, column=0, columnspan=2, pady=5, sticky='ew')
         
-        # Fetch available product IDs
-        try:
-            cursor = self.inventory_conn.cursor()
-            cursor.execute("SELECT product_id FROM inventory WHERE quantity > 0")
-            available_products = [row[0] for row in cursor.fetchall()]
-            if not available_products:
-                available_products = ["No products available"]
-        except Exception as e:
-            print(f"Error fetching product IDs: {e}")
-            available_products = ["Error loading products"]
+        # Type-ahead product picker over the FTS5 index; each keystroke restarts
+        # a short timer so only the last query of a burst hits the database
+        ttk.Label(purchase_frame, text="Search:").grid(row=0, column=0, sticky='e', pady=5)
+        product_search_var = tk.StringVar()
+        search_entry = ttk.Entry(purchase_frame, textvariable=product_search_var)
+        search_entry.grid(row=0, column=1, sticky='ew', pady=5)
+        
+        ttk.Style().configure('Picker.Treeview', rowheight=44)
+        picker = ttk.Treeview(purchase_frame, columns=('Product', 'Price', 'Stock'),
+                              show='tree headings', height=4, style='Picker.Treeview')
+        picker.heading('#0', text='Product ID')
+        picker.heading('Product', text='Product')
+        picker.heading('Price', text='Price')
+        picker.heading('Stock', text='Stock')
+        picker.column('#0', width=110)
+        picker.column('Product', width=150)
+        picker.column('Price', width=70)
+        picker.column('Stock', width=50)
+        picker.grid(row=1, column=0, columnspan=2, sticky='ew', pady=5)
         
-        ttk.Label(purchase_frame, text="Product ID:").grid(row=0, column=0, sticky='e', pady=5)
         product_id_var = tk.StringVar()
-        product_id_combo = ttk.Combobox(purchase_frame, textvariable=product_id_var, values=available_products, state="readonly")
-        product_id_combo.grid(row=0, column=1, sticky='ew', pady=5)
-        if available_products[0] != "No products available" and available_products[0] != "Error loading products":
-            product_id_combo.set(available_products[0])  # Set default to first available product
+        search_job = [None]
         
-        ttk.Label(purchase_frame, text="Product Name:").grid(row=1, column=0, sticky='e', pady=5)
+        def run_search():
+            search_job[0] = None
+            try:
+                matches = search_products(self.inventory_conn, product_search_var.get(), limit=8)
+            except sqlite3.Error as e:
+                print(f"Product search error: {e}")
+                matches = []
+            picker.delete(*picker.get_children())
+            # Hold the PhotoImages so a cache eviction cannot blank visible rows
+            picker.photos = []
+            for product_id, name, price, stock, image_hash in matches:
+                photo = self.get_thumbnail(image_hash, 40)
+                if photo is not None:
+                    picker.photos.append(photo)
+                picker.insert('', 'end', iid=product_id, text=product_id, image=photo or '',
+                              values=(name, f"${price:.2f}", stock))
+            if matches:
+                picker.selection_set(matches[0][0])
+            else:
+                product_id_var.set("")
+        
+        def schedule_search(*args):
+            if search_job[0] is not None:
+                dialog.after_cancel(search_job[0])
+            search_job[0] = dialog.after(150, run_search)
+        
+        def on_pick(event=None):
+            selection = picker.selection()
+            if selection:
+                product_id_var.set(selection[0])
+        
+        def focus_picker(event):
+            children = picker.get_children()
+            if children:
+                picker.focus_set()
+                picker.focus(children[0])
+        
+        product_search_var.trace('w', schedule_search)
+        picker.bind('<<TreeviewSelect>>', on_pick)
+        picker.bind('<Return>', lambda event: add_to_cart())
+        search_entry.bind('<Down>', focus_picker)
+        search_entry.bind('<Return>', lambda event: add_to_cart())
+        
+        ttk.Label(purchase_frame, text="Product Name:").grid(row=2, column=0, sticky='e', pady=5)
         product_name_var = tk.StringVar()
-        ttk.Label(purchase_frame, textvariable=product_name_var).grid(row=1, column=1, sticky='w', pady=5)
+        ttk.Label(purchase_frame, textvariable=product_name_var).grid(row=2, column=1, sticky='w', pady=5)
         
-        ttk.Label(purchase_frame, text="Price:").grid(row=2, column=0, sticky='e', pady=5)
+        ttk.Label(purchase_frame, text="Price:").grid(row=3, column=0, sticky='e', pady=5)
         product_price_var = tk.StringVar()
-        ttk.Label(purchase_frame, textvariable=product_price_var).grid(row=2, column=1, sticky='w', pady=5)
+        ttk.Label(purchase_frame, textvariable=product_price_var).grid(row=3, column=1, sticky='w', pady=5)
+        
+        ttk.Label(purchase_frame, text="Quantity:").grid(row=4, column=0, sticky='e', pady=5)
+        quantity_frame = ttk.Frame(purchase_frame)
+        quantity_frame.grid(row=4, column=1, sticky='w', pady=5)
+        quantity_var = tk.StringVar(value="1")
+        ttk.Spinbox(quantity_frame, from_=1, to=999, width=5, textvariable=quantity_var).pack(side=tk.LEFT)
+        ttk.Button(quantity_frame, text="Add to Cart", command=lambda: add_to_cart()).pack(side=tk.LEFT, padx=5)
         
         image_label = ttk.Label(purchase_frame)
-        image_label.grid(row=3, column=0, columnspan=2, pady=5)
+        image_label.grid(row=5, column=0, columnspan=2, pady=5)
+        
+        cart_columns = ('Product ID', 'Product', 'Qty', 'Price', 'Total')
+        cart_tree = ttk.Treeview(purchase_frame, columns=cart_columns, show='headings', height=5)
+        for column, width in zip(cart_columns, (70, 130, 40, 70, 80)):
+            cart_tree.heading(column, text=column)
+            cart_tree.column(column, width=width)
+        cart_tree.grid(row=6, column=0, columnspan=2, sticky='ew', pady=5)
+        
+        cart_total_var = tk.StringVar(value="Total: $0.00")
+        ttk.Label(purchase_frame, textvariable=cart_total_var).grid(row=7, column=1, sticky='e', pady=5)
+        ttk.Button(purchase_frame, text="Remove Selected",
+                   command=lambda: remove_from_cart()).grid(row=7, column=0, sticky='w', pady=5)
+        
+        # product_id -> [name, price, quantity, stock], in the order items were added
+        cart = {}
+        
+        def refresh_cart():
+            cart_tree.delete(*cart_tree.get_children())
+            total = 0.0
+            for product_id, (name, price, quantity, stock) in cart.items():
+                cart_tree.insert('', 'end', iid=product_id, values=(
+                    product_id, name, quantity, f"${price:.2f}", f"${price * quantity:.2f}"))
+                total += price * quantity
+            cart_total_var.set(f"Total: ${total:.2f}")
+        
+        def add_to_cart():
+            product_id = product_id_var.get().strip()
+            if not product_id:
+                messagebox.showwarning("Warning", "Please select a product")
+                return
+            try:
+                quantity = int(quantity_var.get())
+                if quantity <= 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showwarning("Warning", "Quantity must be a positive whole number")
+                return
+            
+            cursor = self.inventory_conn.cursor()
+            cursor.execute("""
+                SELECT product_name, price, quantity FROM inventory WHERE product_id = ?
+            """, (product_id,))
+            result = cursor.fetchone()
+            if not result:
+                messagebox.showwarning("Warning", "Invalid Product ID")
+                return
+            
+            name, price, stock = result
+            in_cart = cart[product_id][2] if product_id in cart else 0
+            if in_cart + quantity > stock:
+                messagebox.showwarning("Warning", f"Only {stock} of {name} in stock")
+                return
+            cart[product_id] = [name, price, in_cart + quantity, stock]
+            refresh_cart()
+        
+        def remove_from_cart():
+            for product_id in cart_tree.selection():
+                cart.pop(product_id, None)
+            refresh_cart()
         
         def update_product_details(*args):
             product_id = product_id_var.get().strip()
-            if product_id and product_id not in ["No products available", "Error loading products"]:
+            if product_id:
                 try:
                     cursor = self.inventory_conn.cursor()
                     cursor.execute("""
-                        SELECT product_name, price, quantity, product_image 
+                        SELECT product_name, price, quantity, image_hash 
                         FROM inventory 
                         WHERE product_id = ?
                     """, (product_id,))
@@ -838,11 +1519,8 @@ class JewelryShopDashboard:
                         if result[2] <= 0:
                             messagebox.showwarning("Warning", "This product is out of stock!")
                         
-                        if result[3]:
-                            print(f"Image data for {product_id}: {len(result[3])} bytes")
-                            img = Image.open(io.BytesIO(result[3]))
-                            img = img.resize((150, 150), Image.Resampling.LANCZOS)
-                            photo = ImageTk.PhotoImage(img)
+                        photo = self.get_thumbnail(result[3], 150)
+                        if photo is not None:
                             image_label.config(image=photo)
                             image_label.image = photo
                         else:
@@ -862,9 +1540,7 @@ class JewelryShopDashboard:
                 image_label.config(image=None, text="")
         
         product_id_var.trace('w', update_product_details)
-        # Trigger initial update if a default product is set
-        if product_id_var.get():
-            update_product_details()
+        run_search()
         
         def toggle_purchase_details():
             if purchase_var.get() == "Yes":
@@ -884,60 +1560,41 @@ class JewelryShopDashboard:
         
         def submit_exit():
             try:
-                cursor = self.conn.cursor()
-                inventory_cursor = self.inventory_conn.cursor()
-                
-                cursor.execute("""
-                    UPDATE customers 
-                    SET exit_time = datetime('now')
-                    WHERE customer_id = ? AND exit_time IS NULL
-                """, (customer_id,))
-                
+                items = []
                 if purchase_var.get() == "Yes":
-                    product_id = product_id_var.get().strip()
-                    if not product_id or product_id in ["No products available", "Error loading products"]:
-                        messagebox.showwarning("Warning", "Please select a valid Product ID")
-                        return
-                    
-                    inventory_cursor.execute("""
-                        SELECT product_name, price, quantity, product_image
-                        FROM inventory 
-                        WHERE product_id = ?
-                    """, (product_id,))
-                    product_details = inventory_cursor.fetchone()
-                    
-                    if not product_details:
-                        messagebox.showwarning("Warning", "Invalid Product ID")
-                        return
-                    
-                    if product_details[2] <= 0:
-                        messagebox.showwarning("Warning", "Product is out of stock")
+                    items = [(product_id, line[2]) for product_id, line in cart.items()]
+                    if not items:
+                        messagebox.showwarning("Warning", "Please add at least one product to the cart")
                         return
-                    
-                    product_name, product_price, quantity, product_image = product_details
-                    
-                    cursor.execute("""
-                        INSERT INTO purchases 
-                        (customer_id, product_id, product_name, product_price, product_image, purchase_time)
-                        VALUES (?, ?, ?, ?, ?, datetime('now'))
-                    """, (customer_id, product_id, product_name, product_price, product_image))
-                    
-                    inventory_cursor.execute("""
-                        UPDATE inventory 
-                        SET quantity = quantity - 1
-                        WHERE product_id = ?
-                    """, (product_id,))
                 
-                self.conn.commit()
-                self.inventory_conn.commit()
+                def on_success(sale_id):
+                    if dialog.winfo_exists():
+                        dialog.destroy()
+                    if sale_id and items:
+                        self.notify_inventory_changed([product_id for product_id, _ in items])
+                    if sale_id:
+                        messagebox.showinfo("Success", f"Successfully marked {customer_name} as exited")
+                        self.catch_up_changes()
+                        self.load_existing_customers()
+                    else:
+                        messagebox.showwarning("Warning", "Customer record not found or already exited")
                 
-                if cursor.rowcount > 0:
-                    messagebox.showinfo("Success", f"Successfully marked {customer_name} as exited")
-                    dialog.destroy()
-                    self.load_existing_customers()
-                else:
-                    messagebox.showwarning("Warning", "Customer record not found or already exited")
-                    dialog.destroy()
+                def on_error(e):
+                    if isinstance(e, OutOfStockError):
+                        messagebox.showwarning("Warning", 
+                            f"Not enough stock for: {', '.join(e.product_ids)}")
+                    elif isinstance(e, ValueError):
+                        messagebox.showwarning("Warning", str(e))
+                    else:
+                        messagebox.showerror("Error", f"Failed to process exit: {e}")
+                    print(f"Exit error: {e}")
+                
+                # Visit, sale and stock changes for the whole cart commit together on
+                # the shop writer, which has the inventory database attached
+                self.after_write(
+                    self.writer.submit(checkout, customer_id, items, self.terminal_id),
+                    on_success, on_error
+                )
             
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to process exit: {e}")
@@ -953,16 +1610,13 @@ class JewelryShopDashboard:
         if file_path:
             image_path_var.set(file_path)
 
-    def view_image(self, image_data):
-        """Display the product image in a new window"""
+    def view_image(self, image_hash):
+        """Display a stored product image in a new window"""
         try:
-            if not image_data:
+            photo = self.get_thumbnail(image_hash, 300)
+            if photo is None:
                 messagebox.showinfo("Info", "No image data available")
                 return
-                
-            img = Image.open(io.BytesIO(image_data))
-            img = img.resize((300, 300), Image.Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
             
             img_window = tk.Toplevel(self.root)
             img_window.title("Product Image")
@@ -980,6 +1634,55 @@ class JewelryShopDashboard:
             print(f"Image display error: {str(e)}")
             messagebox.showerror("Error", f"Failed to display image: {str(e)}")
 
+    def format_history_rows(self, rows):
+        """Map a page of visit history rows to Treeview values and tags"""
+        if not rows:
+            return []
+        columns = list(zip(*rows))
+        entries = format_epochs(columns[1])
+        exits = format_epochs(columns[2])
+        durations = format_durations(columns[1], columns[2])
+        formatted = []
+        for row, entry_str, exit_str, duration_str in zip(rows, entries, exits, durations):
+            customer_id, _, _, visit_count, purchase_id, product_id, product_name, product_price, image_hash, quantity = row
+            has_image = image_hash is not None
+            
+            if purchase_id is None:
+                product_id_display = "-"
+                product_name_display = "-"
+                product_price_display = "-"
+            else:
+                product_id_display = product_id if product_id else "-"
+                product_name_display = product_name if product_name else "-"
+                if quantity and quantity > 1:
+                    product_name_display = f"{product_name_display} x{quantity}"
+                product_price_display = f"${product_price:.2f}" if product_price is not None else "-"
+            
+            formatted.append(((
+                visit_count,
+                entry_str,
+                exit_str,
+                duration_str,
+                product_id_display,
+                product_name_display,
+                product_price_display,
+                "View" if has_image else "-",
+                "Generate" if has_image else "-"
+            ), ('has_image',) if has_image else ()))
+        return formatted
+
+    def get_thumbnail(self, image_hash, size):
+        """Return a ready PhotoImage of a stored image, rendering it on first use"""
+        if not image_hash:
+            return None
+        
+        def load():
+            # Rendered on first use; storing it is queued on the inventory writer
+            data = self.image_store.thumbnail(image_hash, size, writer=self.inventory_writer)
+            return ImageTk.PhotoImage(Image.open(io.BytesIO(data))) if data else None
+        
+        return self.image_cache.get_or_load((image_hash, size), load)
+
     def show_past_records(self):
         """Show past records for selected customer including purchase details, images, and generate option"""
         selected_item = self.tree.selection()
@@ -1006,8 +1709,32 @@ class JewelryShopDashboard:
             records_frame = ttk.LabelFrame(dialog, text=f"Visit History for {customer_name}", padding=10)
             records_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
             
+            # History is paged in newest first; image BLOBs are only read when clicked.
+            # Archived visits are all older than the hot ones, so the archive is
+            # only queried once scrolling runs past the last hot visit.
+            pager = ChainedPager(
+                KeysetPager(
+                    self.conn,
+                    columns="""
+                        c.customer_id, c.entry_ts, c.exit_ts, c.visit_count,
+                        p.purchase_id, p.product_id, p.product_name, p.product_price,
+                        p.image_hash, p.quantity
+                    """,
+                    source=f"{schema}.customers c LEFT JOIN {schema}.purchases p ON c.customer_id = p.customer_id",
+                    where="c.name = ?",
+                    params=(customer_name,),
+                    sort_keys={
+                        'Entry Time': ('COALESCE(c.entry_ts, 0)', 'c.customer_id', 'COALESCE(p.purchase_id, 0)'),
+                    },
+                    default_sort='Entry Time',
+                    descending=True
+                )
+                for schema in ('main', ARCHIVE_SCHEMA)
+            )
+            
             columns = ('Visit #', 'Entry Time', 'Exit Time', 'Duration', 'Product ID', 'Product', 'Price', 'Product Image', 'Generate')
-            records_tree = ttk.Treeview(records_frame, columns=columns, show='headings')
+            records_tree = PagedTreeview(records_frame, pager, format_rows=self.format_history_rows,
+                                         columns=columns, show='headings')
             
             records_tree.heading('Visit #', text='Visit #')
             records_tree.heading('Entry Time', text='Entry Time')
@@ -1018,6 +1745,7 @@ class JewelryShopDashboard:
             records_tree.heading('Price', text='Price ($)')
             records_tree.heading('Product Image', text='Product Image')
             records_tree.heading('Generate', text='Generate')
+            records_tree.enable_sorting()
             
             records_tree.column('Visit #', width=60)
             records_tree.column('Entry Time', width=150)
@@ -1029,81 +1757,13 @@ class JewelryShopDashboard:
             records_tree.column('Product Image', width=100)
             records_tree.column('Generate', width=100)
             
-            scrollbar = ttk.Scrollbar(records_frame, orient=tk.VERTICAL, command=records_tree.yview)
-            records_tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar = ttk.Scrollbar(records_frame, orient=tk.VERTICAL)
+            records_tree.attach_scrollbar(scrollbar)
             
             records_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
             scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
             
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                SELECT 
-                    c.customer_id, 
-                    c.entry_time, 
-                    c.exit_time, 
-                    c.visit_count,
-                    p.product_id,
-                    p.product_name,
-                    p.product_price,
-                    p.product_image
-                FROM customers c
-                LEFT JOIN purchases p ON c.customer_id = p.customer_id
-                WHERE c.name = ?
-                ORDER BY c.entry_time DESC
-            """, (customer_name,))
-            
-            records = cursor.fetchall()
-            
-            for i, (customer_id, entry_time, exit_time, visit_count, product_id, product_name, product_price, product_image) in enumerate(records, 1):
-                try:
-                    entry_dt = datetime.strptime(entry_time, '%Y-%m-%d %H:%M:%S')
-                    entry_str = entry_dt.strftime('%Y-%m-%d %I:%M %p')
-                    
-                    if exit_time:
-                        exit_dt = datetime.strptime(exit_time, '%Y-%m-%d %H:%M:%S')
-                        exit_str = exit_dt.strftime('%Y-%m-%d %I:%M %p')
-                        duration = exit_dt - entry_dt
-                        duration_str = str(duration)
-                        if duration.total_seconds() < 3600:
-                            minutes = int(duration.total_seconds() / 60)
-                            duration_str = f"{minutes} minutes"
-                    else:
-                        exit_str = "-"
-                        duration_str = "In Progress"
-                    
-                    if product_id is None and product_name is None and product_price is None:
-                        product_id_display = "-"
-                        product_name_display = "-"
-                        product_price_display = "-"
-                        image_display = "-"
-                        generate_display = "-"
-                    else:
-                        product_id_display = product_id if product_id else "-"
-                        product_name_display = product_name if product_name else "-"
-                        product_price_display = f"${product_price:.2f}" if product_price is not None else "-"
-                        image_display = "View" if product_image else "-"
-                        generate_display = "Generate" if product_image else "-"
-                    
-                    item_id = records_tree.insert('', 'end', values=(
-                        visit_count,
-                        entry_str,
-                        exit_str,
-                        duration_str,
-                        product_id_display,
-                        product_name_display,
-                        product_price_display,
-                        image_display,
-                        generate_display
-                    ))
-                    
-                    if product_image:
-                        records_tree.set(item_id, 'Product Image', "View")
-                        records_tree.set(item_id, 'Generate', "Generate")
-                        records_tree.item(item_id, tags=('has_image',))
-                        
-                except Exception as e:
-                    print(f"Error processing record {customer_id}: {e}")
-                    continue
+            records_tree.reload()
             
             def on_tree_click(event):
                 item = records_tree.identify_row(event.y)
@@ -1111,14 +1771,11 @@ class JewelryShopDashboard:
                     return
                 
                 column = records_tree.identify_column(event.x)
+                image_hash = records_tree.row_for(item)[8]
                 if column == '#8' and records_tree.item(item, 'values')[7] == "View":
-                    customer_id = records[records_tree.index(item)][0]
-                    product_image = records[records_tree.index(item)][7]
-                    self.view_image(product_image)
+                    self.view_image(image_hash)
                 elif column == '#9' and records_tree.item(item, 'values')[8] == "Generate":
-                    customer_id = records[records_tree.index(item)][0]
-                    product_image = records[records_tree.index(item)][7]
-                    self.generate_image_from_gradio(product_image)
+                    self.generate_image_from_gradio(self.image_store.iter_chunks(image_hash))
             
             records_tree.tag_configure('has_image', foreground='blue')
             records_tree.bind('<Button-1>', on_tree_click)
@@ -1133,16 +1790,22 @@ class JewelryShopDashboard:
             messagebox.showerror("Error", f"Failed to show past records: {e}")
             print(f"Past records error: {e}")
 
-    def generate_image_from_gradio(self, image_data):
+    def generate_image_from_gradio(self, image_chunks):
         """Redirect to Hugging Face Space with the purchased image"""
+        import tempfile
+        import webbrowser
+        
         try:
-            if not image_data:
-                raise ValueError("No image data provided")
-            print(f"Image data type: {type(image_data)}, length: {len(image_data)}")
-
+            size = 0
             with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
                 temp_path = temp_file.name
-                temp_file.write(image_data)
+                for chunk in image_chunks:
+                    temp_file.write(chunk)
+                    size += len(chunk)
+            if not size:
+                os.remove(temp_path)
+                raise ValueError("No image data provided")
+            print(f"Streamed {size} bytes of image data to {temp_path}")
 
             huggingface_url = "http://127.0.0.1:7860/"
             webbrowser.open(huggingface_url)
@@ -1157,15 +1820,25 @@ class JewelryShopDashboard:
             messagebox.showerror("Error", f"Failed to process redirection: {e}")
             print(f"Redirection error: {e}")
 
+    def notify_inventory_changed(self, product_ids):
+        """Push a stock change to every open inventory view"""
+        for listener in list(self.inventory_listeners):
+            listener(product_ids)
+
+    def format_inventory_row(self, row):
+        """Turn an inventory query row into Treeview values and tags"""
+        product_id, name, price, quantity, stock_value, reorder_level, image_hash, low = row
+        values = (product_id, name, f"${price:.2f}", quantity, f"${stock_value:,.2f}", reorder_level)
+        return values, ('low_stock',) if low else ()
+
     def show_inventory(self):
-        """Show current inventory with Product ID and Quantity"""
+        """Show a live, paged inventory panel with stock values and thumbnails"""
         try:
-            # Create a new window
+            # Not modal, so it can stay open beside exit dialogs and follow their sales
             inventory_dialog = tk.Toplevel(self.root)
             inventory_dialog.title("Current Inventory")
-            inventory_dialog.geometry("400x400")
+            inventory_dialog.geometry("820x560")
             inventory_dialog.transient(self.root)
-            inventory_dialog.grab_set()
             
             inventory_dialog.update_idletasks()
             width = inventory_dialog.winfo_width()
@@ -1174,47 +1847,299 @@ class JewelryShopDashboard:
             y = (inventory_dialog.winfo_screenheight() // 2) - (height // 2)
             inventory_dialog.geometry(f'+{x}+{y}')
             
-            # Frame for the inventory table
+            filter_frame = ttk.Frame(inventory_dialog)
+            filter_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+            ttk.Label(filter_frame, text="Search:").pack(side=tk.LEFT, padx=5)
+            search_var = tk.StringVar()
+            ttk.Entry(filter_frame, textvariable=search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+            low_stock_var = tk.BooleanVar(value=False)
+            ttk.Checkbutton(filter_frame, text="Low stock only", variable=low_stock_var).pack(side=tk.LEFT, padx=5)
+            
             inventory_frame = ttk.LabelFrame(inventory_dialog, text="Inventory Items", padding=10)
             inventory_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
             
-            # Treeview for inventory
-            columns = ('Product ID', 'Quantity')
-            inventory_tree = ttk.Treeview(inventory_frame, columns=columns, show='headings')
+            # Sorting, searching (through the FTS index) and the low-stock filter
+            # all run in SQL against the indexes set up by setup_stock_levels
+            pager = KeysetPager(
+                self.inventory_conn,
+                columns=f"""
+                    product_id, product_name, price, quantity, price * quantity,
+                    reorder_level, image_hash, {LOW_STOCK}
+                """,
+                source="inventory",
+                sort_keys={
+                    'ID': ('product_id',),
+                    'Name': ('product_name', 'product_id'),
+                    'Price': ('price', 'product_id'),
+                    'Stock': ('quantity', 'product_id'),
+                    'Stock Value': ('(price * quantity)', 'product_id'),
+                },
+                default_sort='ID',
+                search_sql="rowid IN (SELECT rowid FROM product_fts WHERE product_fts MATCH ?)",
+                search_param=match_expression
+            )
+            
+            ttk.Style().configure('Inventory.Treeview', rowheight=44)
+            columns = ('ID', 'Name', 'Price', 'Stock', 'Stock Value', 'Reorder At')
+            inventory_tree = PagedTreeview(
+                inventory_frame, pager, self.format_inventory_row,
+                format_image=lambda row: self.get_thumbnail(row[6], 40),
+                columns=columns, show='tree headings', style='Inventory.Treeview'
+            )
             
-            inventory_tree.heading('Product ID', text='Product ID')
-            inventory_tree.heading('Quantity', text='Quantity')
+            inventory_tree.heading('#0', text='')
+            for column in columns:
+                inventory_tree.heading(column, text=column)
+            inventory_tree.enable_sorting()
             
-            inventory_tree.column('Product ID', width=150)
-            inventory_tree.column('Quantity', width=100)
+            inventory_tree.column('#0', width=56, stretch=False)
+            inventory_tree.column('ID', width=90)
+            inventory_tree.column('Name', width=200)
+            inventory_tree.column('Price', width=90)
+            inventory_tree.column('Stock', width=70)
+            inventory_tree.column('Stock Value', width=110)
+            inventory_tree.column('Reorder At', width=80)
+            inventory_tree.tag_configure('low_stock', foreground='red')
             
-            scrollbar = ttk.Scrollbar(inventory_frame, orient=tk.VERTICAL, command=inventory_tree.yview)
-            inventory_tree.configure(yscrollcommand=scrollbar.set)
+            scrollbar = ttk.Scrollbar(inventory_frame, orient=tk.VERTICAL)
+            inventory_tree.attach_scrollbar(scrollbar)
             
             inventory_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
             scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
             
-            # Fetch and display inventory data
-            cursor = self.inventory_conn.cursor()
-            cursor.execute("SELECT product_id, quantity FROM inventory ORDER BY product_id")
-            inventory_items = cursor.fetchall()
+            summary_var = tk.StringVar()
             
-            for product_id, quantity in inventory_items:
-                inventory_tree.insert('', 'end', values=(product_id, quantity))
+            def update_summary():
+                cursor = self.inventory_conn.cursor()
+                cursor.execute("SELECT COUNT(*), COALESCE(SUM(price * quantity), 0) FROM inventory")
+                products, stock_value = cursor.fetchone()
+                cursor.execute(f"SELECT COUNT(*) FROM inventory WHERE {LOW_STOCK}")
+                low = cursor.fetchone()[0]
+                summary_var.set(f"{products} products, stock value ${stock_value:,.2f}, {low} low on stock")
             
-            # Close button
-            button_frame = ttk.Frame(inventory_dialog)
-            button_frame.pack(fill=tk.X, pady=10)
+            def toggle_low_stock(*args):
+                pager.restrict(LOW_STOCK if low_stock_var.get() else None)
+                inventory_tree.reload()
+            
+            def on_stock_changed(product_ids):
+                inventory_tree.refresh()
+                update_summary()
             
-            ttk.Button(button_frame, text="Close", command=inventory_dialog.destroy).pack(side=tk.LEFT, padx=5)
+            def on_destroy(event):
+                if event.widget is inventory_dialog and on_stock_changed in self.inventory_listeners:
+                    self.inventory_listeners.remove(on_stock_changed)
+            
+            search_var.trace('w', lambda *args: inventory_tree.search(search_var.get()))
+            low_stock_var.trace('w', toggle_low_stock)
+            self.inventory_listeners.append(on_stock_changed)
+            inventory_dialog.bind('<Destroy>', on_destroy)
+            
+            inventory_tree.reload()
+            update_summary()
+            
+            button_frame = ttk.Frame(inventory_dialog)
+            button_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+            ttk.Label(button_frame, textvariable=summary_var).pack(side=tk.LEFT, padx=5)
+            ttk.Button(button_frame, text="Close", command=inventory_dialog.destroy).pack(side=tk.RIGHT, padx=5)
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to show inventory: {e}")
             print(f"Inventory display error: {e}")        
 
+    def show_reports(self):
+        """Show footfall, dwell time and conversion reports from the daily rollups"""
+        try:
+            dialog = tk.Toplevel(self.root)
+            dialog.title("Reports")
+            dialog.geometry("900x700")
+            dialog.transient(self.root)
+            
+            dialog.update_idletasks()
+            width = dialog.winfo_width()
+            height = dialog.winfo_height()
+            x = (dialog.winfo_screenwidth() // 2) - (width // 2)
+            y = (dialog.winfo_screenheight() // 2) - (height // 2)
+            dialog.geometry(f'+{x}+{y}')
+            
+            periods = {"Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "All time": None}
+            top_frame = ttk.Frame(dialog)
+            top_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+            ttk.Label(top_frame, text="Period:").pack(side=tk.LEFT, padx=5)
+            period_var = tk.StringVar(value="Last 30 days")
+            ttk.Combobox(top_frame, textvariable=period_var, values=list(periods),
+                         state="readonly", width=14).pack(side=tk.LEFT, padx=5)
+            summary_var = tk.StringVar()
+            ttk.Label(top_frame, textvariable=summary_var).pack(side=tk.LEFT, padx=10)
+            
+            hours_frame = ttk.LabelFrame(dialog, text="Footfall by Hour (UTC)", padding=10)
+            hours_frame.pack(fill=tk.X, padx=10, pady=10)
+            chart = tk.Canvas(hours_frame, height=140, bg='white', highlightthickness=0)
+            chart.pack(fill=tk.X)
+            
+            tables_frame = ttk.Frame(dialog)
+            tables_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
+            
+            daily_frame = ttk.LabelFrame(tables_frame, text="By Day", padding=10)
+            daily_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+            daily_columns = ('Day', 'Visits', 'Avg Dwell', 'Buyers', 'Conversion')
+            daily_tree = ttk.Treeview(daily_frame, columns=daily_columns, show='headings')
+            for column, width in zip(daily_columns, (90, 60, 80, 60, 80)):
+                daily_tree.heading(column, text=column)
+                daily_tree.column(column, width=width)
+            daily_scrollbar = ttk.Scrollbar(daily_frame, orient=tk.VERTICAL, command=daily_tree.yview)
+            daily_tree.configure(yscrollcommand=daily_scrollbar.set)
+            daily_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            daily_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            
+            product_frame = ttk.LabelFrame(tables_frame, text="By Product", padding=10)
+            product_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0))
+            product_columns = ('Product ID', 'Product', 'Units', 'Revenue', 'Conversion')
+            product_tree = ttk.Treeview(product_frame, columns=product_columns, show='headings')
+            for column, width in zip(product_columns, (70, 130, 50, 90, 80)):
+                product_tree.heading(column, text=column)
+                product_tree.column(column, width=width)
+            product_scrollbar = ttk.Scrollbar(product_frame, orient=tk.VERTICAL, command=product_tree.yview)
+            product_tree.configure(yscrollcommand=product_scrollbar.set)
+            product_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            product_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+            
+            def draw_hours(totals, per_day):
+                chart.delete('all')
+                chart.update_idletasks()
+                width = max(chart.winfo_width(), 600)
+                height = int(chart['height'])
+                bar = width / 24
+                peak = max(int(totals.max()), 1)
+                for hour, (total, mean) in enumerate(zip(totals, per_day)):
+                    top = height - 20 - (height - 35) * total / peak
+                    chart.create_rectangle(hour * bar + 3, top, (hour + 1) * bar - 3, height - 20,
+                                           fill='#4a7ebb' if total < peak else '#d9534f', outline='')
+                    chart.create_text(hour * bar + bar / 2, height - 10, text=f"{hour:02d}", font=('Helvetica', 8))
+                    if total:
+                        chart.create_text(hour * bar + bar / 2, top - 7, text=f"{mean:.1f}", font=('Helvetica', 7))
+            
+            def load(*args):
+                days = periods[period_var.get()]
+                since = (np.datetime64('now', 'D') - np.timedelta64(days - 1, 'D')).astype(str) if days else None
+                report = daily_report(self.conn, since)
+                
+                dwell = report['avg_dwell_minutes_total']
+                conversion = report['conversion_total']
+                summary_var.set(
+                    f"{report['total_visits']} visits, "
+                    f"avg dwell {'-' if np.isnan(dwell) else f'{dwell:.0f} min'}, "
+                    f"conversion {'-' if np.isnan(conversion) else f'{conversion:.1%}'}"
+                )
+                
+                daily_tree.delete(*daily_tree.get_children())
+                for day, visits, avg_dwell, buyers, rate in zip(
+                        report['days'].astype(str), report['visits'], report['avg_dwell_minutes'],
+                        report['buyers'], report['conversion']):
+                    daily_tree.insert('', 0, values=(
+                        day, visits,
+                        "-" if np.isnan(avg_dwell) else f"{avg_dwell:.0f} min",
+                        buyers,
+                        "-" if np.isnan(rate) else f"{rate:.1%}"
+                    ))
+                
+                product_tree.delete(*product_tree.get_children())
+                for product_id, name, orders, units, revenue, rate in product_report(self.conn, since):
+                    product_tree.insert('', 'end', values=(
+                        product_id, name, units, f"${revenue:,.2f}",
+                        "-" if np.isnan(rate) else f"{rate:.1%}"
+                    ))
+                
+                draw_hours(*peak_hours(self.conn, since))
+            
+            period_var.trace('w', load)
+            load()
+            
+            ttk.Button(dialog, text="Close", command=dialog.destroy).pack(pady=(0, 10))
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to show reports: {e}")
+            print(f"Reports error: {e}")
+
+    def show_recordings(self):
+        """Browse recorded events by person and time, and open their snapshots and clips"""
+        if self.recorder is None:
+            messagebox.showinfo("Info", "The event recorder is not running")
+            return
+        try:
+            dialog = tk.Toplevel(self.root)
+            dialog.title("Recorded Events")
+            dialog.geometry("700x500")
+            dialog.transient(self.root)
+            
+            top_frame = ttk.Frame(dialog)
+            top_frame.pack(fill=tk.X, padx=10, pady=(10, 0))
+            ttk.Label(top_frame, text="Name:").pack(side=tk.LEFT, padx=5)
+            name_var = tk.StringVar()
+            ttk.Entry(top_frame, textvariable=name_var, width=20).pack(side=tk.LEFT, padx=5)
+            stats_var = tk.StringVar()
+            ttk.Label(top_frame, textvariable=stats_var).pack(side=tk.LEFT, padx=10)
+            
+            columns = ('Time', 'Event', 'Name', 'Camera', 'Size')
+            events_tree = ttk.Treeview(dialog, columns=columns, show='headings')
+            for column, width in zip(columns, (150, 100, 120, 80, 80)):
+                events_tree.heading(column, text=column)
+                events_tree.column(column, width=width)
+            events_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+            events = {}
+            
+            def load(*args):
+                stats = self.recorder.stats()
+                stats_var.set(f"{stats['bytes'] / (1024 * 1024):.0f} MB used, {stats['queued']} encoding, "
+                              f"{stats['dropped']} dropped, {stats['evicted']} evicted")
+                rows = self.recorder.find(name=name_var.get().strip() or None)
+                events.clear()
+                events_tree.delete(*events_tree.get_children())
+                times = format_epochs([row[4] for row in rows])
+                for row, time_str in zip(rows, times):
+                    event_id, kind, name, camera, _, _, _, size = row
+                    events[str(event_id)] = row
+                    events_tree.insert('', 'end', iid=str(event_id), values=(
+                        time_str, kind.replace('_', ' '), name or "-", camera or "-", f"{size / 1024:.0f} KB"
+                    ))
+            
+            def open_event(event=None):
+                selected = events_tree.selection()
+                if not selected:
+                    return
+                _, kind, name, _, _, snapshot, clip, _ = events[selected[0]]
+                viewer = tk.Toplevel(dialog)
+                viewer.title(f"{kind.replace('_', ' ').title()}: {name or 'unknown'}")
+                viewer.transient(dialog)
+                image = Image.open(self.recorder.path(snapshot))
+                image.thumbnail((self.frame_width, self.frame_height))
+                photo = ImageTk.PhotoImage(image)
+                label = ttk.Label(viewer, image=photo)
+                label.image = photo
+                label.pack(padx=10, pady=10)
+                if clip:
+                    def play_clip():
+                        import webbrowser
+                        webbrowser.open('file://' + os.path.abspath(self.recorder.path(clip)))
+                    ttk.Button(viewer, text="Play Clip", command=play_clip).pack(side=tk.LEFT, padx=10, pady=5)
+                ttk.Button(viewer, text="Close", command=viewer.destroy).pack(side=tk.RIGHT, padx=10, pady=5)
+            
+            events_tree.bind('<Double-1>', open_event)
+            name_var.trace('w', load)
+            load()
+            
+            button_frame = ttk.Frame(dialog)
+            button_frame.pack(pady=(0, 10))
+            ttk.Button(button_frame, text="Refresh", command=load).pack(side=tk.LEFT, padx=5)
+            ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to show recordings: {e}")
+            print(f"Recordings error: {e}")
+
 def main():
     root = tk.Tk()
     app = JewelryShopDashboard(root)
+    print(f"Startup: window ready after {time.perf_counter() - app.started:.2f}s")
     root.mainloop()
 
 if __name__ == "__main__":
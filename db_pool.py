@@ -0,0 +1,137 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from db_writer import DatabaseWriter
+
+# Applied to every connection.  WAL lets readers run alongside the writer;
+# synchronous=NORMAL is durable across application crashes in WAL mode and
+# only fsyncs at checkpoints.
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),          # KiB, i.e. 16 MB of page cache per connection
+    ("mmap_size", 256 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 5000),
+)
+
+# Pragmas that are set per database rather than per connection
+SCHEMA_PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size")
+
+
+def connect(path, readonly=False, check_same_thread=True, attach=None):
+    """Open a connection to ``path`` with the tuned pragmas applied.
+
+    ``attach`` maps schema names to further database files to ATTACH, so one
+    transaction can span several databases.
+    """
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=check_same_thread)
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    for schema, attached_path in (attach or {}).items():
+        conn.execute("ATTACH DATABASE ? AS " + schema, (attached_path,))
+        for name, value in PRAGMAS:
+            if name in SCHEMA_PRAGMAS:
+                conn.execute(f"PRAGMA {schema}.{name} = {value}")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class ConnectionPool:
+    """Connection management for one database file.
+
+    There is exactly one writer (a DatabaseWriter thread owning the only
+    write connection), a small pool of read-only connections handed out with
+    ``reader()``, and a background thread that checkpoints the WAL every
+    ``checkpoint_interval`` seconds so it does not grow without bound.
+    Databases listed in ``attach`` are ATTACHed to the writer and readers.
+    """
+
+    def __init__(self, path, readers=4, checkpoint_interval=60, batch_window=0.005, attach=None):
+        self.path = path
+        self.attach = attach
+        self.max_readers = readers
+        self.checkpoint_interval = checkpoint_interval
+        self.writer = DatabaseWriter(path, batch_window=batch_window,
+                                     connect=lambda: connect(path, attach=attach))
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checkpointer = threading.Thread(
+            target=self._checkpoint_loop, name=f"Checkpoint({path})", daemon=True)
+        self.checkpoints = 0
+        self.last_checkpoint = None
+
+    def start(self):
+        self.writer.start()
+        self._checkpointer.start()
+        return self
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read-only connection, opening one if the pool is not yet full"""
+        conn = None
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._reader_count < self.max_readers:
+                    self._reader_count += 1
+                    create = True
+                else:
+                    create = False
+            conn = (connect(self.path, readonly=True, check_same_thread=False, attach=self.attach)
+                    if create else self._readers.get())
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def checkpoint(self, mode="PASSIVE"):
+        """Copy WAL frames back into the database without blocking readers or the writer"""
+        conn = connect(self.path)
+        try:
+            busy, wal_pages, checkpointed = conn.execute(
+                f"PRAGMA wal_checkpoint({mode})").fetchone()
+        finally:
+            conn.close()
+        self.checkpoints += 1
+        self.last_checkpoint = (busy, wal_pages, checkpointed)
+        return self.last_checkpoint
+
+    def _checkpoint_loop(self):
+        while not self._stop.wait(self.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except sqlite3.Error as e:
+                print(f"WAL checkpoint of {self.path} failed: {e}")
+
+    def close(self):
+        """Drain the writer, checkpoint the WAL and close pooled readers"""
+        self._stop.set()
+        self.writer.close()
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        try:
+            self.checkpoint("TRUNCATE")
+        except sqlite3.Error as e:
+            print(f"Final WAL checkpoint of {self.path} failed: {e}")
+
+    def metrics(self):
+        metrics = self.writer.metrics()
+        metrics.update({
+            'readers_open': self._reader_count,
+            'readers_idle': self._readers.qsize(),
+            'checkpoints': self.checkpoints,
+            'last_checkpoint': self.last_checkpoint,
+        })
+        return metrics
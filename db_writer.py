@@ -0,0 +1,152 @@
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class DatabaseWriter(threading.Thread):
+    """Background thread that owns the write connection of one database.
+
+    Writes are queued as callables ``fn(conn, *args)`` and run in arrival
+    order.  Everything that arrives within ``batch_window`` seconds of the
+    first queued write is grouped into a single transaction, so a burst of
+    check-ins costs one commit (and one fsync) instead of one each.  Every
+    write runs inside its own SAVEPOINT, so a failing write is rolled back
+    without taking the rest of its batch with it.
+
+    ``submit`` returns a ``concurrent.futures.Future`` that resolves with the
+    callable's return value once the batch has committed.
+    """
+
+    def __init__(self, path, batch_window=0.005, max_batch=64, name=None, connect=None):
+        super().__init__(name=name or f"DatabaseWriter({path})", daemon=True)
+        self.path = path
+        self._connect = connect or (lambda: sqlite3.connect(path))
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._commit_latencies = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+        self.commits = 0
+        self.writes = 0
+        self.failed_writes = 0
+
+    def connect(self):
+        """Open the write connection; transactions are managed explicitly"""
+        conn = self._connect()
+        conn.isolation_level = None
+        return conn
+
+    def submit(self, fn, *args):
+        """Queue ``fn(conn, *args)`` and return a Future for its result"""
+        if self._stopped:
+            raise RuntimeError("Database writer is closed")
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def execute(self, sql, params=()):
+        """Queue a single statement; the Future resolves to its rowcount"""
+        return self.submit(lambda conn: conn.execute(sql, params).rowcount)
+
+    def close(self, timeout=5):
+        """Finish queued writes and close the connection"""
+        if not self._stopped:
+            self._stopped = True
+            self._queue.put(None)
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        conn = self.connect()
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    return
+                batch = [first]
+                deadline = time.monotonic() + self.batch_window
+                stop = False
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._run_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn, batch):
+        results = []
+        started = time.perf_counter()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((future, fn(conn, *args), None))
+                    conn.execute("RELEASE write")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            with self._lock:
+                self.failed_writes += len(batch)
+            print(f"Database writer error: {e}")
+            return
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.commits += 1
+            self.writes += len(results)
+            self.failed_writes += sum(1 for _, _, error in results if error is not None)
+            self._commit_latencies.append(elapsed)
+            self._batch_sizes.append(len(results))
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def metrics(self):
+        """Return commit latency and batch size statistics over recent batches"""
+        with self._lock:
+            latencies = sorted(self._commit_latencies)
+            sizes = list(self._batch_sizes)
+            metrics = {
+                'commits': self.commits,
+                'writes': self.writes,
+                'failed_writes': self.failed_writes,
+                'queue_depth': self._queue.qsize(),
+            }
+        if latencies:
+            metrics.update({
+                'commit_latency_ms_avg': sum(latencies) / len(latencies) * 1000,
+                'commit_latency_ms_p95': latencies[int(len(latencies) * 0.95)] * 1000,
+                'commit_latency_ms_max': latencies[-1] * 1000,
+                'batch_size_avg': sum(sizes) / len(sizes),
+                'batch_size_max': max(sizes),
+            })
+        return metrics
@@ -0,0 +1,165 @@
+import argparse
+
+import numpy as np
+
+from db_pool import connect
+from db_writer import DatabaseWriter
+from gallery import FaceGallery, match_threshold, similarity_tiles
+from retention import ARCHIVE_DB, ARCHIVE_SCHEMA, rename_archived, total_visits_sql
+
+
+def duplicate_groups(features, threshold, tile_bytes=64 * 1024 * 1024):
+    """Group the rows of ``features`` that are more similar than ``threshold``.
+
+    Every pair above the threshold joins a union-find, so a group also
+    links A and C through B.  Returns lists of (row, similarity to the
+    closest other member), largest groups first; rows alike to no other
+    row are left out.
+    """
+    parent = np.arange(len(features))
+    closest = np.full(len(features), -np.inf)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j, scores in similarity_tiles(features, tile_bytes):
+        rows, cols = np.nonzero(scores > threshold)
+        if i == j:
+            above = cols > rows
+            rows, cols = rows[above], cols[above]
+        similarities = scores[rows, cols]
+        rows, cols = rows + i, cols + j
+        np.maximum.at(closest, rows, similarities)
+        np.maximum.at(closest, cols, similarities)
+        for a, b in zip(rows, cols):
+            parent[find(a)] = find(b)
+
+    groups = {}
+    for row in np.flatnonzero(closest > -np.inf):
+        groups.setdefault(find(row), []).append((int(row), float(closest[row])))
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def find_duplicates(conn, threshold=None, tile_bytes=64 * 1024 * 1024):
+    """Propose merges of customer names whose latest encodings look alike.
+
+    ``threshold`` defaults to the shop's match threshold.  Returns a list
+    of groups, each a list of (name, visits, similarity) with the name to
+    keep first: the one with the most visits, then the earliest seen.
+    """
+    gallery = FaceGallery()
+    gallery.load(conn)
+    names, _, features = gallery.encodings()
+    threshold = match_threshold(conn) if threshold is None else threshold
+    proposals = []
+    for group in duplicate_groups(features, threshold, tile_bytes):
+        members = []
+        for row, similarity in group:
+            visits, first_entry = conn.execute(f"""
+                SELECT {total_visits_sql('?1')},
+                       (SELECT MIN(entry_time) FROM main.customers WHERE name = ?1)
+            """, (names[row],)).fetchone()
+            members.append((names[row], visits, similarity, first_entry or ''))
+        members.sort(key=lambda m: (-m[1], m[3], m[0]))
+        proposals.append([member[:3] for member in members])
+    return proposals
+
+
+def merge_names(conn, keep, names):
+    """Merge the customers ``names`` into ``keep``; runs in the caller's transaction.
+
+    Their visits, archived ones included, are renamed to ``keep``, which
+    moves their purchases along.  If ``keep`` is left with several open
+    visits, the earliest stays open, takes over the purchases of the
+    others and they are deleted.  Visit numbers are then recounted in
+    entry order.  Returns the number of visits renamed.
+    """
+    moved = 0
+    for name in names:
+        if name == keep:
+            continue
+        moved += conn.execute("UPDATE main.customers SET name = ? WHERE name = ?", (keep, name)).rowcount
+        rename_archived(conn, name, keep)
+
+    open_visits = [row[0] for row in conn.execute("""
+        SELECT customer_id FROM main.customers
+        WHERE name = ? AND exit_time IS NULL
+        ORDER BY entry_time, customer_id
+    """, (keep,))]
+    for customer_id in open_visits[1:]:
+        conn.execute("UPDATE main.purchases SET customer_id = ? WHERE customer_id = ?",
+                     (open_visits[0], customer_id))
+        conn.execute("DELETE FROM main.customers WHERE customer_id = ?", (customer_id,))
+
+    conn.execute("""
+        UPDATE main.customers
+        SET visit_count = COALESCE((SELECT visits FROM main.archived_visits WHERE name = ?1), 0) + (
+            SELECT COUNT(*) FROM main.customers c
+            WHERE c.name = ?1
+              AND (COALESCE(c.entry_time, ''), c.customer_id)
+                  <= (COALESCE(customers.entry_time, ''), customers.customer_id)
+        )
+        WHERE name = ?1
+    """, (keep,))
+    return moved
+
+
+def merge_groups(conn, groups):
+    """Apply merges given as (keep, names) pairs; returns the visits renamed"""
+    return sum(merge_names(conn, keep, names) for keep, names in groups)
+
+
+def format_proposal(number, group):
+    (keep, visits, _), others = group[0], group[1:]
+    merged = ", ".join(f"{name} ({count} visits, {similarity:.3f})" for name, count, similarity in others)
+    return f"{number:>3}. {keep} ({visits} visits) <- {merged}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find customers registered under several names and merge them")
+    parser.add_argument('--db', default='jewelry_shop.db')
+    parser.add_argument('--archive', default=ARCHIVE_DB)
+    parser.add_argument('--threshold', type=float,
+                        help="similarity above which two faces are the same person (default: match threshold)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('find', help="list proposed merges")
+    merge = commands.add_parser('merge', help="apply proposed merges in one transaction")
+    merge.add_argument('--group', type=int, action='append', help="number of a proposal to apply (default: all)")
+    merge.add_argument('--names', nargs='+', metavar='NAME',
+                       help="merge these names into the first one instead of the proposals")
+    args = parser.parse_args()
+
+    open_db = lambda: connect(args.db, attach={ARCHIVE_SCHEMA: args.archive})
+    if args.command == 'merge' and args.names:
+        plan = [(args.names[0], args.names[1:])]
+    else:
+        conn = open_db()
+        try:
+            proposals = find_duplicates(conn, args.threshold)
+        finally:
+            conn.close()
+        for number, group in enumerate(proposals, 1):
+            print(format_proposal(number, group))
+        if not proposals:
+            print("No duplicates found")
+        if args.command == 'find':
+            return
+        chosen = args.group or range(1, len(proposals) + 1)
+        plan = [(proposals[n - 1][0][0], [name for name, _, _ in proposals[n - 1][1:]])
+                for n in chosen if 1 <= n <= len(proposals)]
+    if not plan:
+        return
+
+    writer = DatabaseWriter(args.db, connect=open_db)
+    writer.start()
+    try:
+        moved = writer.submit(merge_groups, plan).result()
+    finally:
+        writer.close()
+    print(f"Merged {sum(len(names) for _, names in plan)} names into {len(plan)}, renaming {moved} visits")
+
+if __name__ == "__main__":
+    main()
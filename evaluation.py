@@ -0,0 +1,207 @@
+import argparse
+import csv
+import os
+import time
+
+import cv2
+import numpy as np
+
+from db_pool import connect
+from face_features import DEFAULT_DESCRIPTOR, DESCRIPTORS, extract_features
+from gallery import MATCH_THRESHOLD, match_threshold, set_match_threshold, similarity_tiles
+
+# Similarities are counted in BINS buckets over [-1, 1], so thresholds are
+# resolved to 2 / BINS and memory does not grow with the number of pairs
+BINS = 4000
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def similarity_histograms(features, labels, tile_bytes=64 * 1024 * 1024):
+    """Count every pair's cosine similarity into (genuine, impostor) histograms.
+
+    ``features`` holds one unit-length row per face and ``labels`` its
+    identity.  Pairs are scored a tile at a time (see similarity_tiles)
+    and only i < j is counted.  Returns two int64 arrays of BINS counts.
+    """
+    labels = np.asarray(labels)
+    scale = np.float32(BINS / 2)
+    genuine = np.zeros(BINS + 1, dtype=np.int64)
+    total = np.zeros(BINS + 1, dtype=np.int64)
+    buckets = lower = None
+    for i, j, s in similarity_tiles(features, tile_bytes):
+        if buckets is None:  # the first tile is the largest
+            buckets = np.empty(s.shape, dtype=np.int32)
+            lower = np.tri(len(s), dtype=bool)  # j <= i within a diagonal tile
+        b = buckets[:s.shape[0], :s.shape[1]]
+        np.add(s, 1, out=s)
+        np.multiply(s, scale, out=s)
+        np.copyto(b, s, casting='unsafe')
+        np.clip(b, 0, BINS - 1, out=b)
+        if i == j:
+            b[lower[:s.shape[0], :s.shape[1]]] = BINS  # dropped below
+        total += np.bincount(b.ravel(), minlength=BINS + 1)
+        same = labels[i:i + s.shape[0], None] == labels[None, j:j + s.shape[1]]
+        genuine += np.bincount(b[same], minlength=BINS + 1)
+    return genuine[:BINS], (total - genuine)[:BINS]
+
+
+def error_rates(genuine, impostor):
+    """Return (thresholds, FAR, FRR) for each bucket edge.
+
+    A pair matches when its similarity is above the threshold, as in
+    FaceGallery.match: FAR is the share of impostor pairs that would
+    match, FRR the share of genuine pairs that would not.
+    """
+    thresholds = np.linspace(-1, 1, BINS + 1)
+    above = np.concatenate([np.cumsum(impostor[::-1])[::-1], [0]])
+    below = np.concatenate([[0], np.cumsum(genuine)])
+    far = above / max(int(impostor.sum()), 1)
+    frr = below / max(int(genuine.sum()), 1)
+    return thresholds, far, frr
+
+
+def evaluate(features, labels, target_far=1e-3, current=MATCH_THRESHOLD, tile_bytes=64 * 1024 * 1024):
+    """Score all pairs and summarise the error rates; returns a dict"""
+    started = time.perf_counter()
+    genuine, impostor = similarity_histograms(features, labels, tile_bytes)
+    thresholds, far, frr = error_rates(genuine, impostor)
+    eer = int(np.argmin(np.abs(far - frr)))
+    # Lowest threshold meeting the target FAR rejects the fewest genuine faces
+    recommended = int(np.argmax(far <= target_far))
+    at_current = min(int(np.searchsorted(thresholds, current)), BINS)
+    return {
+        'faces': len(features),
+        'identities': len(np.unique(labels)),
+        'genuine_pairs': int(genuine.sum()),
+        'impostor_pairs': int(impostor.sum()),
+        'eer': (far[eer] + frr[eer]) / 2,
+        'eer_threshold': thresholds[eer],
+        'recommended_threshold': thresholds[recommended],
+        'recommended_far': far[recommended],
+        'recommended_frr': frr[recommended],
+        'current_threshold': current,
+        'current_far': far[at_current],
+        'current_frr': frr[at_current],
+        'seconds': time.perf_counter() - started,
+        'curve': (thresholds, far, frr),
+    }
+
+
+def load_folder(directory, descriptor):
+    """Describe labeled face crops laid out as ``directory/<person>/<image>``"""
+    features, labels = [], []
+    for person in sorted(os.listdir(directory)):
+        person_dir = os.path.join(directory, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            face_img = cv2.imread(os.path.join(person_dir, filename))
+            if face_img is None:
+                print(f"Skipping unreadable {os.path.join(person, filename)}")
+                continue
+            features.append(extract_features(face_img, descriptor).astype(np.float32))
+            labels.append(person)
+    return np.array(features), np.array(labels)
+
+
+def load_gallery(conn):
+    """Stored encodings of every visit, labeled by customer name.
+
+    A check-in copies the encoding of an earlier visit, so identical
+    encodings of one name are counted once.
+    """
+    features, labels, seen = [], [], set()
+    for name, encoding in conn.execute("""
+        SELECT name, face_encoding FROM main.customers
+        WHERE face_encoding IS NOT NULL ORDER BY customer_id
+    """):
+        if (name, encoding) in seen:
+            continue
+        seen.add((name, encoding))
+        features.append(np.frombuffer(encoding, dtype=np.float64).astype(np.float32))
+        labels.append(name)
+    sizes = {len(f) for f in features}
+    if len(sizes) > 1:
+        size = max(sizes, key=[len(f) for f in features].count)
+        print(f"Skipping encodings that are not {size} values long")
+        labels = [label for label, f in zip(labels, features) if len(f) == size]
+        features = [f for f in features if len(f) == size]
+    return np.array(features), np.array(labels)
+
+
+def write_curve(path, curve):
+    """Write the ROC (TAR against FAR) and DET (FRR against FAR) points as CSV"""
+    thresholds, far, frr = curve
+    with open(path, 'w', newline='') as f:
+        out = csv.writer(f)
+        out.writerow(['threshold', 'far', 'frr', 'tar'])
+        previous = None
+        for threshold, a, r in zip(thresholds, far, frr):
+            if (a, r) != previous:  # only where a rate changes
+                out.writerow([f"{threshold:.4f}", f"{a:.6g}", f"{r:.6g}", f"{1 - r:.6g}"])
+                previous = (a, r)
+
+
+def format_result(descriptor, result):
+    lines = [
+        f"{descriptor}: {result['faces']} faces of {result['identities']} people, "
+        f"{result['genuine_pairs']} genuine and {result['impostor_pairs']} impostor pairs "
+        f"({result['seconds']:.1f}s)",
+        f"  EER {result['eer']:.2%} at threshold {result['eer_threshold']:.3f}",
+        f"  recommended threshold {result['recommended_threshold']:.3f}: "
+        f"FAR {result['recommended_far']:.3%}, FRR {result['recommended_frr']:.2%}",
+        f"  current threshold {result['current_threshold']:.3f}: "
+        f"FAR {result['current_far']:.3%}, FRR {result['current_frr']:.2%}",
+    ]
+    if not result['genuine_pairs']:
+        lines.append("  no genuine pairs: every person has one face, so FRR cannot be measured")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure face matching error rates and recommend a threshold")
+    parser.add_argument('--db', default='jewelry_shop.db')
+    parser.add_argument('--far', type=float, default=1e-3,
+                        help="highest acceptable share of impostor pairs matched (default 0.001)")
+    parser.add_argument('--curves', help="write ROC/DET points of each descriptor as CSV to this directory")
+    parser.add_argument('--apply', action='store_true',
+                        help=f"store the recommended threshold of {DEFAULT_DESCRIPTOR} for the dashboard")
+    commands = parser.add_subparsers(dest='command', required=True)
+    folder = commands.add_parser('folder', help="evaluate labeled face crops, one subfolder per person")
+    folder.add_argument('directory')
+    folder.add_argument('--descriptor', action='append', choices=sorted(DESCRIPTORS),
+                        help="descriptor to evaluate, repeatable (default: all)")
+    commands.add_parser('gallery', help="evaluate the encodings stored in the shop database")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        current = match_threshold(conn)
+        if args.command == 'folder':
+            datasets = [(d, lambda d=d: load_folder(args.directory, d))
+                        for d in args.descriptor or DESCRIPTORS]
+        else:
+            datasets = [(DEFAULT_DESCRIPTOR, lambda: load_gallery(conn))]
+        for descriptor, load in datasets:
+            features, labels = load()
+            if len(features) < 2:
+                print(f"{descriptor}: fewer than two faces, nothing to evaluate")
+                continue
+            result = evaluate(features, labels, args.far, current)
+            print(format_result(descriptor, result))
+            if args.curves:
+                os.makedirs(args.curves, exist_ok=True)
+                write_curve(os.path.join(args.curves, f"{args.command}-{descriptor}.csv"), result['curve'])
+            if args.apply and descriptor == DEFAULT_DESCRIPTOR:
+                if not result['genuine_pairs']:
+                    print("  not applied: no genuine pairs")
+                    continue
+                set_match_threshold(conn, round(float(result['recommended_threshold']), 4))
+                print(f"  stored as the match threshold (was {current:.3f}); restart the dashboard")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import time
+import zipfile
+
+import numpy as np
+
+from db_pool import connect
+from retention import ARCHIVE_DB, ARCHIVE_SCHEMA
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional; falls back to compressed CSV/NPZ
+    pa = None
+
+# Exported columns per table as (expression, name, kind).  BLOBs are never
+# read: product images are referenced by their image store hash and face
+# encodings stay in the shop.
+TABLES = {
+    'customers': [
+        ('customer_id', 'customer_id', 'int'),
+        ('name', 'name', 'text'),
+        ('entry_time', 'entry_time', 'text'),
+        ('exit_time', 'exit_time', 'text'),
+        ('entry_ts', 'entry_ts', 'int'),
+        ('exit_ts', 'exit_ts', 'int'),
+        ('visit_count', 'visit_count', 'int'),
+    ],
+    'purchases': [
+        ('purchase_id', 'purchase_id', 'int'),
+        ('customer_id', 'customer_id', 'int'),
+        ('sale_id', 'sale_id', 'text'),
+        ('product_id', 'product_id', 'text'),
+        ('product_name', 'product_name', 'text'),
+        ('product_price', 'product_price', 'float'),
+        ('quantity', 'quantity', 'int'),
+        ('image_hash', 'image_hash', 'text'),
+        ('purchase_time', 'purchase_time', 'text'),
+        ('purchase_ts', 'purchase_ts', 'int'),
+    ],
+}
+
+ID_COLUMNS = {'customers': 'customer_id', 'purchases': 'purchase_id'}
+
+# Rows a run picks up after the previous watermark: new ids, and rows the
+# sync change log (see sync.py) names since the last run, so closes by the
+# exit sweep, edits and changes from other terminals are exported again
+# and consumers should upsert on the id.  Deletes are not tracked.
+NEW_ROWS = "{id_column} > :last_id"
+CHANGED_ROWS = "uid IN (SELECT row_uid FROM main.change_log WHERE table_name = '{table}' AND seq > :last_seq)"
+
+MANIFEST = 'export_manifest.json'
+FORMATS = ('parquet', 'arrow', 'csv', 'npz')
+
+
+class CsvWriter:
+    """Gzip-compressed CSV, one file per table"""
+
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8', compresslevel=6)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for _, name, _ in columns])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class NpzWriter:
+    """Compressed NPZ written chunk by chunk as ``<column>/<chunk>.npy`` members.
+
+    Integers and floats are float64 with NaN for NULL; text is fixed-width
+    unicode with '' for NULL.  ``np.load`` opens the file as usual.
+    """
+
+    def __init__(self, path, columns):
+        self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.columns = columns
+        self.chunks = 0
+
+    def write(self, rows):
+        for index, (_, name, kind) in enumerate(self.columns):
+            values = [row[index] for row in rows]
+            if kind == 'text':
+                array = np.array(['' if value is None else str(value) for value in values])
+            else:
+                array = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            with self.zip.open(f"{name}/{self.chunks:06d}.npy", 'w', force_zip64=True) as member:
+                np.lib.format.write_array(member, array, allow_pickle=False)
+        self.chunks += 1
+
+    def close(self):
+        self.zip.close()
+
+
+class ArrowWriter:
+    """Parquet (one row group per chunk) or Arrow IPC file, via pyarrow"""
+
+    def __init__(self, path, columns, file_format):
+        types = {'int': pa.int64(), 'float': pa.float64(), 'text': pa.string()}
+        self.schema = pa.schema([(name, types[kind]) for _, name, kind in columns])
+        if file_format == 'parquet':
+            self.writer = pa.parquet.ParquetWriter(path, self.schema, compression='zstd')
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows):
+        arrays = [pa.array([row[index] for row in rows], type=field.type)
+                  for index, field in enumerate(self.schema)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(path, columns, file_format):
+    if file_format in ('parquet', 'arrow'):
+        if pa is None:
+            raise RuntimeError(f"{file_format} export needs pyarrow; use --format csv or npz")
+        return ArrowWriter(path, columns, file_format)
+    return CsvWriter(path, columns) if file_format == 'csv' else NpzWriter(path, columns)
+
+
+def extension(file_format):
+    return {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv.gz', 'npz': '.npz'}[file_format]
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'tables': {}, 'files': []}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(out_dir, manifest):
+    """Replace the manifest atomically, so a crashed run leaves the old watermarks"""
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _has_table(conn, schema, table):
+    return conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?",
+                        (table,)).fetchone() is not None
+
+
+def export_history(out_dir, db_path='jewelry_shop.db', file_format=None, chunk_size=10000, full=False,
+                   archive_path=ARCHIVE_DB):
+    """Stream customers and purchases into ``out_dir``, continuing from the last watermark.
+
+    Both tables are read from one snapshot with ``fetchmany(chunk_size)``
+    and written a chunk at a time, so memory is bounded by one chunk
+    whatever the table size.  Rows moved to the archive at ``archive_path``
+    are read along with the hot ones.  Each run writes new files named
+    after the run; the watermarks and file list are kept in
+    ``export_manifest.json``.  Returns {table: rows exported}.
+    """
+    file_format = file_format or ('parquet' if pa is not None else 'csv')
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {'tables': {}, 'files': []} if full else load_manifest(out_dir)
+    run = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+    existing = set(os.listdir(out_dir))
+    suffix = 1
+    while any(name.startswith(f"{table}-{run}.") for table in TABLES for name in existing):
+        run = f"{run.split('-')[0]}-{suffix}"
+        suffix += 1
+
+    attach = {ARCHIVE_SCHEMA: archive_path} if archive_path and os.path.exists(archive_path) else None
+    conn = connect(db_path, readonly=True, attach=attach)
+    exported = {}
+    try:
+        # One read transaction: both tables and the watermarks come from the same snapshot
+        conn.execute("BEGIN")
+        snapshot_time = conn.execute("SELECT CAST(strftime('%s', 'now') AS INTEGER)").fetchone()[0]
+        logged = _has_table(conn, 'main', 'change_log')
+        if not logged and not full:
+            print("No change log (the dashboard has not set up sync yet); exporting new rows only")
+        last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM main.change_log").fetchone()[0] if logged else 0
+        for table, columns in TABLES.items():
+            started = time.perf_counter()
+            watermark = {'last_id': 0, 'last_seq': 0, **manifest['tables'].get(table, {})}
+            id_column = ID_COLUMNS[table]
+            schemas = ['main'] + ([ARCHIVE_SCHEMA] if attach and _has_table(conn, ARCHIVE_SCHEMA, table) else [])
+            last_id = max(conn.execute(f"SELECT COALESCE(MAX({id_column}), 0) FROM {schema}.{table}").fetchone()[0]
+                          for schema in schemas)
+            where = NEW_ROWS.format(id_column=id_column)
+            if logged:
+                where += " OR " + CHANGED_ROWS.format(table=table)
+            select = ", ".join(expression for expression, _, _ in columns)
+            cursor = conn.execute(" UNION ALL ".join(
+                f"SELECT {select} FROM {schema}.{table} WHERE {'1' if full else where}" for schema in schemas
+            ) + f" ORDER BY {id_column}", watermark)
+
+            path = os.path.join(out_dir, f"{table}-{run}{extension(file_format)}")
+            writer = None
+            count = 0
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if writer is None:
+                    writer = open_writer(path, columns, file_format)
+                writer.write(rows)
+                count += len(rows)
+            if writer is not None:
+                writer.close()
+                manifest['files'].append(os.path.basename(path))
+
+            manifest['tables'][table] = {'last_id': last_id, 'last_seq': last_seq, 'exported_at': snapshot_time}
+            exported[table] = count
+            print(f"Exported {count} {table} rows in {time.perf_counter() - started:.2f}s"
+                  + (f" to {os.path.basename(path)}" if count else ""))
+        conn.rollback()
+    finally:
+        conn.close()
+
+    save_manifest(out_dir, manifest)
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export visit and sales history in a columnar format")
+    parser.add_argument('out_dir')
+    parser.add_argument('--db', default='jewelry_shop.db')
+    parser.add_argument('--archive', default=ARCHIVE_DB)
+    parser.add_argument('--format', choices=FORMATS, default=None,
+                        help="default: parquet if pyarrow is installed, otherwise csv")
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--full', action='store_true', help="ignore the watermark and export everything")
+    args = parser.parse_args()
+    export_history(args.out_dir, args.db, args.format, args.chunk_size, args.full, args.archive)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+
+def gray_pixels(size):
+    """Equalized grayscale pixels of the face resized to ``size`` x ``size``"""
+    def extract(face_img):
+        face_img = cv2.resize(face_img, (size, size))
+        gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+        gray = cv2.equalizeHist(gray)
+        features = gray.flatten().astype(np.float64)
+        return features / np.linalg.norm(features)
+    return extract
+
+
+# Neighbour offsets of the 8 bits of a local binary pattern, clockwise
+LBP_NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+
+
+def lbp_histograms(face_img, grid=4):
+    """Local binary pattern histograms over a ``grid`` x ``grid`` of cells.
+
+    Less sensitive to lighting than raw pixels; the square root makes the
+    cosine of two histograms their Hellinger affinity.
+    """
+    gray = cv2.cvtColor(cv2.resize(face_img, (66, 66)), cv2.COLOR_BGR2GRAY).astype(np.int16)
+    center = gray[1:-1, 1:-1]
+    codes = np.zeros(center.shape, dtype=np.int64)
+    for bit, (dy, dx) in enumerate(LBP_NEIGHBOURS):
+        codes |= (gray[1 + dy:65 + dy, 1 + dx:65 + dx] >= center).astype(np.int64) << bit
+    cell = 64 // grid
+    cells = (np.arange(64) // cell)[:, None] * grid + (np.arange(64) // cell)[None, :]
+    features = np.sqrt(np.bincount((cells * 256 + codes).ravel(), minlength=grid * grid * 256))
+    return features / np.linalg.norm(features)
+
+
+# Face descriptors by name.  Encodings in the database are DEFAULT_DESCRIPTOR
+# vectors; changing it means re-registering every customer.
+DESCRIPTORS = {
+    'gray128': gray_pixels(128),
+    'gray32': gray_pixels(32),
+    'lbp': lbp_histograms,
+}
+DEFAULT_DESCRIPTOR = 'gray128'
+
+
+def extract_features(face_img, descriptor=DEFAULT_DESCRIPTOR):
+    """Return the unit-length float64 descriptor of a BGR face crop"""
+    return DESCRIPTORS[descriptor](face_img)
@@ -0,0 +1,189 @@
+import numpy as np
+
+# Cosine similarity above which a face matches a stored encoding, unless
+# the shop stored its own under "match_threshold" in the settings table
+# (see evaluation.py)
+MATCH_THRESHOLD = 0.85
+MATCH_THRESHOLD_SETTING = 'match_threshold'
+
+
+def match_threshold(conn):
+    row = conn.execute("SELECT value FROM settings WHERE key = ?", (MATCH_THRESHOLD_SETTING,)).fetchone()
+    return float(row[0]) if row else MATCH_THRESHOLD
+
+
+def set_match_threshold(conn, threshold):
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                 (MATCH_THRESHOLD_SETTING, str(threshold)))
+    conn.commit()
+
+
+def similarity_tiles(features, tile_bytes=64 * 1024 * 1024):
+    """Yield (i, j, scores) covering every pair of rows of ``features``.
+
+    ``scores`` holds the cosine similarities of rows i.. against rows j..
+    (j >= i), one square tile of at most ``tile_bytes`` at a time, so the
+    n x n matrix never exists.  Tiles on the diagonal also hold each pair
+    twice and every row against itself.  The buffer is reused for the
+    next tile; callers may overwrite it.
+    """
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    n = len(features)
+    size = max(1, min(n, int((tile_bytes / 4) ** 0.5)))
+    buffer = np.empty((size, size), dtype=np.float32)
+    for i in range(0, n, size):
+        rows = features[i:i + size]
+        for j in range(i, n, size):
+            cols = features[j:j + size]
+            scores = buffer[:len(rows), :len(cols)]
+            np.matmul(rows, cols.T, out=scores)
+            yield i, j, scores
+
+
+class FaceGallery:
+    """Latest face encoding of every customer, matched with one matrix product.
+
+    Encodings live in a float32 matrix with one row per customer name, so
+    the camera loop compares a face with every customer at once instead of
+    reading the encodings from the database each frame.  ``catch_up``
+    keeps it current by reloading only the names touched by changes
+    logged since the last call, whether made here or replicated from
+    another terminal.
+    """
+
+    def __init__(self, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.matrix = None
+        self.valid = np.zeros(0, dtype=bool)
+        self.names = []         # slot -> name
+        self.customer_ids = []  # slot -> id of the name's latest visit
+        self.visit_uids = []    # slot -> uid of that visit
+        self.slots = {}         # name -> slot
+        self.uids = {}          # uid of a name's latest visit -> name
+        self.free = []
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, name):
+        return name in self.slots
+
+    def load(self, conn):
+        """Read the latest visit of every customer name"""
+        self.__init__(self.threshold)
+        self.seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+        rows = conn.execute("""
+            SELECT name, customer_id, uid, face_encoding
+            FROM main.customers
+            WHERE customer_id IN (SELECT MAX(customer_id) FROM main.customers GROUP BY name)
+        """).fetchall()
+        for row in rows:
+            self._put(*row)
+
+    def catch_up(self, conn):
+        """Reload the names changed since the last call and return them"""
+        rows = conn.execute("""
+            SELECT l.seq, l.row_uid, c.name
+            FROM change_log l
+            LEFT JOIN main.customers c ON l.table_name = 'customers' AND c.uid = l.row_uid
+            WHERE l.seq > ?
+            ORDER BY l.seq
+        """, (self.seq,)).fetchall()
+        if not rows:
+            return set()
+        self.seq = rows[-1][0]
+        # A rename or delete leaves the old name behind, found by its visit's uid
+        names = {name for _, _, name in rows if name is not None}
+        names.update(self.uids[uid] for _, uid, _ in rows if uid in self.uids)
+        self.refresh(conn, names)
+        return names
+
+    def refresh(self, conn, names):
+        """Reload the latest visit of each of ``names``, dropping names that are gone"""
+        for name in names:
+            row = conn.execute("""
+                SELECT name, customer_id, uid, face_encoding
+                FROM main.customers WHERE name = ?
+                ORDER BY customer_id DESC LIMIT 1
+            """, (name,)).fetchone()
+            if row:
+                self._put(*row)
+            else:
+                self._remove(name)
+
+    def match(self, features):
+        """Return (name, latest customer_id) of the closest customer, or None.
+
+        Only a similarity above the threshold counts as a match.
+        """
+        nearest = self.nearest(features)
+        return nearest and nearest[:2]
+
+    def nearest(self, features, threshold=None):
+        """Return (name, latest customer_id, similarity) of the closest customer, or None.
+
+        Customers at or below ``threshold`` (the match threshold by
+        default) are not considered.
+        """
+        if not self.slots or features.shape != (self.matrix.shape[1],):
+            return None
+        size = len(self.names)
+        similarities = self.matrix[:size] @ features.astype(np.float32)
+        similarities[~self.valid[:size]] = -np.inf
+        slot = int(np.argmax(similarities))
+        if similarities[slot] <= (self.threshold if threshold is None else threshold):
+            return None
+        return self.names[slot], self.customer_ids[slot], float(similarities[slot])
+
+    def encodings(self):
+        """Return (names, latest customer_ids, float32 matrix) of every customer"""
+        if not self.slots:
+            return [], [], np.zeros((0, 0), dtype=np.float32)
+        slots = np.flatnonzero(self.valid[:len(self.names)])
+        return ([self.names[slot] for slot in slots], [self.customer_ids[slot] for slot in slots],
+                self.matrix[slots])
+
+    def _put(self, name, customer_id, uid, encoding):
+        if encoding is None:
+            self._remove(name)
+            return
+        features = np.frombuffer(encoding, dtype=np.float64)
+        if self.matrix is None:
+            self.matrix = np.zeros((64, features.size), dtype=np.float32)
+            self.valid = np.zeros(64, dtype=bool)
+        if features.size != self.matrix.shape[1]:
+            self._remove(name)
+            return
+
+        slot = self.slots.get(name)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+            else:
+                slot = len(self.names)
+                self.names.append(None)
+                self.customer_ids.append(None)
+                self.visit_uids.append(None)
+                if slot == len(self.matrix):
+                    self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+                    self.valid = np.concatenate([self.valid, np.zeros_like(self.valid)])
+            self.slots[name] = slot
+        self.uids.pop(self.visit_uids[slot], None)
+        self.matrix[slot] = features
+        self.valid[slot] = True
+        self.names[slot] = name
+        self.customer_ids[slot] = customer_id
+        self.visit_uids[slot] = uid
+        if uid is not None:
+            self.uids[uid] = name
+
+    def _remove(self, name):
+        slot = self.slots.pop(name, None)
+        if slot is None:
+            return
+        self.valid[slot] = False
+        self.names[slot] = None
+        self.uids.pop(self.visit_uids[slot], None)
+        self.visit_uids[slot] = None
+        self.free.append(slot)
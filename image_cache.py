@@ -0,0 +1,130 @@
+import io
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by the total ``sizeof`` of its values"""
+
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self._items[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_size
+        return value
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'items': len(self._items),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._items)
+
+
+def iter_blob(conn, table, column, rowid, chunk_size=256 * 1024):
+    """Yield a BLOB in chunks using incremental BLOB I/O where available.
+
+    ``Connection.blobopen`` (Python 3.11+) reads the value straight from the
+    database pages, so a large image never has to exist as a single Python
+    bytes object.  Older Pythons fall back to a plain SELECT.
+    """
+    if hasattr(conn, 'blobopen'):
+        try:
+            blob = conn.blobopen(table, column, rowid, readonly=True)
+        except sqlite3.OperationalError:
+            # NULL values and missing rows cannot be opened as BLOBs
+            return
+        with blob:
+            while True:
+                chunk = blob.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        return
+
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {column} FROM {table} WHERE rowid = ?", (rowid,))
+    row = cursor.fetchone()
+    if row and row[0]:
+        yield bytes(row[0])
+
+
+def read_blob(conn, table, column, rowid):
+    """Read a whole BLOB, or None if the value is NULL or the row is missing"""
+    data = b"".join(iter_blob(conn, table, column, rowid))
+    return data or None
+
+
+def open_blob(conn, table, column, rowid):
+    """Open a BLOB as a readable file object, or return None if there is none.
+
+    ``sqlite3.Blob`` is file-like, so Pillow can seek and read it in place
+    without the encoded bytes ever being copied into a Python object.  Older
+    Pythons get a BytesIO over a plain SELECT instead.
+    """
+    if not hasattr(conn, 'blobopen'):
+        data = read_blob(conn, table, column, rowid)
+        return io.BytesIO(data) if data else None
+    try:
+        blob = conn.blobopen(table, column, rowid, readonly=True)
+    except sqlite3.OperationalError:
+        return None
+    if len(blob) == 0:
+        blob.close()
+        return None
+    return blob
+
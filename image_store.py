@@ -0,0 +1,446 @@
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageOps
+
+from db_pool import connect
+from retention import ARCHIVE_DB, ARCHIVE_SCHEMA
+from image_cache import iter_blob, open_blob
+
+# Square preview sizes the UI draws product images at: product picker rows,
+# the exit dialog and the image viewer
+THUMBNAIL_SIZES = (40, 150, 300)
+
+# Stored originals are capped at this many pixels on the longer side and
+# re-encoded in IMAGE_FORMAT ('JPEG' or 'WEBP') at IMAGE_QUALITY
+MAX_DIMENSION = 1200
+IMAGE_FORMAT = 'JPEG'
+IMAGE_QUALITY = 85
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp', 'PNG': '.png', 'GIF': '.gif', 'BMP': '.bmp'}
+
+
+def render_thumbnail(source, size, quality=85):
+    """Decode ``source`` at reduced scale and return a ``size`` x ``size`` JPEG.
+
+    ``Image.draft`` lets the JPEG decoder skip straight to the smallest DCT
+    scale that still covers ``size``, so a multi-megapixel original is never
+    decoded at full resolution just to be shrunk.
+    """
+    img = Image.open(source)
+    img.draft('RGB', (size, size))
+    img = img.convert('RGB').resize((size, size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+
+def normalize_image(data, max_dimension=MAX_DIMENSION, image_format=IMAGE_FORMAT,
+                    quality=IMAGE_QUALITY):
+    """Return ``data`` downscaled, stripped of metadata and re-encoded for storage.
+
+    EXIF orientation is applied before the metadata is dropped, transparency
+    is flattened onto white, and JPEGs are written progressive so previews
+    can render before the whole file has been read.  An input that is
+    already in ``image_format`` and within ``max_dimension`` is returned
+    unchanged, metadata included, when re-encoding would not make it smaller.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        source_format = img.format
+        # From the header: draft() below already shrinks the decoded size
+        fits = max(img.size) <= max_dimension
+        img.draft('RGB', (max_dimension, max_dimension))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        else:
+            img = img.convert('RGB')
+        if max(img.size) > max_dimension:
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        if image_format == 'WEBP':
+            img.save(output, format='WEBP', quality=quality, method=6)
+        else:
+            img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    normalized = output.getvalue()
+    if source_format == image_format and fits and len(data) <= len(normalized):
+        return data
+    return normalized
+
+
+class ImageStore:
+    """Content-addressed store of image BLOBs keyed by their SHA-256.
+
+    Each distinct image is stored once in the ``images`` table of the
+    inventory database; ``inventory`` and ``purchases`` rows only carry the
+    hex digest in their ``image_hash`` column.
+
+    Images added with ``ingest`` are normalized first; if ``cold_storage`` is
+    a directory, the untouched original is kept there as
+    ``<image_hash><ext>`` under the hash of the stored version.
+    """
+
+    def __init__(self, conn, cold_storage=None):
+        self.conn = conn
+        self.cold_storage = cold_storage
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                image_hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS thumbnails (
+                image_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (image_hash, size)
+            )
+        """)
+
+    @staticmethod
+    def hash_bytes(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data):
+        """Store ``data`` if it is not already present and return its hash"""
+        image_hash = self.hash_bytes(data)
+        self.conn.execute("""
+            INSERT OR IGNORE INTO images (image_hash, data, size)
+            VALUES (?, ?, ?)
+        """, (image_hash, sqlite3.Binary(data), len(data)))
+        return image_hash
+
+    def put_many(self, entries):
+        """Store pre-hashed images and their thumbnails with one executemany each.
+
+        ``entries`` is a list of (image_hash, data, thumbnails) where
+        ``thumbnails`` maps size to encoded bytes, as produced off-thread by
+        bulk imports.
+        """
+        self.conn.executemany("""
+            INSERT OR IGNORE INTO images (image_hash, data, size)
+            VALUES (?, ?, ?)
+        """, [(image_hash, sqlite3.Binary(data), len(data)) for image_hash, data, _ in entries])
+        self.conn.executemany("""
+            INSERT OR IGNORE INTO thumbnails (image_hash, size, data)
+            VALUES (?, ?, ?)
+        """, [(image_hash, size, thumb)
+              for image_hash, _, thumbnails in entries
+              for size, thumb in thumbnails.items()])
+
+    def ingest(self, data, **options):
+        """Normalize ``data``, store it and return its hash"""
+        normalized = normalize_image(data, **options)
+        image_hash = self.put(normalized)
+        if normalized is not data:
+            self.keep_original(image_hash, data)
+        return image_hash
+
+    def ingest_file(self, path, **options):
+        with open(path, 'rb') as f:
+            return self.ingest(f.read(), **options)
+
+    def keep_original(self, image_hash, data):
+        """Write an original to cold storage, if configured"""
+        if not self.cold_storage:
+            return None
+        os.makedirs(self.cold_storage, exist_ok=True)
+        with Image.open(io.BytesIO(data)) as img:
+            extension = EXTENSIONS.get(img.format, '.bin')
+        path = os.path.join(self.cold_storage, image_hash + extension)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+        return path
+
+    def _rowid(self, image_hash):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT rowid FROM images WHERE image_hash = ?", (image_hash,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, image_hash):
+        return self._rowid(image_hash) is not None
+
+    def size(self, image_hash):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT size FROM images WHERE image_hash = ?", (image_hash,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def iter_chunks(self, image_hash, chunk_size=256 * 1024):
+        """Stream the encoded image in chunks"""
+        rowid = self._rowid(image_hash) if image_hash else None
+        if rowid is None:
+            return iter(())
+        return iter_blob(self.conn, 'images', 'data', rowid, chunk_size)
+
+    def extension(self, image_hash):
+        """Return the file extension of a stored image's format, read from its header"""
+        rowid = self._rowid(image_hash) if image_hash else None
+        blob = open_blob(self.conn, 'images', 'data', rowid) if rowid is not None else None
+        if blob is None:
+            return '.bin'
+        with blob:
+            try:
+                with Image.open(blob) as img:
+                    return EXTENSIONS.get(img.format, '.bin')
+            except OSError:
+                return '.bin'
+
+    def get(self, image_hash):
+        """Return the encoded image bytes, or None"""
+        data = b"".join(self.iter_chunks(image_hash))
+        return data or None
+
+    def thumbnail(self, image_hash, size, writer=None):
+        """Return the encoded ``size`` thumbnail, rendering and storing it if missing.
+
+        Given the DatabaseWriter of this database as ``writer``, a rendered
+        thumbnail is queued on it instead of written here, so a UI thread
+        never waits on the write lock.
+        """
+        if not image_hash:
+            return None
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT data FROM thumbnails WHERE image_hash = ? AND size = ?
+        """, (image_hash, size))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+
+        rowid = self._rowid(image_hash)
+        blob = open_blob(self.conn, 'images', 'data', rowid) if rowid is not None else None
+        if blob is None:
+            return None
+        with blob:
+            data = render_thumbnail(blob, size)
+        if writer is not None:
+            writer.submit(store_thumbnail, image_hash, size, data)
+        else:
+            store_thumbnail(self.conn, image_hash, size, data)
+            self.conn.commit()
+        return data
+
+    def ensure_thumbnails(self, image_hash, sizes=THUMBNAIL_SIZES):
+        """Precompute every thumbnail size of an image at ingest time"""
+        for size in sizes:
+            self.thumbnail(image_hash, size)
+
+    def missing_thumbnails(self, sizes=THUMBNAIL_SIZES):
+        """Return (image_hash, size) pairs that have not been rendered yet"""
+        cursor = self.conn.cursor()
+        missing = []
+        for size in sizes:
+            cursor.execute("""
+                SELECT image_hash FROM images i
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM thumbnails t
+                    WHERE t.image_hash = i.image_hash AND t.size = ?
+                )
+            """, (size,))
+            missing.extend((row[0], size) for row in cursor.fetchall())
+        return missing
+
+    def migrate_table(self, conn, table, blob_column='product_image', batch_size=100):
+        """Move inline BLOBs of ``table`` into the store, replacing them with hashes.
+
+        Rows are processed in batches; the store is committed before the
+        source rows are cleared, so an interrupted migration can only leave an
+        unreferenced image behind, never lose one.  Returns the number of rows
+        migrated.
+        """
+        migrated = 0
+        cursor = conn.cursor()
+        while True:
+            cursor.execute(f"""
+                SELECT rowid FROM {table}
+                WHERE {blob_column} IS NOT NULL
+                LIMIT ?
+            """, (batch_size,))
+            rowids = [row[0] for row in cursor.fetchall()]
+            if not rowids:
+                return migrated
+
+            updates = []
+            for rowid in rowids:
+                data = b"".join(iter_blob(conn, table, blob_column, rowid))
+                updates.append((self.put(data) if data else None, rowid))
+            self.conn.commit()
+
+            cursor.executemany(f"""
+                UPDATE {table}
+                SET image_hash = COALESCE(?, image_hash), {blob_column} = NULL
+                WHERE rowid = ?
+            """, updates)
+            conn.commit()
+            migrated += len(updates)
+
+
+def store_thumbnail(conn, image_hash, size, data):
+    conn.execute("""
+        INSERT OR REPLACE INTO thumbnails (image_hash, size, data) VALUES (?, ?, ?)
+    """, (image_hash, size, data))
+
+
+def warm_thumbnails(db, sizes=THUMBNAIL_SIZES):
+    """Render every missing thumbnail of the store in the ConnectionPool ``db``.
+
+    Meant to run on a background thread: images are read on a pooled
+    reader and thumbnails queued on the pool's writer, so the warm-up
+    never contends with checkout and stock writes for the write lock.
+    Returns the number of thumbnails rendered.
+    """
+    with db.reader() as conn:
+        store = ImageStore(conn)
+        missing = store.missing_thumbnails(sizes)
+        for image_hash, size in missing:
+            try:
+                store.thumbnail(image_hash, size, writer=db.writer)
+            except Exception as e:
+                print(f"Error rendering {size}px thumbnail for {image_hash}: {e}")
+    return len(missing)
+
+
+def database_report(path):
+    """Return (size in bytes, seconds for a full online backup) of a database file"""
+    if not os.path.exists(path):
+        return 0, 0.0
+    source = sqlite3.connect(path)
+    with tempfile.TemporaryDirectory() as tmp:
+        target = sqlite3.connect(os.path.join(tmp, 'backup.db'))
+        started = time.perf_counter()
+        source.backup(target)
+        elapsed = time.perf_counter() - started
+        target.close()
+    source.close()
+    return os.path.getsize(path), elapsed
+
+
+def decode_time(data, repeat=3):
+    """Best-of-``repeat`` seconds to fully decode an encoded image"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def normalize_catalogue(shop_path='jewelry_shop.db', inventory_path='jewelry_inventory.db',
+                        cold_storage=None, dry_run=False, **options):
+    """Normalize every stored image and repoint inventory and purchases at the result.
+
+    Prints bytes and full-decode time before and after for each image.  With
+    ``dry_run`` nothing is written.  Each image is handled in its own steps:
+    the normalized copy is committed to the store first, then references are
+    moved over, then the old BLOB is dropped, so an interruption can only
+    leave an unreferenced image behind.
+    """
+    inventory_conn = connect(inventory_path)
+    # Archived purchases reference the same images and are repointed too
+    archive_path = os.path.join(os.path.dirname(shop_path), ARCHIVE_DB)
+    archived = os.path.exists(archive_path)
+    shop_conn = connect(shop_path, attach={ARCHIVE_SCHEMA: archive_path} if archived else None)
+    store = ImageStore(inventory_conn, cold_storage=cold_storage)
+    hashes = [row[0] for row in inventory_conn.execute("SELECT image_hash FROM images ORDER BY rowid")]
+
+    totals = [0, 0, 0.0, 0.0]
+    print(f"{'Image':<18}{'Before':>12}{'After':>12}{'Decode before':>15}{'Decode after':>14}")
+    for image_hash in hashes:
+        data = store.get(image_hash)
+        normalized = normalize_image(data, **options)
+        before, after = decode_time(data), decode_time(normalized)
+        totals[0] += len(data)
+        totals[1] += len(normalized)
+        totals[2] += before
+        totals[3] += after
+        print(f"{image_hash[:16]:<18}{len(data) / 1024:>9.0f} KB{len(normalized) / 1024:>9.0f} KB"
+              f"{before * 1000:>12.1f} ms{after * 1000:>11.1f} ms")
+        if dry_run or normalized is data:
+            continue
+
+        new_hash = store.put(normalized)
+        if new_hash == image_hash:
+            continue
+        store.keep_original(new_hash, data)
+        inventory_conn.commit()
+        for schema in ('main', ARCHIVE_SCHEMA) if archived else ('main',):
+            shop_conn.execute(f"UPDATE {schema}.purchases SET image_hash = ? WHERE image_hash = ?",
+                              (new_hash, image_hash))
+        shop_conn.commit()
+        inventory_conn.execute("UPDATE inventory SET image_hash = ? WHERE image_hash = ?",
+                               (new_hash, image_hash))
+        inventory_conn.execute("DELETE FROM thumbnails WHERE image_hash = ?", (image_hash,))
+        inventory_conn.execute("DELETE FROM images WHERE image_hash = ?", (image_hash,))
+        inventory_conn.commit()
+        store.ensure_thumbnails(new_hash)
+
+    saved = totals[0] - totals[1]
+    print(f"\nTotal: {totals[0] / 1024:.0f} KB -> {totals[1] / 1024:.0f} KB "
+          f"({saved / 1024:.0f} KB saved, {saved / max(totals[0], 1):.0%}); "
+          f"decode {totals[2] * 1000:.1f} ms -> {totals[3] * 1000:.1f} ms")
+    if not dry_run:
+        inventory_conn.execute("VACUUM")
+    shop_conn.close()
+    inventory_conn.close()
+
+
+def migrate(shop_path='jewelry_shop.db', inventory_path='jewelry_inventory.db'):
+    """Deduplicate product BLOBs of both databases into the image store and compact them"""
+    before = {path: database_report(path) for path in (shop_path, inventory_path)}
+
+    inventory_conn = sqlite3.connect(inventory_path)
+    shop_conn = sqlite3.connect(shop_path)
+    store = ImageStore(inventory_conn)
+    for conn, table in ((inventory_conn, 'inventory'), (shop_conn, 'purchases')):
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [col[1] for col in cursor.fetchall()]
+        if not columns:
+            print(f"Table {table} not found, skipping")
+            continue
+        if 'image_hash' not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN image_hash TEXT")
+        count = store.migrate_table(conn, table)
+        print(f"Moved {count} {table} images into the store")
+    inventory_conn.commit()
+
+    # Cleared BLOB pages are only returned to the filesystem by a VACUUM
+    for conn in (inventory_conn, shop_conn):
+        conn.execute("VACUUM")
+        conn.close()
+
+    after = {path: database_report(path) for path in (shop_path, inventory_path)}
+    print(f"\n{'Database':<24}{'Size before':>14}{'Size after':>14}{'Backup before':>16}{'Backup after':>15}")
+    for path in (shop_path, inventory_path):
+        (size_before, backup_before), (size_after, backup_after) = before[path], after[path]
+        print(f"{path:<24}{size_before / 1024:>11.0f} KB{size_after / 1024:>11.0f} KB"
+              f"{backup_before * 1000:>13.1f} ms{backup_after * 1000:>12.1f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == 'migrate':
+        migrate(*sys.argv[2:4])
+    elif len(sys.argv) >= 2 and sys.argv[1] == 'normalize':
+        dry_run = '--dry-run' in sys.argv
+        paths = [arg for arg in sys.argv[2:] if arg != '--dry-run']
+        normalize_catalogue(*paths[:3], dry_run=dry_run)
+    else:
+        print("Usage: python image_store.py migrate [shop.db] [inventory.db]\n"
+              "       python image_store.py normalize [shop.db] [inventory.db] [originals_dir] [--dry-run]")
+        sys.exit(1)
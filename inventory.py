@@ -1,19 +1,67 @@
-import sqlite3
+import argparse
+import csv
+import io
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def setup_inventory_database():
-    conn = sqlite3.connect('jewelry_inventory.db')
+from PIL import Image
+
+from db_pool import connect
+from image_store import THUMBNAIL_SIZES, ImageStore, normalize_image, render_thumbnail
+from product_search import setup_product_search
+
+# Condition of the partial low-stock index; queries must use it verbatim
+# for SQLite to pick the index
+LOW_STOCK = "quantity <= reorder_level"
+
+def create_inventory_table(conn):
     cursor = conn.cursor()
-    
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS inventory (
             product_id TEXT PRIMARY KEY,
             product_name TEXT NOT NULL,
             product_image BLOB,
             price REAL NOT NULL,
-            quantity INTEGER NOT NULL
+            quantity INTEGER NOT NULL,
+            image_hash TEXT,
+            category TEXT,
+            reorder_level INTEGER NOT NULL DEFAULT 2
         )
     """)
+    cursor.execute("PRAGMA table_info(inventory)")
+    if 'image_hash' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN image_hash TEXT")
+    setup_product_search(conn)
+    setup_stock_levels(conn)
+
+def setup_stock_levels(conn):
+    """Add reorder levels and the indexes the inventory panel sorts and filters on.
+
+    The low-stock index is partial: it only holds the handful of products at
+    or below their reorder level, so listing and counting them reads that
+    index instead of the whole table.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(inventory)")
+    if 'reorder_level' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN reorder_level INTEGER NOT NULL DEFAULT 2")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory(product_name, product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_price ON inventory(price, product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_quantity ON inventory(quantity, product_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_value ON inventory((price * quantity), product_id)")
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_inventory_low_stock
+            ON inventory(quantity, product_id) WHERE {LOW_STOCK}
+    """)
+    conn.commit()
+
+def setup_inventory_database():
+    conn = connect('jewelry_inventory.db')
+    store = ImageStore(conn)
+    create_inventory_table(conn)
+    cursor = conn.cursor()
     
     cursor.execute("SELECT COUNT(*) FROM inventory")
     count = cursor.fetchone()[0]
@@ -21,42 +69,50 @@ def setup_inventory_database():
     
     if count == 0:
         sample_items = [
-            ('J001', 'Gold Necklace', 'jewel1.jpg', 599.99, 5),
-            ('J002', 'Diamond Ring', 'jewel2.jpg', 1299.99, 3),
-            ('J003', 'Silver Bracelet', 'jewel3.jpg', 199.99, 8),
-            ('J004', 'Pearl Earrings', 'jewel4.jpg', 149.99, 6),
-            ('J005', 'Emerald Pendant', 'jewel5.jpg', 799.99, 4),
-            ('J006', 'Ruby Ring', 'jewel6.jpg', 999.99, 2),
-            ('J007', 'Sapphire Bracelet', 'jewel7.jpg', 399.99, 7),
-            ('J008', 'Gold Chain', 'jewel8.jpg', 349.99, 5),
-            ('J009', 'Diamond Studs', 'jewel9.jpg', 699.99, 3),
-            ('J010', 'Silver Anklet', 'jewel10.jpg', 99.99, 10)
+            ('J001', 'Gold Necklace', 'jewel1.jpg', 599.99, 5, 'Necklaces'),
+            ('J002', 'Diamond Ring', 'jewel2.jpg', 1299.99, 3, 'Rings'),
+            ('J003', 'Silver Bracelet', 'jewel3.jpg', 199.99, 8, 'Bracelets'),
+            ('J004', 'Pearl Earrings', 'jewel4.jpg', 149.99, 6, 'Earrings'),
+            ('J005', 'Emerald Pendant', 'jewel5.jpg', 799.99, 4, 'Pendants'),
+            ('J006', 'Ruby Ring', 'jewel6.jpg', 999.99, 2, 'Rings'),
+            ('J007', 'Sapphire Bracelet', 'jewel7.jpg', 399.99, 7, 'Bracelets'),
+            ('J008', 'Gold Chain', 'jewel8.jpg', 349.99, 5, 'Necklaces'),
+            ('J009', 'Diamond Studs', 'jewel9.jpg', 699.99, 3, 'Earrings'),
+            ('J010', 'Silver Anklet', 'jewel10.jpg', 99.99, 10, 'Anklets')
         ]
         
         print(f"Current working directory: {os.getcwd()}")
-        for product_id, product_name, image_file, price, quantity in sample_items:
-            image_data = None
+        for product_id, product_name, image_file, price, quantity, category in sample_items:
+            image_hash = None
             if os.path.exists(image_file):
                 try:
-                    with open(image_file, 'rb') as f:
-                        image_data = f.read()
-                    print(f"Loaded {image_file} successfully, size: {len(image_data)} bytes")
+                    image_hash = store.ingest_file(image_file)
+                    store.ensure_thumbnails(image_hash)
+                    print(f"Loaded {image_file} successfully, size: {store.size(image_hash)} bytes")
                 except Exception as e:
                     print(f"Error loading image {image_file}: {e}")
-                    image_data = None
+                    image_hash = None
             else:
                 print(f"Image file {image_file} not found")
             
             cursor.execute("""
-                INSERT INTO inventory (product_id, product_name, product_image, price, quantity)
-                VALUES (?, ?, ?, ?, ?)
-            """, (product_id, product_name, image_data, price, quantity))
+                INSERT INTO inventory (product_id, product_name, image_hash, price, quantity, category)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (product_id, product_name, image_hash, price, quantity, category))
         print("Initial inventory data inserted.")
     
     conn.commit()
     
+    # Older databases kept the image inline; move it into the store once
+    migrated = store.migrate_table(conn, 'inventory')
+    if migrated:
+        print(f"Moved {migrated} product images into the image store")
+    
     # Always display current inventory status
-    cursor.execute("SELECT product_id, product_name, length(product_image), price, quantity FROM inventory")
+    cursor.execute("""
+        SELECT i.product_id, i.product_name, img.size, i.price, i.quantity
+        FROM inventory i LEFT JOIN images img ON img.image_hash = i.image_hash
+    """)
     print("\nCurrent Inventory Status:")
     for row in cursor.fetchall():
         product_id, product_name, image_size, price, quantity = row
@@ -64,5 +120,204 @@ def setup_inventory_database():
     
     conn.close()
 
+def read_catalogue(path):
+    """Stream (line number, record) pairs from a CSV or JSONL catalogue.
+
+    Line numbers count from 1 with the CSV header as line 1; a CSV record
+    whose quoted field spans lines gets the line it ends on.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+        else:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record
+
+
+def validate_record(record):
+    """Normalise one catalogue record, raising ValueError if it is unusable"""
+    product_id = str(record.get('product_id') or '').strip()
+    product_name = str(record.get('product_name') or '').strip()
+    if not product_id or not product_name:
+        raise ValueError("product_id and product_name are required")
+    price = float(record.get('price'))
+    quantity = int(record.get('quantity') or 0)
+    if price < 0 or quantity < 0:
+        raise ValueError("price and quantity must not be negative")
+    image = str(record.get('image') or '').strip() or None
+    category = str(record.get('category') or '').strip() or None
+    return product_id, product_name, price, quantity, image, category
+
+
+def process_image(path, store=None):
+    """Decode, validate and normalize one product image; runs on a worker thread.
+
+    If ``store`` keeps originals in cold storage the source file is copied
+    there.  Returns (image_hash, data, thumbnails, source_bytes).
+    """
+    with open(path, 'rb') as f:
+        original = f.read()
+    data = normalize_image(original)
+    if data is original:
+        # Kept as-is, so make sure it decodes; truncated files fail here
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+    image_hash = ImageStore.hash_bytes(data)
+    if store is not None and data is not original:
+        store.keep_original(image_hash, original)
+    thumbnails = {size: render_thumbnail(io.BytesIO(data), size) for size in THUMBNAIL_SIZES}
+    return image_hash, data, thumbnails, len(original)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_catalogue(path, image_dir='products', db_path='jewelry_inventory.db',
+                     chunk_size=500, workers=None, cold_storage=None):
+    """Upsert a CSV/JSONL catalogue into the inventory, one transaction per chunk.
+
+    Records are read lazily and handled ``chunk_size`` at a time, so memory
+    is bounded by one chunk of images.  Images are normalized (see
+    image_store.normalize_image) on a thread pool while the main thread only runs the executemany upserts.
+    """
+    conn = connect(db_path)
+    store = ImageStore(conn, cold_storage=cold_storage)
+    create_inventory_table(conn)
+    started = time.perf_counter()
+    imported = rejected = images = bytes_in = bytes_out = 0
+    # Catalogues often reuse one photo for many SKUs; process each file once
+    image_hashes = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for chunk in chunked(read_catalogue(path), chunk_size):
+            rows = []
+            for line_no, record in chunk:
+                try:
+                    rows.append(validate_record(record))
+                except (TypeError, ValueError) as e:
+                    rejected += 1
+                    print(f"Skipping line {line_no}: {e}")
+
+            pending = {}
+            for _, _, _, _, image, _ in rows:
+                if image and image not in image_hashes and image not in pending:
+                    pending[image] = pool.submit(process_image, os.path.join(image_dir, image), store)
+
+            entries = []
+            for image, future in pending.items():
+                try:
+                    image_hash, data, thumbnails, source_bytes = future.result()
+                except Exception as e:
+                    print(f"Skipping image {image}: {e}")
+                    image_hashes[image] = None
+                    continue
+                image_hashes[image] = image_hash
+                entries.append((image_hash, data, thumbnails))
+                images += 1
+                bytes_in += source_bytes
+                bytes_out += len(data)
+
+            with conn:
+                store.put_many(entries)
+                conn.executemany("""
+                    INSERT INTO inventory (product_id, product_name, price, quantity, image_hash, category)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(product_id) DO UPDATE SET
+                        product_name = excluded.product_name,
+                        price = excluded.price,
+                        quantity = excluded.quantity,
+                        image_hash = COALESCE(excluded.image_hash, inventory.image_hash),
+                        category = COALESCE(excluded.category, inventory.category)
+                """, [(product_id, product_name, price, quantity,
+                       image_hashes.get(image) if image else None, category)
+                      for product_id, product_name, price, quantity, image, category in rows])
+            imported += len(rows)
+
+    conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"Imported {imported} products ({rejected} rejected) and {images} images in {elapsed:.2f}s")
+    print(f"Throughput: {imported / elapsed:.0f} products/s, {images / elapsed:.1f} images/s, "
+          f"{bytes_in / 1024 / 1024:.1f} MB read, {bytes_out / 1024 / 1024:.1f} MB stored")
+    return imported
+
+
+def export_catalogue(path, image_dir=None, db_path='jewelry_inventory.db'):
+    """Stream the inventory to CSV/JSONL, optionally writing each image once to ``image_dir``.
+
+    Rows are written as the cursor yields them and images are copied with
+    incremental BLOB reads, so memory does not grow with the catalogue.
+    """
+    conn = connect(db_path)
+    store = ImageStore(conn)
+    jsonl = path.lower().endswith(('.jsonl', '.ndjson'))
+    fields = ['product_id', 'product_name', 'price', 'quantity', 'image', 'category']
+    if image_dir:
+        os.makedirs(image_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    exported = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = None if jsonl else csv.DictWriter(f, fieldnames=fields)
+        if writer:
+            writer.writeheader()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT product_id, product_name, price, quantity, image_hash, category
+            FROM inventory ORDER BY product_id
+        """)
+        for product_id, product_name, price, quantity, image_hash, category in cursor:
+            image = image_hash + store.extension(image_hash) if image_hash else ''
+            if image_dir and image_hash:
+                target = os.path.join(image_dir, image)
+                if not os.path.exists(target):
+                    with open(target, 'wb') as image_file:
+                        for chunk in store.iter_chunks(image_hash):
+                            image_file.write(chunk)
+            record = dict(zip(fields, (product_id, product_name, price, quantity, image, category)))
+            if writer:
+                writer.writerow(record)
+            else:
+                f.write(json.dumps(record) + "\n")
+            exported += 1
+
+    conn.close()
+    print(f"Exported {exported} products in {time.perf_counter() - started:.2f}s")
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jewelry shop inventory tools")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('setup', help="create the database and seed sample items (default)")
+    import_parser = commands.add_parser('import', help="bulk upsert products from CSV/JSONL")
+    import_parser.add_argument('catalogue')
+    import_parser.add_argument('--images', default='products', help="directory holding the image files")
+    import_parser.add_argument('--chunk-size', type=int, default=500)
+    import_parser.add_argument('--workers', type=int, default=None)
+    import_parser.add_argument('--originals', default=None, help="directory to keep unmodified originals in")
+    export_parser = commands.add_parser('export', help="stream products to CSV/JSONL")
+    export_parser.add_argument('output')
+    export_parser.add_argument('--images', default=None, help="directory to write image files to")
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        import_catalogue(args.catalogue, args.images, chunk_size=args.chunk_size,
+                         workers=args.workers, cold_storage=args.originals)
+    elif args.command == 'export':
+        export_catalogue(args.output, args.images)
+    else:
+        setup_inventory_database()
+
 if __name__ == "__main__":
-    setup_inventory_database()
\ No newline at end of file
+    main()
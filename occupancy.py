@@ -0,0 +1,185 @@
+import argparse
+import time
+
+from db_pool import connect
+
+# Visits of people the cameras have not seen for this long are closed by
+# the exit sweeper.  Each camera zone can override it under
+# "exit_after_minutes:<camera>" in the settings table; 0 disables closing
+# for that zone.
+DEFAULT_EXIT_AFTER_MINUTES = 30
+EXIT_AFTER_SETTING = 'exit_after_minutes'
+
+
+class Occupant:
+    """An open visit: who, since when, and where the camera last saw them"""
+
+    __slots__ = ('customer_id', 'name', 'entry_ts', 'last_seen', 'camera')
+
+    def __init__(self, customer_id, name, entry_ts, last_seen, camera=None):
+        self.customer_id = customer_id
+        self.name = name
+        self.entry_ts = entry_ts
+        self.last_seen = last_seen
+        self.camera = camera
+
+
+class OccupancyIndex:
+    """Customers currently in the store, keyed by name.
+
+    Loaded from one query on the open-visit index at startup, then kept in
+    step by ``refresh`` for every name a write (local or replicated)
+    touches, so "is this person in the store" is a dict lookup for the
+    camera loop.  Last-seen times and cameras are only kept in memory; a
+    restart counts everyone in the store as seen at load time.
+    """
+
+    def __init__(self):
+        self.occupants = {}
+
+    def __len__(self):
+        return len(self.occupants)
+
+    def __contains__(self, name):
+        return name in self.occupants
+
+    def get(self, name):
+        return self.occupants.get(name)
+
+    def load(self, conn, now=None):
+        """Read every open visit"""
+        now = time.time() if now is None else now
+        previous = self.occupants
+        self.occupants = {}
+        rows = conn.execute("""
+            SELECT customer_id, name, entry_ts FROM main.customers
+            WHERE (exit_time IS NULL) = 1
+            ORDER BY entry_ts, customer_id
+        """).fetchall()
+        for customer_id, name, entry_ts in rows:
+            self._put(customer_id, name, entry_ts, previous.get(name), now)
+
+    def refresh(self, conn, names, now=None):
+        """Re-read the open visit of each of ``names``, dropping those who left"""
+        now = time.time() if now is None else now
+        for name in names:
+            row = conn.execute("""
+                SELECT customer_id, entry_ts FROM main.customers
+                WHERE name = ? AND exit_time IS NULL
+                ORDER BY customer_id DESC LIMIT 1
+            """, (name,)).fetchone()
+            if row:
+                self._put(row[0], name, row[1], self.occupants.get(name), now)
+            else:
+                self.occupants.pop(name, None)
+
+    def seen(self, name, camera, now=None):
+        """Record a sighting; returns the occupant, or None if ``name`` is not in the store"""
+        occupant = self.occupants.get(name)
+        if occupant is not None:
+            occupant.last_seen = time.time() if now is None else now
+            occupant.camera = camera
+        return occupant
+
+    def unseen(self, timeouts, now=None):
+        """Return (customer_id, last_seen) of everyone unseen for longer than their zone allows.
+
+        ``timeouts`` maps a camera to minutes, with None for the default
+        that also covers people not seen by any camera yet.
+        """
+        now = time.time() if now is None else now
+        default = timeouts.get(None, DEFAULT_EXIT_AFTER_MINUTES)
+        stale = []
+        for occupant in self.occupants.values():
+            minutes = timeouts.get(occupant.camera, default)
+            if minutes and now - occupant.last_seen > minutes * 60:
+                stale.append((occupant.customer_id, occupant.last_seen))
+        return stale
+
+    def counts(self):
+        """Return {camera: occupants last seen there}; None counts those not seen yet"""
+        counts = {}
+        for occupant in self.occupants.values():
+            counts[occupant.camera] = counts.get(occupant.camera, 0) + 1
+        return counts
+
+    def by_entry(self):
+        """Return the occupants, longest in the store first"""
+        return sorted(self.occupants.values(), key=lambda o: (o.entry_ts or 0, o.customer_id))
+
+    def _put(self, customer_id, name, entry_ts, previous, now):
+        if previous is not None and previous.customer_id == customer_id:
+            previous.entry_ts = entry_ts
+            self.occupants[name] = previous
+        else:
+            # A new visit counts as a sighting at check-in
+            self.occupants[name] = Occupant(customer_id, name, entry_ts, now)
+
+
+def exit_timeouts(conn):
+    """Return {camera: minutes} of the exit sweeper, with None for the default"""
+    timeouts = {None: DEFAULT_EXIT_AFTER_MINUTES}
+    rows = conn.execute("SELECT key, value FROM settings WHERE key = ? OR key LIKE ?",
+                        (EXIT_AFTER_SETTING, EXIT_AFTER_SETTING + ':%')).fetchall()
+    for key, value in rows:
+        camera = key.partition(':')[2] or None
+        timeouts[camera] = float(value)
+    return timeouts
+
+
+def set_exit_timeout(conn, minutes, camera=None):
+    key = f"{EXIT_AFTER_SETTING}:{camera}" if camera else EXIT_AFTER_SETTING
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, str(minutes)))
+    conn.commit()
+
+
+def close_visits(conn, visits):
+    """Close the open visits in ``visits``, a list of (customer_id, last seen epoch).
+
+    Each visit's exit time is when its customer was last seen (never
+    before they entered), so dwell times stay accurate.  The visits are
+    loaded into a temp table and closed with one UPDATE; visits closed
+    meanwhile are left alone.  Runs inside the caller's write transaction;
+    returns the number of visits closed.
+    """
+    if not visits:
+        return 0
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS sweep (
+            customer_id INTEGER PRIMARY KEY,
+            last_seen REAL NOT NULL
+        )
+    """)
+    conn.execute("DELETE FROM temp.sweep")
+    conn.executemany("INSERT OR REPLACE INTO temp.sweep (customer_id, last_seen) VALUES (?, ?)", visits)
+    return conn.execute("""
+        UPDATE main.customers
+        SET exit_time = (
+            SELECT datetime(MAX(s.last_seen, COALESCE(customers.entry_ts, 0)), 'unixepoch')
+            FROM temp.sweep s WHERE s.customer_id = customers.customer_id
+        )
+        WHERE customer_id IN (SELECT customer_id FROM temp.sweep) AND exit_time IS NULL
+    """).rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Configure when unseen customers are checked out")
+    parser.add_argument('--db', default='jewelry_shop.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+    exit_after = commands.add_parser('exit-after', help="show or set minutes unseen before a visit is closed")
+    exit_after.add_argument('minutes', type=float, nargs='?', help="0 never closes visits automatically")
+    exit_after.add_argument('--camera', help="set the timeout of one camera zone instead of the default")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        if args.minutes is not None:
+            set_exit_timeout(conn, args.minutes, args.camera)
+        timeouts = exit_timeouts(conn)
+    finally:
+        conn.close()
+    for camera, minutes in sorted(timeouts.items(), key=lambda item: (item[0] is not None, item[0] or '')):
+        print(f"{camera or 'default':<16}{'never' if not minutes else f'{minutes:g} minutes'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+from tkinter import ttk
+
+
+def like_pattern(text):
+    """Return a LIKE pattern matching ``text`` anywhere, for ``ESCAPE '\\'``"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+class KeysetPager:
+    """Reads a query one page at a time using keyset (seek) pagination.
+
+    Every sort order is a tuple of key expressions whose last entry is unique,
+    so a page is fetched with ``WHERE (k1, k2, ...) > (?, ?, ...) LIMIT n``
+    instead of an OFFSET.  With an index on the key expressions each page
+    costs the same no matter how deep into the table it starts.
+    """
+
+    def __init__(self, conn, columns, source, sort_keys, default_sort,
+                 where=None, params=(), search_sql=None, descending=False,
+                 search_param=None):
+        self.conn = conn
+        self.columns = columns
+        self.source = source
+        self.sort_keys = sort_keys
+        self.where = where
+        self.params = tuple(params)
+        self.search_sql = search_sql
+        # Maps the search text to the value bound into search_sql; a LIKE
+        # pattern unless the caller searches some other way (e.g. FTS MATCH)
+        self.search_param = search_param or like_pattern
+        self.sort_column = default_sort
+        self.descending = descending
+        self.search_text = ""
+
+    def order_by(self, column, descending):
+        """Change the server-side sort order"""
+        if column not in self.sort_keys:
+            raise ValueError(f"Column {column!r} is not sortable")
+        self.sort_column = column
+        self.descending = descending
+
+    def filter(self, text):
+        """Restrict rows to those matching the search expression"""
+        self.search_text = text.strip()
+
+    def restrict(self, where=None, params=()):
+        """Replace the fixed WHERE clause, e.g. to toggle a view filter"""
+        self.where = where
+        self.params = tuple(params)
+
+    def fetch(self, key=None, limit=100, backwards=False, inclusive=False):
+        """Return up to ``limit`` (row, key) pairs following (or preceding) ``key``"""
+        keys = self.sort_keys[self.sort_column]
+        # Walking backwards is the same query with the comparison and order flipped
+        descending = self.descending != backwards
+        clauses = []
+        params = []
+        if self.where:
+            clauses.append(self.where)
+            params.extend(self.params)
+        if self.search_text and self.search_sql:
+            param = self.search_param(self.search_text)
+            if param:
+                clauses.append(self.search_sql)
+                params.append(param)
+        if key is not None:
+            op = '<' if descending else '>'
+            if inclusive:
+                op += '='
+            # The bound on the leading key lets SQLite seek into expression indexes
+            clauses.append(f"{keys[0]} {op[0]}= ?")
+            clauses.append(f"({', '.join(keys)}) {op} ({', '.join('?' * len(keys))})")
+            params.append(key[0])
+            params.extend(key)
+
+        direction = 'DESC' if descending else 'ASC'
+        sql = f"SELECT {self.columns}, {', '.join(keys)} FROM {self.source}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(f"({clause})" for clause in clauses)
+        sql += " ORDER BY " + ", ".join(f"{k} {direction}" for k in keys)
+        sql += " LIMIT ?"
+        params.append(limit)
+
+        cursor = self.conn.cursor()
+        cursor.execute(sql, params)
+        width = len(keys)
+        rows = [(row[:-width], row[-width:]) for row in cursor.fetchall()]
+        if backwards:
+            rows.reverse()
+        return rows
+
+
+class ChainedPager:
+    """Pages through several KeysetPagers as if they were one query.
+
+    ``pagers`` share their sort keys and are given in descending key order,
+    with no pager's rows sorting between another's, e.g. the hot tables
+    followed by their archive.  A page is filled from the pager nearest the
+    key first, so later pagers are only queried once the earlier ones run
+    out of rows.  Sorting, searching and filters apply to every pager.
+    """
+
+    def __init__(self, pagers):
+        self.pagers = list(pagers)
+
+    @property
+    def sort_keys(self):
+        return self.pagers[0].sort_keys
+
+    @property
+    def sort_column(self):
+        return self.pagers[0].sort_column
+
+    @property
+    def descending(self):
+        return self.pagers[0].descending
+
+    def order_by(self, column, descending):
+        for pager in self.pagers:
+            pager.order_by(column, descending)
+
+    def filter(self, text):
+        for pager in self.pagers:
+            pager.filter(text)
+
+    def restrict(self, where=None, params=()):
+        for pager in self.pagers:
+            pager.restrict(where, params)
+
+    def fetch(self, key=None, limit=100, backwards=False, inclusive=False):
+        """Return up to ``limit`` (row, key) pairs following (or preceding) ``key``"""
+        descending = self.descending != backwards
+        rows = []
+        for pager in (self.pagers if descending else reversed(self.pagers)):
+            page = pager.fetch(key, limit - len(rows), backwards, inclusive)
+            # Walking backwards, rows of later pagers lie further from the key
+            rows = page + rows if backwards else rows + page
+            if len(rows) >= limit:
+                break
+        return rows
+
+
+class PagedTreeview(ttk.Treeview):
+    """Treeview that holds a sliding window of rows loaded on demand.
+
+    Pages are fetched from a KeysetPager as the view is scrolled towards either
+    end of the loaded window, and rows that fall outside ``max_rows`` are
+    evicted from the opposite end, so memory stays bounded however many rows
+    the query matches.
+
+    ``format_row`` maps one row to (values, tags).  Alternatively
+    ``format_rows`` maps a whole page of rows to a list of them, so views
+    can format columns in bulk.  If ``format_image`` is given it is called
+    with each row and may return an image for the tree column; references
+    are held only while the row is loaded.
+    """
+
+    def __init__(self, master, pager, format_row=None, page_size=100, max_rows=500,
+                 format_image=None, format_rows=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.pager = pager
+        self.format_row = format_row
+        self.format_rows = format_rows or (lambda rows: [format_row(row) for row in rows])
+        self.format_image = format_image
+        self._images = {}
+        self.page_size = page_size
+        self.max_rows = max(max_rows, page_size * 2)
+        self.scrollbar = None
+        self._rows = {}
+        self._keys = {}
+        self._at_start = True
+        self._at_end = False
+        self._loading = False
+        self._search_job = None
+        self.configure(yscrollcommand=self._on_yscroll)
+
+    def attach_scrollbar(self, scrollbar):
+        """Drive ``scrollbar`` from this view"""
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.yview)
+
+    def enable_sorting(self):
+        """Sort in SQL when a sortable heading is clicked"""
+        for column in self.pager.sort_keys:
+            self.heading(column, command=lambda c=column: self.sort_by(c))
+
+    def sort_by(self, column):
+        """Sort by ``column``, toggling the direction on repeated clicks"""
+        descending = not self.pager.descending if column == self.pager.sort_column else False
+        self.pager.order_by(column, descending)
+        self.reload()
+
+    def search(self, text, delay=250):
+        """Filter rows in SQL once typing has paused for ``delay`` ms"""
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+
+        def run():
+            self._search_job = None
+            self.pager.filter(text)
+            self.reload()
+
+        self._search_job = self.after(delay, run)
+
+    def row_for(self, item):
+        """Return the raw query row behind a loaded item"""
+        return self._rows.get(item)
+
+    def reload(self):
+        """Drop the loaded window and read the first page again"""
+        self._clear()
+        self._at_start = True
+        self._at_end = False
+        self._append(self.pager.fetch(limit=self.page_size))
+        self.yview_moveto(0)
+
+    def refresh(self):
+        """Re-read the loaded window in place, keeping the scroll position"""
+        children = self.get_children()
+        if not children:
+            self.reload()
+            return
+        first_key = self._keys[children[0]]
+        position = self.yview()[0]
+        selection = [self._keys[item] for item in self.selection()]
+        self._clear()
+        self._at_end = False
+        limit = max(len(children), self.page_size)
+        self._append(self.pager.fetch(first_key, limit=limit, inclusive=True), limit)
+        self.yview_moveto(position)
+        for item, key in self._keys.items():
+            if key in selection:
+                self.selection_add(item)
+
+    def _clear(self):
+        self.delete(*self.get_children())
+        self._rows.clear()
+        self._keys.clear()
+        self._images.clear()
+
+    def _insert(self, row, key, formatted, index):
+        values, tags = formatted
+        image = self.format_image(row) if self.format_image else None
+        item = self.insert('', index, values=values, tags=tags, image=image or '')
+        if image is not None:
+            self._images[item] = image
+        self._rows[item] = row
+        self._keys[item] = key
+        return item
+
+    def _append(self, rows, limit=None):
+        formatted = self.format_rows([row for row, _ in rows])
+        for (row, key), display in zip(rows, formatted):
+            self._insert(row, key, display, 'end')
+        if len(rows) < (limit or self.page_size):
+            self._at_end = True
+
+    def _on_yscroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if self._loading:
+            return
+        first, last = float(first), float(last)
+        if last > 0.9 and not self._at_end:
+            self.after_idle(self._load_next)
+        elif first < 0.1 and not self._at_start:
+            self.after_idle(self._load_previous)
+
+    def _load_next(self):
+        children = self.get_children()
+        if self._loading or self._at_end or not children:
+            return
+        self._loading = True
+        try:
+            top = self.yview()[0] * len(children)
+            self._append(self.pager.fetch(self._keys[children[-1]], limit=self.page_size))
+            children = self.get_children()
+            excess = len(children) - self.max_rows
+            if excess > 0:
+                self._evict(children[:excess])
+                self._at_start = False
+                top -= excess
+            self.yview_moveto(max(top, 0) / max(len(self.get_children()), 1))
+        finally:
+            self._loading = False
+
+    def _load_previous(self):
+        children = self.get_children()
+        if self._loading or self._at_start or not children:
+            return
+        self._loading = True
+        try:
+            top = self.yview()[0] * len(children)
+            rows = self.pager.fetch(self._keys[children[0]], limit=self.page_size,
+                                    backwards=True)
+            if len(rows) < self.page_size:
+                self._at_start = True
+            formatted = self.format_rows([row for row, _ in rows])
+            for index, ((row, key), display) in enumerate(zip(rows, formatted)):
+                self._insert(row, key, display, index)
+            top += len(rows)
+            children = self.get_children()
+            excess = len(children) - self.max_rows
+            if excess > 0:
+                self._evict(children[-excess:])
+                self._at_end = False
+            self.yview_moveto(top / max(len(self.get_children()), 1))
+        finally:
+            self._loading = False
+
+    def _evict(self, items):
+        self.delete(*items)
+        for item in items:
+            self._rows.pop(item, None)
+            self._keys.pop(item, None)
+            self._images.pop(item, None)
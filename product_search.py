@@ -0,0 +1,86 @@
+import re
+
+# Prefix indexes for 1-3 characters keep type-ahead queries on short input
+# from expanding into a scan of the whole term list
+SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        product_id, product_name, category,
+        content='inventory', content_rowid='rowid',
+        tokenize="unicode61 remove_diacritics 2",
+        prefix='1 2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_insert AFTER INSERT ON inventory BEGIN
+        INSERT INTO product_fts (rowid, product_id, product_name, category)
+        VALUES (new.rowid, new.product_id, new.product_name, new.category);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_delete AFTER DELETE ON inventory BEGIN
+        INSERT INTO product_fts (product_fts, rowid, product_id, product_name, category)
+        VALUES ('delete', old.rowid, old.product_id, old.product_name, old.category);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS inventory_fts_update
+    AFTER UPDATE OF product_id, product_name, category ON inventory BEGIN
+        INSERT INTO product_fts (product_fts, rowid, product_id, product_name, category)
+        VALUES ('delete', old.rowid, old.product_id, old.product_name, old.category);
+        INSERT INTO product_fts (rowid, product_id, product_name, category)
+        VALUES (new.rowid, new.product_id, new.product_name, new.category);
+    END;
+"""
+
+RESULT_COLUMNS = "i.product_id, i.product_name, i.price, i.quantity, i.image_hash"
+
+
+def setup_product_search(conn):
+    """Add the category column and the FTS5 product index to the inventory database.
+
+    The index is an external-content table over ``inventory`` kept in sync
+    by triggers, so only the token lists are stored twice.  It is rebuilt
+    from the table the first time it is created.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(inventory)")
+    if 'category' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE inventory ADD COLUMN category TEXT")
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'product_fts'")
+    exists = cursor.fetchone() is not None
+    conn.executescript(SCHEMA)
+    if not exists:
+        conn.execute("INSERT INTO product_fts (product_fts) VALUES ('rebuild')")
+    conn.commit()
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    words = re.findall(r"\w+", text.lower())
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_products(conn, text, limit=10, in_stock=True):
+    """Return the best ``limit`` products for ``text`` as
+    (product_id, product_name, price, quantity, image_hash) rows.
+
+    Every in-stock match is ranked by bm25, with the id and name weighted
+    above the category, before the limit is applied, so a short prefix
+    still returns the best products and never comes back empty while
+    matching ones are in stock.  Empty input lists products by id.
+    """
+    stock = "AND i.quantity > 0" if in_stock else ""
+    expression = match_expression(text)
+    cursor = conn.cursor()
+    if not expression:
+        cursor.execute(f"""
+            SELECT {RESULT_COLUMNS} FROM inventory i
+            WHERE 1 {stock}
+            ORDER BY i.product_id LIMIT ?
+        """, (limit,))
+    else:
+        cursor.execute(f"""
+            SELECT {RESULT_COLUMNS}
+            FROM product_fts f JOIN inventory i ON i.rowid = f.rowid
+            WHERE product_fts MATCH ? {stock}
+            ORDER BY bm25(product_fts, 10.0, 5.0, 1.0), i.product_id
+            LIMIT ?
+        """, (expression, limit))
+    return cursor.fetchall()
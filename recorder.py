@@ -0,0 +1,256 @@
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from db_pool import connect
+from db_writer import DatabaseWriter
+
+RECORDINGS_DIR = 'recordings'
+INDEX_DB = 'events.db'
+
+# Snapshot and clip names written by _encode: <local time>-<kind>-<random>.<ext>
+FILE_NAME = re.compile(r'^\d{8}-\d{6}-\w+-[0-9a-f]{8}\.(jpg|mp4|avi)$')
+
+INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS events (
+        event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        name TEXT,
+        camera TEXT,
+        ts REAL NOT NULL,
+        snapshot TEXT,
+        clip TEXT,
+        bytes INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+    CREATE INDEX IF NOT EXISTS idx_events_name_ts ON events(name, ts);
+"""
+
+
+class EventRecorder:
+    """Snapshots and short clips around camera events, kept in a size-bounded ring.
+
+    The camera loop hands every annotated frame to ``add_frame``, which only
+    keeps a reference: the last ``pre_seconds`` are held in memory at
+    ``clip_fps``.  ``trigger`` starts an event; the next frame becomes its
+    snapshot and the following ``post_seconds`` complete its clip.  JPEG
+    and video encoding then run on a thread pool.  At most ``max_queue``
+    events wait for encoding; further ones are dropped and counted rather
+    than slowing the camera loop down.
+
+    Files live in ``directory`` with an ``events.db`` index (by time and by
+    name).  Once they take more than ``max_bytes``, the oldest events are
+    deleted.
+    """
+
+    def __init__(self, directory=RECORDINGS_DIR, max_bytes=1024 * 1024 * 1024, pre_seconds=2.0,
+                 post_seconds=3.0, clip_fps=10, cooldown=30.0, workers=2, max_queue=8,
+                 jpeg_quality=85):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.clip_fps = clip_fps
+        self.cooldown = cooldown
+        self.max_queue = max_queue
+        self.jpeg_quality = jpeg_quality
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, INDEX_DB)
+
+        # Camera-thread state: recent frames, events waiting for frames,
+        # and when each (kind, name) last fired
+        self.frames = deque()
+        self.last_kept = 0.0
+        self.triggered = []
+        self.collecting = []
+        self.last_fired = {}
+
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.recorded = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.used_bytes = 0
+        self.reader = None
+
+        self._setup()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Recorder")
+        self.writer = DatabaseWriter(self.index_path, connect=lambda: connect(self.index_path),
+                                     name="RecorderIndex")
+        self.writer.start()
+
+    def trigger(self, kind, name=None, camera=None):
+        """Record an event around the next frame, unless the same one fired within the cooldown"""
+        now = time.time()
+        if now - self.last_fired.get((kind, name), 0) < self.cooldown:
+            return False
+        self.last_fired[(kind, name)] = now
+        self.triggered.append({'kind': kind, 'name': name, 'camera': camera, 'ts': now})
+        return True
+
+    def add_frame(self, frame, now=None):
+        """Offer the latest annotated frame; cheap enough for every camera frame"""
+        now = time.time() if now is None else now
+        for event in self.triggered:
+            event['snapshot'] = frame
+            event['frames'] = list(self.frames)
+            event['until'] = now + self.post_seconds
+            self.collecting.append(event)
+        self.triggered = []
+
+        if now - self.last_kept < 1.0 / self.clip_fps:
+            return
+        self.last_kept = now
+        self.frames.append(frame)
+        while len(self.frames) > self.pre_seconds * self.clip_fps:
+            self.frames.popleft()
+        if self.collecting:
+            for event in self.collecting:
+                event['frames'].append(frame)
+            while self.collecting and self.collecting[0]['until'] <= now:
+                self._submit(self.collecting.pop(0))
+
+    def stats(self):
+        with self.lock:
+            return {'queued': self.queued, 'recorded': self.recorded, 'dropped': self.dropped,
+                    'evicted': self.evicted, 'bytes': self.used_bytes}
+
+    def find(self, name=None, since=None, until=None, limit=200):
+        """Return the newest events as (event_id, kind, name, camera, ts, snapshot, clip, bytes).
+
+        ``name`` filters to one person; ``since`` and ``until`` bound the
+        time in epoch seconds.  Paths are relative to the recordings directory.
+        """
+        if self.reader is None:
+            self.reader = connect(self.index_path, readonly=True)
+        where = ["ts >= ?", "ts < ?"]
+        params = [since or 0, until or float('inf')]
+        if name is not None:
+            where.insert(0, "name = ?")
+            params.insert(0, name)
+        return self.reader.execute(f"""
+            SELECT event_id, kind, name, camera, ts, snapshot, clip, bytes
+            FROM events WHERE {' AND '.join(where)}
+            ORDER BY ts DESC LIMIT ?
+        """, params + [limit]).fetchall()
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename) if filename else None
+
+    def close(self):
+        """Encode events still collecting frames with what they have, then stop"""
+        for event in self.collecting:
+            self._submit(event)
+        self.collecting = []
+        self.executor.shutdown(wait=True)
+        self.writer.close()
+        if self.reader is not None:
+            self.reader.close()
+
+    def _submit(self, event):
+        with self.lock:
+            if self.queued >= self.max_queue:
+                self.dropped += 1
+                return
+            self.queued += 1
+        self.executor.submit(self._encode, event)
+
+    def _encode(self, event):
+        try:
+            stem = (time.strftime('%Y%m%d-%H%M%S', time.localtime(event['ts']))
+                    + f"-{event['kind']}-{uuid.uuid4().hex[:8]}")
+            snapshot = stem + '.jpg'
+            ok, jpeg = cv2.imencode('.jpg', event['snapshot'], [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                raise RuntimeError("JPEG encoding failed")
+            with open(self.path(snapshot), 'wb') as f:
+                f.write(jpeg.tobytes())
+            clip = self._write_clip(stem, event['frames'] or [event['snapshot']])
+            size = sum(os.path.getsize(self.path(name)) for name in (snapshot, clip) if name)
+            self.writer.submit(self._index, event, snapshot, clip, size).add_done_callback(self._indexed)
+        except Exception as e:
+            print(f"Recorder error: {e}")
+            with self.lock:
+                self.dropped += 1
+        finally:
+            with self.lock:
+                self.queued -= 1
+
+    def _write_clip(self, stem, frames):
+        """Write ``frames`` as MP4, or as MJPEG AVI where no MP4 encoder is available"""
+        height, width = frames[0].shape[:2]
+        for extension, codec in (('.mp4', 'mp4v'), ('.avi', 'MJPG')):
+            clip = stem + extension
+            writer = cv2.VideoWriter(self.path(clip), cv2.VideoWriter_fourcc(*codec),
+                                     self.clip_fps, (width, height))
+            if writer.isOpened():
+                try:
+                    for frame in frames:
+                        writer.write(frame)
+                finally:
+                    writer.release()
+                return clip
+            writer.release()
+        return None
+
+    def _setup(self):
+        """Create the index, then drop recordings it does not know (left by a crash)"""
+        conn = connect(self.index_path)
+        try:
+            conn.executescript(INDEX_SCHEMA)
+            known = {INDEX_DB, INDEX_DB + '-wal', INDEX_DB + '-shm'}
+            for snapshot, clip in conn.execute("SELECT snapshot, clip FROM events"):
+                known.update((snapshot, clip))
+            for filename in os.listdir(self.directory):
+                if filename not in known and FILE_NAME.match(filename) and os.path.isfile(self.path(filename)):
+                    os.remove(self.path(filename))
+            self.used_bytes = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM events").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _index(self, conn, event, snapshot, clip, size):
+        """Index a written event and drop the oldest ones beyond the size bound.
+
+        Returns (bytes used, files of dropped events); the files are only
+        deleted by _indexed once this has committed.
+        """
+        conn.execute("""
+            INSERT INTO events (kind, name, camera, ts, snapshot, clip, bytes)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (event['kind'], event['name'], event['camera'], event['ts'], snapshot, clip, size))
+        used = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM events").fetchone()[0]
+        evicted = []
+        while used > self.max_bytes:
+            oldest = conn.execute("""
+                SELECT event_id, snapshot, clip, bytes FROM events ORDER BY event_id LIMIT 16
+            """).fetchall()
+            for event_id, old_snapshot, old_clip, old_size in oldest:
+                if used <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM events WHERE event_id = ?", (event_id,))
+                evicted.append((old_snapshot, old_clip))
+                used -= old_size
+        return used, evicted
+
+    def _indexed(self, future):
+        """Delete the files of evicted events once the index no longer names them"""
+        if future.exception() is not None:
+            print(f"Recorder index error: {future.exception()}")
+            with self.lock:
+                self.dropped += 1
+            return
+        used, evicted = future.result()
+        for files in evicted:
+            for filename in files:
+                if filename and os.path.exists(self.path(filename)):
+                    os.remove(self.path(filename))
+        with self.lock:
+            self.used_bytes = used
+            self.recorded += 1
+            self.evicted += len(evicted)
@@ -0,0 +1,277 @@
+import argparse
+import time
+
+from analytics import rollups_held, setup_analytics, subtract_from_rollups
+from db_pool import connect
+from db_writer import DatabaseWriter
+from sync import changes_held
+
+# Schema name the archive database is ATTACHed under on shop connections
+ARCHIVE_SCHEMA = 'archive'
+ARCHIVE_DB = 'jewelry_archive.db'
+ARCHIVED_TABLES = ('customers', 'purchases')
+
+# Visits that entered longer ago than this are moved to the archive; the
+# shop's own value is kept under this key in the settings table
+DEFAULT_HORIZON_DAYS = 365
+HORIZON_SETTING = 'retention_days'
+
+SCHEMA = """
+    -- Visits per customer name that now live in the archive, so visit
+    -- numbers keep counting from the customer's real total
+    CREATE TABLE IF NOT EXISTS archived_visits (
+        name TEXT PRIMARY KEY,
+        visits INTEGER NOT NULL DEFAULT 0
+    );
+"""
+
+ARCHIVE_INDEXES = f"""
+    DROP INDEX IF EXISTS {ARCHIVE_SCHEMA}.idx_archive_customers_name_entry_ts;
+    CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_customers_name_entry_key
+        ON customers(name, COALESCE(entry_ts, 0), customer_id);
+    CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_purchases_customer
+        ON purchases(customer_id, purchase_id);
+"""
+
+# PRAGMA auto_vacuum value of a database that frees pages with incremental_vacuum
+INCREMENTAL = 2
+
+
+def total_visits_sql(name):
+    """SQL for the number of visits of customer ``name``, archived ones included"""
+    return (f"((SELECT COUNT(*) FROM main.customers WHERE name = {name})"
+            f" + COALESCE((SELECT visits FROM main.archived_visits WHERE name = {name}), 0))")
+
+
+def setup_retention(conn):
+    """Create the archive tables and the visit totals they need.
+
+    ``conn`` is a shop connection with the archive ATTACHed as
+    ARCHIVE_SCHEMA.  Archive tables mirror the columns of the hot ones and
+    pick up columns added to those later.  A new archive database is
+    created with incremental auto-vacuum, so it can be compacted online.
+    Like setup_analytics, which it also runs, it needs setup_checkout_tables first.
+    """
+    conn.executescript(SCHEMA)
+    cursor = conn.cursor()
+    for table in ARCHIVED_TABLES:
+        cursor.execute(f"PRAGMA main.table_info({table})")
+        columns = cursor.fetchall()
+        cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.table_info({table})")
+        archived = {col[1] for col in cursor.fetchall()}
+        if not archived:
+            cursor.execute(f"SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.sqlite_master")
+            if cursor.fetchone()[0] == 0:
+                # Switching needs a VACUUM once the header is written, which
+                # ATTACH's journal_mode pragma already did; it is instant while empty
+                cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.auto_vacuum = INCREMENTAL")
+                cursor.execute(f"VACUUM {ARCHIVE_SCHEMA}")
+            # Ids are copied from the hot table, so they are plain primary keys here
+            definitions = ", ".join(f"{name} {'INTEGER PRIMARY KEY' if pk else col_type}"
+                                    for _, name, col_type, _, _, pk in columns)
+            cursor.execute(f"CREATE TABLE {ARCHIVE_SCHEMA}.{table} ({definitions})")
+        else:
+            for _, name, col_type, _, _, _ in columns:
+                if name not in archived:
+                    cursor.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.{table} ADD COLUMN {name} {col_type}")
+    conn.executescript(ARCHIVE_INDEXES)
+    # Archiving relies on the rollup delete triggers honouring rollups_held()
+    setup_analytics(conn)
+    conn.commit()
+
+
+def horizon_days(conn):
+    """Return the shop's retention horizon in days"""
+    row = conn.execute("SELECT value FROM settings WHERE key = ?", (HORIZON_SETTING,)).fetchone()
+    return int(row[0]) if row else DEFAULT_HORIZON_DAYS
+
+
+def set_horizon_days(conn, days):
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                 (HORIZON_SETTING, str(int(days))))
+    conn.commit()
+
+
+def _columns(conn, table):
+    return ", ".join(col[1] for col in conn.execute(f"PRAGMA main.table_info({table})"))
+
+
+def archive_batch(conn, cutoff, limit=200):
+    """Move up to ``limit`` closed visits that entered before ``cutoff`` to the archive.
+
+    ``cutoff`` is in epoch seconds.  A visit moves together with its
+    purchases.  Each customer's latest visit always stays, so face
+    recognition and the customer list never need the archive.  Rollups and
+    total visit counts are left as they were, and the move is not logged as
+    deletes for other terminals to replay.  Runs inside the caller's
+    write transaction; returns the number of visits moved.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archiving (customer_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.archiving")
+    conn.execute("""
+        INSERT INTO temp.archiving (customer_id)
+        SELECT customer_id FROM main.customers c
+        WHERE entry_ts < ? AND exit_time IS NOT NULL
+          AND customer_id < (SELECT MAX(customer_id) FROM main.customers WHERE name = c.name)
+        ORDER BY entry_ts
+        LIMIT ?
+    """, (cutoff, limit))
+    moved = conn.execute("SELECT COUNT(*) FROM temp.archiving").fetchone()[0]
+    if not moved:
+        return 0
+
+    for table in ARCHIVED_TABLES:
+        columns = _columns(conn, table)
+        conn.execute(f"""
+            INSERT INTO {ARCHIVE_SCHEMA}.{table} ({columns})
+            SELECT {columns} FROM main.{table}
+            WHERE customer_id IN (SELECT customer_id FROM temp.archiving)
+        """)
+    conn.execute("""
+        INSERT INTO main.archived_visits (name, visits)
+        SELECT name, COUNT(*) FROM main.customers
+        WHERE customer_id IN (SELECT customer_id FROM temp.archiving)
+        GROUP BY name
+        ON CONFLICT(name) DO UPDATE SET visits = visits + excluded.visits
+    """)
+    with rollups_held(conn), changes_held(conn):
+        for table in reversed(ARCHIVED_TABLES):
+            conn.execute(f"""
+                DELETE FROM main.{table}
+                WHERE customer_id IN (SELECT customer_id FROM temp.archiving)
+            """)
+    return moved
+
+
+def rename_archived(conn, old_name, new_name):
+    """Carry a customer's name change over to their archived visits"""
+    conn.execute(f"UPDATE {ARCHIVE_SCHEMA}.customers SET name = ? WHERE name = ?", (new_name, old_name))
+    conn.execute("""
+        INSERT INTO main.archived_visits (name, visits)
+        SELECT ?, visits FROM main.archived_visits WHERE name = ?
+        ON CONFLICT(name) DO UPDATE SET visits = visits + excluded.visits
+    """, (new_name, old_name))
+    conn.execute("DELETE FROM main.archived_visits WHERE name = ?", (old_name,))
+
+
+def delete_archived(conn, name):
+    """Delete a customer's archived visits and purchases.
+
+    The archive has no rollup triggers, so the rows are taken out of the
+    rollups here first.  Runs inside the caller's write transaction.
+    """
+    subtract_from_rollups(conn, ARCHIVE_SCHEMA, "c.name = ?", (name,))
+    conn.execute(f"""
+        DELETE FROM {ARCHIVE_SCHEMA}.purchases WHERE customer_id IN (
+            SELECT customer_id FROM {ARCHIVE_SCHEMA}.customers WHERE name = ?
+        )
+    """, (name,))
+    conn.execute(f"DELETE FROM {ARCHIVE_SCHEMA}.customers WHERE name = ?", (name,))
+    conn.execute("DELETE FROM main.archived_visits WHERE name = ?", (name,))
+
+
+def compact_step(conn, pages):
+    """Return up to ``pages`` free pages of the hot database to the filesystem.
+
+    Returns the free pages left, or None if the database was not created
+    with incremental auto-vacuum (see enable_incremental_vacuum).
+    """
+    if conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] != INCREMENTAL:
+        return None
+    # The pragma frees one page per step, and sqlite3 steps statements that
+    # return no columns only once, so it is run once per page
+    for _ in range(pages):
+        conn.execute("PRAGMA main.incremental_vacuum(1)")
+    return conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+
+
+def run_retention(writer, days, batch_size=200, vacuum_pages=256, pause=0.05):
+    """Archive every visit past the horizon, then compact the hot database.
+
+    Work is queued on ``writer`` (a DatabaseWriter whose connection has the
+    archive attached) in batches of ``batch_size`` visits and
+    ``vacuum_pages`` pages, sleeping ``pause`` seconds between them, so
+    check-ins and checkouts queued meanwhile wait for one small batch at
+    most.  Blocks until done, so call it off the Tk thread.  Returns
+    (visits moved, pages freed, seconds taken).
+    """
+    started = time.perf_counter()
+    cutoff = int(time.time()) - int(days * 86400)
+    moved = 0
+    while True:
+        count = writer.submit(archive_batch, cutoff, batch_size).result()
+        moved += count
+        if count < batch_size:
+            break
+        time.sleep(pause)
+
+    freed = 0
+    free = writer.submit(lambda conn: conn.execute("PRAGMA main.freelist_count").fetchone()[0]).result()
+    while free:
+        left = writer.submit(compact_step, vacuum_pages).result()
+        if left is None:
+            print("Hot database is not in incremental auto-vacuum mode; "
+                  "freed pages are reused but not returned (run: python retention.py setup)")
+            break
+        freed += free - left
+        free = left
+        time.sleep(pause)
+    return moved, freed, time.perf_counter() - started
+
+
+def enable_incremental_vacuum(path):
+    """Switch a database to incremental auto-vacuum.
+
+    Needs one full VACUUM, which blocks every other connection while it
+    runs, so do it once with the shop closed.  Later compaction is online.
+    """
+    conn = connect(path)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == INCREMENTAL:
+            print(f"{path} already uses incremental auto-vacuum")
+            return
+        started = time.perf_counter()
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        print(f"Rebuilt {path} with incremental auto-vacuum in {time.perf_counter() - started:.2f}s")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old visits to the archive database")
+    parser.add_argument('--db', default='jewelry_shop.db')
+    parser.add_argument('--archive', default=ARCHIVE_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('setup', help="one-off: enable incremental vacuum (shop must be closed)")
+    run = commands.add_parser('run', help="archive visits past the horizon and compact")
+    run.add_argument('--days', type=float, default=None, help="override the shop's horizon for this run")
+    run.add_argument('--batch-size', type=int, default=200)
+    horizon = commands.add_parser('horizon', help="show or set the shop's horizon in days")
+    horizon.add_argument('days', type=int, nargs='?')
+    args = parser.parse_args()
+
+    if args.command == 'setup':
+        enable_incremental_vacuum(args.db)
+    conn = connect(args.db, attach={ARCHIVE_SCHEMA: args.archive})
+    try:
+        setup_retention(conn)
+        if args.command == 'horizon' and args.days is not None:
+            set_horizon_days(conn, args.days)
+        days = horizon_days(conn)
+    finally:
+        conn.close()
+    if args.command == 'horizon':
+        print(f"Visits older than {days} days are archived")
+    elif args.command == 'run':
+        writer = DatabaseWriter(args.db, connect=lambda: connect(args.db, attach={ARCHIVE_SCHEMA: args.archive}))
+        writer.start()
+        try:
+            moved, freed, elapsed = run_retention(writer, args.days if args.days is not None else days,
+                                                  args.batch_size)
+        finally:
+            writer.close()
+        print(f"Archived {moved} visits and freed {freed} pages in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+from contextlib import contextmanager
+
+from checkout import terminal_id
+from db_pool import connect
+from db_writer import DatabaseWriter
+
+# Columns replicated between terminals.  Row ids are local to each
+# database, so rows are matched by uid and a purchase names its visit's uid.
+SYNCED_COLUMNS = {
+    'customers': ('name', 'face_encoding', 'entry_time', 'exit_time', 'visit_count'),
+    'purchases': ('product_id', 'product_name', 'product_price', 'image_hash',
+                  'purchase_time', 'sale_id', 'quantity'),
+}
+ID_COLUMNS = {'customers': 'customer_id', 'purchases': 'purchase_id'}
+BLOB_COLUMNS = ('face_encoding',)  # base64 in batch files
+
+NEW_UID = "lower(hex(randomblob(16)))"
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+SYNC_DIR_SETTING = 'sync_dir'
+
+# Append-only log of every change to customers and purchases, local or
+# applied from a peer.  An entry only names the row; batches carry the
+# row's state when they are exported.
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        change_id TEXT NOT NULL UNIQUE,
+        origin TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        table_name TEXT NOT NULL,
+        row_uid TEXT NOT NULL,
+        changed_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_change_log_row ON change_log(row_uid, changed_at, origin);
+    -- Holds a row while writes must not be logged; see changes_held()
+    CREATE TABLE IF NOT EXISTS change_hold (held INTEGER);
+    -- Last exported seq for this terminal, last applied batch for each peer
+    CREATE TABLE IF NOT EXISTS sync_state (
+        peer TEXT PRIMARY KEY,
+        position INTEGER NOT NULL DEFAULT 0
+    );
+"""
+
+INSERT_KINDS = {
+    'customers': """CASE WHEN EXISTS (
+        SELECT 1 FROM customers c WHERE c.name = new.name AND c.customer_id <> new.customer_id
+    ) THEN 'check_in' ELSE 'register' END""",
+    'purchases': "'purchase'",
+}
+UPDATE_KINDS = {
+    'customers': "CASE WHEN old.exit_time IS NULL AND new.exit_time IS NOT NULL THEN 'exit' ELSE 'edit' END",
+    'purchases': "'edit'",
+}
+
+
+def _log(kind, table, row_uid):
+    return f"""
+        INSERT INTO change_log (change_id, origin, kind, table_name, row_uid, changed_at)
+        VALUES ({NEW_UID}, (SELECT value FROM settings WHERE key = 'terminal_id'),
+                {kind}, '{table}', {row_uid}, {NOW});
+    """
+
+
+def triggers(table):
+    """Triggers giving new rows a uid and logging every change to ``table``"""
+    hold = "WHEN NOT EXISTS (SELECT 1 FROM change_hold)"
+    return f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_log_insert AFTER INSERT ON {table} {hold} BEGIN
+            UPDATE {table} SET uid = {NEW_UID} WHERE rowid = new.rowid AND uid IS NULL;
+            {_log(INSERT_KINDS[table], table, f"(SELECT uid FROM {table} WHERE rowid = new.rowid)")}
+        END;
+        CREATE TRIGGER IF NOT EXISTS {table}_log_update
+        AFTER UPDATE OF {', '.join(SYNCED_COLUMNS[table])}, customer_id ON {table} {hold} BEGIN
+            {_log(UPDATE_KINDS[table], table, 'new.uid')}
+        END;
+        CREATE TRIGGER IF NOT EXISTS {table}_log_delete AFTER DELETE ON {table} {hold} BEGIN
+            {_log("'delete'", table, 'old.uid')}
+        END;
+    """
+
+
+@contextmanager
+def changes_held(conn):
+    """Keep writes made inside the block out of the change log.
+
+    Used when applying a peer's changes, which are logged as they arrived,
+    and when rows only move to the archive.  Run it inside the caller's
+    write transaction.
+    """
+    conn.execute("INSERT INTO change_hold (held) VALUES (1)")
+    try:
+        yield
+    finally:
+        conn.execute("DELETE FROM change_hold")
+
+
+def _schemas(conn):
+    """Attached schemas holding customer rows: main, and the archive if attached"""
+    schemas = []
+    for _, schema, _ in conn.execute("PRAGMA database_list").fetchall():
+        if schema != 'temp' and conn.execute(
+                f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'customers'").fetchone():
+            schemas.append(schema)
+    return schemas
+
+
+def setup_sync(conn):
+    """Give every visit and purchase a uid and start logging changes.
+
+    Needs the settings table and terminal id from setup_checkout_tables,
+    and runs after setup_retention so archived rows get uids too.  The
+    first time, every hot row is logged as a 'snapshot' so peers receive
+    the existing history.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM main.sqlite_master WHERE name = 'change_log'")
+    seed = cursor.fetchone() is None
+    conn.executescript(SCHEMA)
+    for schema in _schemas(conn):
+        for table in SYNCED_COLUMNS:
+            cursor.execute(f"PRAGMA {schema}.table_info({table})")
+            if 'uid' not in [col[1] for col in cursor.fetchall()]:
+                cursor.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN uid TEXT")
+            cursor.execute(f"UPDATE {schema}.{table} SET uid = {NEW_UID} WHERE uid IS NULL")
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {schema}.idx_{table}_uid ON {table}(uid)")
+    for table in SYNCED_COLUMNS:
+        conn.executescript(triggers(table))
+    if seed:
+        origin = terminal_id(conn)
+        for table, id_column in ID_COLUMNS.items():
+            cursor.execute(f"""
+                INSERT INTO change_log (change_id, origin, kind, table_name, row_uid, changed_at)
+                SELECT {NEW_UID}, ?, 'snapshot', '{table}', uid, {NOW}
+                FROM main.{table} ORDER BY {id_column}
+            """, (origin,))
+    conn.commit()
+
+
+def _find(conn, table, uid, schemas):
+    """Return (schema, local id) of the row with ``uid``, or (None, None)"""
+    for schema in schemas:
+        row = conn.execute(f"SELECT {ID_COLUMNS[table]} FROM {schema}.{table} WHERE uid = ?",
+                           (uid,)).fetchone()
+        if row:
+            return schema, row[0]
+    return None, None
+
+
+def _row_state(conn, table, uid, schemas):
+    """Return the synced columns of a row as JSON-ready values, or None if it is gone"""
+    columns = list(SYNCED_COLUMNS[table])
+    for schema in schemas:
+        select = ", ".join(columns)
+        if table == 'purchases':
+            select += f", (SELECT c.uid FROM {schema}.customers c WHERE c.customer_id = t.customer_id)"
+        row = conn.execute(f"SELECT {select} FROM {schema}.{table} t WHERE uid = ?", (uid,)).fetchone()
+        if row:
+            state = dict(zip(columns + ['customer_uid'], row))
+            for column in BLOB_COLUMNS:
+                if state.get(column) is not None:
+                    state[column] = base64.b64encode(state[column]).decode('ascii')
+            return state
+    return None
+
+
+def export_changes(conn, sync_dir, limit=100):
+    """Write change-log entries after this terminal's watermark to its outbox.
+
+    Batches go to ``sync_dir/<terminal id>/<last seq>.json.gz`` and hold
+    peers' changes as well as local ones, so changes also travel through
+    intermediate terminals.  Each entry carries the row's current state.
+    Runs inside the caller's write transaction, which also moves the
+    watermark; returns the number of entries exported.
+    """
+    origin = terminal_id(conn)
+    row = conn.execute("SELECT position FROM sync_state WHERE peer = ?", (origin,)).fetchone()
+    position = row[0] if row else 0
+    entries = conn.execute("""
+        SELECT seq, change_id, origin, kind, table_name, row_uid, changed_at
+        FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?
+    """, (position, limit)).fetchall()
+    if not entries:
+        return 0
+
+    schemas = _schemas(conn)
+    changes = []
+    for seq, change_id, change_origin, kind, table, row_uid, changed_at in entries:
+        changes.append({
+            'change_id': change_id,
+            'origin': change_origin,
+            'kind': kind,
+            'table': table,
+            'row_uid': row_uid,
+            'changed_at': changed_at,
+            'row': None if kind == 'delete' else _row_state(conn, table, row_uid, schemas),
+        })
+    last_seq = entries[-1][0]
+    outbox = os.path.join(sync_dir, origin)
+    os.makedirs(outbox, exist_ok=True)
+    path = os.path.join(outbox, f"{last_seq:012d}.json.gz")
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        json.dump({'origin': origin, 'changes': changes}, f)
+    os.replace(path + '.tmp', path)
+    conn.execute("""
+        INSERT INTO sync_state (peer, position) VALUES (?, ?)
+        ON CONFLICT(peer) DO UPDATE SET position = excluded.position
+    """, (origin, last_seq))
+    return len(changes)
+
+
+def _write_row(conn, table, uid, state, schemas):
+    schema, local_id = _find(conn, table, uid, schemas)
+    values = dict(state)
+    for column in BLOB_COLUMNS:
+        if values.get(column) is not None:
+            values[column] = base64.b64decode(values[column])
+    columns = list(SYNCED_COLUMNS[table])
+    if table == 'purchases':
+        _, values['customer_id'] = _find(conn, 'customers', values.pop('customer_uid', None), schemas)
+        columns.append('customer_id')
+    params = [values.get(column) for column in columns]
+    if schema is None:
+        conn.execute(f"""
+            INSERT INTO main.{table} ({', '.join(columns)}, uid)
+            VALUES ({', '.join('?' * len(columns))}, ?)
+        """, params + [uid])
+    else:
+        conn.execute(f"""
+            UPDATE {schema}.{table} SET {', '.join(f'{column} = ?' for column in columns)}
+            WHERE {ID_COLUMNS[table]} = ?
+        """, params + [local_id])
+
+
+def apply_changes(conn, changes, peer=None, position=None):
+    """Apply a batch of peer changes; returns how many changed a row here.
+
+    A change already in the log is skipped, so batches can arrive more than
+    once and through any route.  Otherwise it is logged, and applied only
+    if it is at least as new as the row's latest logged change by
+    (changed_at, origin): last writer wins.  ``peer`` and ``position``
+    record the batch as applied in the same transaction.  Runs inside the
+    caller's write transaction.
+    """
+    schemas = _schemas(conn)
+    applied = 0
+    with changes_held(conn):
+        for change in changes:
+            if conn.execute("SELECT 1 FROM change_log WHERE change_id = ?",
+                            (change['change_id'],)).fetchone():
+                continue
+            latest = conn.execute("""
+                SELECT changed_at, origin FROM change_log WHERE row_uid = ?
+                ORDER BY changed_at DESC, origin DESC LIMIT 1
+            """, (change['row_uid'],)).fetchone()
+            conn.execute("""
+                INSERT INTO change_log (change_id, origin, kind, table_name, row_uid, changed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (change['change_id'], change['origin'], change['kind'], change['table'],
+                  change['row_uid'], change['changed_at']))
+            if latest is not None and (change['changed_at'], change['origin']) < tuple(latest):
+                continue
+            table = change['table']
+            if change['kind'] == 'delete':
+                schema, local_id = _find(conn, table, change['row_uid'], schemas)
+                if schema is not None:
+                    conn.execute(f"DELETE FROM {schema}.{table} WHERE {ID_COLUMNS[table]} = ?", (local_id,))
+                    applied += 1
+            elif change['row'] is not None:
+                _write_row(conn, table, change['row_uid'], change['row'], schemas)
+                applied += 1
+    if peer is not None:
+        conn.execute("""
+            INSERT INTO sync_state (peer, position) VALUES (?, ?)
+            ON CONFLICT(peer) DO UPDATE SET position = excluded.position
+        """, (peer, position))
+    return applied
+
+
+def pending_batches(conn, sync_dir):
+    """Return (peer, position, path) of every peer batch not yet applied, oldest first"""
+    origin = terminal_id(conn)
+    positions = dict(conn.execute("SELECT peer, position FROM sync_state").fetchall())
+    batches = []
+    for peer in sorted(os.listdir(sync_dir)) if os.path.isdir(sync_dir) else []:
+        outbox = os.path.join(sync_dir, peer)
+        if peer == origin or not os.path.isdir(outbox):
+            continue
+        for filename in sorted(os.listdir(outbox)):
+            if filename.endswith('.json.gz'):
+                position = int(filename.split('.')[0])
+                if position > positions.get(peer, 0):
+                    batches.append((peer, position, os.path.join(outbox, filename)))
+    return batches
+
+
+def sync_once(writer, sync_dir):
+    """Export local changes, then apply every new peer batch, through ``writer``.
+
+    Each export batch and each applied peer batch is one queued write, so
+    the camera loop and checkout are never held up by a whole sync.  Blocks
+    until done, so call it off the Tk thread.  Returns (exported, applied).
+    """
+    exported = 0
+    while True:
+        count = writer.submit(export_changes, sync_dir).result()
+        exported += count
+        if not count:
+            break
+    applied = 0
+    for peer, position, path in writer.submit(pending_batches, sync_dir).result():
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            changes = json.load(f)['changes']
+        applied += writer.submit(apply_changes, changes, peer, position).result()
+    return exported, applied
+
+
+def sync_dir(conn):
+    """Return the shared sync directory configured for this terminal, or None"""
+    row = conn.execute("SELECT value FROM settings WHERE key = ?", (SYNC_DIR_SETTING,)).fetchone()
+    return row[0] if row else None
+
+
+def main():
+    # retention archives through changes_held, so it is imported here, not at the top
+    from retention import ARCHIVE_DB, ARCHIVE_SCHEMA
+
+    parser = argparse.ArgumentParser(description="Replicate visits and purchases between terminals")
+    parser.add_argument('--db', default='jewelry_shop.db')
+    parser.add_argument('--archive', default=ARCHIVE_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+    configure = commands.add_parser('dir', help="show or set the shared sync directory")
+    configure.add_argument('path', nargs='?')
+    commands.add_parser('run', help="exchange changes once through the sync directory")
+    commands.add_parser('status', help="show the change log and peer positions")
+    args = parser.parse_args()
+
+    attach = {ARCHIVE_SCHEMA: args.archive} if os.path.exists(args.archive) else None
+    conn = connect(args.db, attach=attach)
+    try:
+        setup_sync(conn)
+        if args.command == 'dir' and args.path:
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                         (SYNC_DIR_SETTING, os.path.abspath(args.path)))
+            # A new directory starts empty, so the whole log is exported to it again
+            conn.execute("DELETE FROM sync_state WHERE peer = ?", (terminal_id(conn),))
+            conn.commit()
+        directory = sync_dir(conn)
+        if args.command == 'status':
+            print(f"Terminal {terminal_id(conn)}, sync directory {directory}")
+            for kind, count in conn.execute("SELECT kind, COUNT(*) FROM change_log GROUP BY kind"):
+                print(f"  {kind:<10}{count:>8}")
+            for peer, position in conn.execute("SELECT peer, position FROM sync_state"):
+                print(f"  {peer}: {position}")
+    finally:
+        conn.close()
+    if args.command == 'dir':
+        print(directory or "No sync directory configured")
+    elif args.command == 'run':
+        if not directory:
+            raise SystemExit("No sync directory configured; run: python sync.py dir PATH")
+        writer = DatabaseWriter(args.db, connect=lambda: connect(args.db, attach=attach))
+        writer.start()
+        try:
+            exported, applied = sync_once(writer, directory)
+        finally:
+            writer.close()
+        print(f"Exported {exported} changes, applied {applied}")
+
+if __name__ == "__main__":
+    main()
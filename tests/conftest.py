@@ -0,0 +1,95 @@
+import pytest
+
+from analytics import setup_analytics
+from checkout import INVENTORY_SCHEMA, setup_checkout_tables, terminal_id
+from db_pool import connect
+from db_writer import DatabaseWriter
+from retention import ARCHIVE_SCHEMA, setup_retention
+from sync import setup_sync
+from timestamps import setup_epoch_columns
+
+SHOP_SCHEMA = """
+    CREATE TABLE customers (
+        customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        face_encoding BLOB,
+        entry_time DATETIME,
+        exit_time DATETIME,
+        visit_count INTEGER DEFAULT 1
+    );
+    CREATE TABLE purchases (
+        purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER,
+        product_id TEXT,
+        product_name TEXT,
+        product_price REAL,
+        product_image BLOB,
+        image_hash TEXT,
+        purchase_time DATETIME
+    );
+    CREATE INDEX idx_customers_name_id ON customers(name, customer_id);
+    CREATE INDEX idx_purchases_customer ON purchases(customer_id, purchase_id);
+"""
+INVENTORY = """
+    CREATE TABLE inventory (
+        product_id TEXT PRIMARY KEY,
+        product_name TEXT NOT NULL,
+        product_image BLOB,
+        price REAL NOT NULL,
+        quantity INTEGER NOT NULL,
+        image_hash TEXT
+    );
+    INSERT INTO inventory VALUES ('J1', 'Ring', NULL, 100, 5, NULL);
+    INSERT INTO inventory VALUES ('J2', 'Necklace', NULL, 250, 1, NULL);
+"""
+
+
+class Terminal:
+    """One terminal's shop, inventory and archive databases in ``directory``"""
+
+    def __init__(self, directory):
+        self.paths = {name: str(directory / f"{name}.db") for name in ('shop', 'inventory', 'archive')}
+        inventory = connect(self.paths['inventory'])
+        inventory.executescript(INVENTORY)
+        self.conn = self.connect()
+        self.conn.executescript(SHOP_SCHEMA)
+        setup_epoch_columns(self.conn)
+        setup_checkout_tables(self.conn, inventory)
+        inventory.close()
+        self.id = terminal_id(self.conn)
+        self.conn.commit()
+        setup_analytics(self.conn)
+        setup_retention(self.conn)
+        setup_sync(self.conn)
+        self.writer = DatabaseWriter(self.paths['shop'], connect=self.connect)
+        self.writer.start()
+
+    def connect(self):
+        return connect(self.paths['shop'], attach={INVENTORY_SCHEMA: self.paths['inventory'],
+                                                   ARCHIVE_SCHEMA: self.paths['archive']})
+
+    def stock(self, product_id):
+        return self.conn.execute(f"SELECT quantity FROM {INVENTORY_SCHEMA}.inventory WHERE product_id = ?",
+                                 (product_id,)).fetchone()[0]
+
+    def close(self):
+        self.writer.close()
+        self.conn.close()
+
+
+@pytest.fixture
+def terminal(tmp_path):
+    made = Terminal(tmp_path)
+    yield made
+    made.close()
+
+
+@pytest.fixture
+def terminals(tmp_path):
+    made = []
+    for name in ('a', 'b'):
+        (tmp_path / name).mkdir()
+        made.append(Terminal(tmp_path / name))
+    yield made
+    for terminal in made:
+        terminal.close()
@@ -0,0 +1,116 @@
+import time
+
+from analytics import rebuild_rollups
+from retention import ARCHIVE_SCHEMA, archive_batch, delete_archived
+
+ROLLUP_COLUMNS = {
+    'daily_visits': ('day', 'visits, exits, dwell_seconds, buyers'),
+    'hourly_footfall': ('day, hour', 'entries'),
+    'daily_product_sales': ('day, product_id', 'orders, units, ROUND(revenue, 2)'),
+}
+
+
+def rollups(conn):
+    """Every rollup row that counts something, keyed columns first"""
+    result = {}
+    for table, (key, values) in ROLLUP_COLUMNS.items():
+        rows = conn.execute(f"SELECT {key}, {values} FROM {table} ORDER BY {key}").fetchall()
+        width = len(key.split(','))
+        result[table] = [row for row in rows if any(row[width:])]
+    return result
+
+
+def rebuilt(conn, schemas=('main',)):
+    rebuild_rollups(conn, schemas)
+    return rollups(conn)
+
+
+def visit(conn, name, entry_time, exit_time=None):
+    conn.execute("INSERT INTO customers (name, entry_time, exit_time) VALUES (?, ?, ?)",
+                 (name, entry_time, exit_time))
+    return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+
+def purchase(conn, customer_id, product_id, price, quantity, purchase_time):
+    conn.execute("""
+        INSERT INTO purchases (customer_id, product_id, product_name, product_price, quantity, purchase_time)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (customer_id, product_id, product_id.lower(), price, quantity, purchase_time))
+    return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+
+
+def test_deleting_an_archived_customer_takes_them_out_of_the_rollups(terminal):
+    conn = terminal.conn
+    ann = visit(conn, 'Ann', '2020-01-01 10:00:00', '2020-01-01 10:30:00')
+    purchase(conn, ann, 'J1', 100, 2, '2020-01-01 10:20:00')
+    visit(conn, 'Ann', '2020-01-02 11:00:00', '2020-01-02 11:05:00')
+    bob = visit(conn, 'Bob', '2020-01-01 10:40:00', '2020-01-01 11:00:00')
+    purchase(conn, bob, 'J1', 100, 1, '2020-01-01 10:50:00')
+    visit(conn, 'Ann', '2020-01-03 12:00:00', '2020-01-03 12:10:00')
+    visit(conn, 'Bob', '2020-01-03 12:00:00')
+    assert archive_batch(conn, int(time.time())) == 3
+    conn.commit()
+
+    conn.execute("DELETE FROM purchases WHERE customer_id IN (SELECT customer_id FROM customers WHERE name = 'Ann')")
+    conn.execute("DELETE FROM customers WHERE name = 'Ann'")
+    delete_archived(conn, 'Ann')
+    conn.commit()
+
+    kept = rollups(conn)
+    assert kept == rebuilt(conn, ('main', ARCHIVE_SCHEMA))
+    assert kept['daily_product_sales'] == [('2020-01-01', 'J1', 1, 1, 100.0)]
+
+
+def test_triggers_keep_rollups_equal_to_a_rebuild(terminal):
+    conn = terminal.conn
+    ann = visit(conn, 'Ann', '2024-03-01 09:15:00')
+    bob = visit(conn, 'Bob', '2024-03-01 09:45:00', '2024-03-01 10:05:00')
+    cat = visit(conn, 'Cat', '2024-03-02 14:00:00')
+    dan = visit(conn, 'Dan', '2024-03-02 15:00:00', '2024-03-02 15:30:00')
+    ring = purchase(conn, ann, 'J1', 100, 1, '2024-03-01 09:30:00')
+    purchase(conn, ann, 'J2', 250, 1, '2024-03-01 09:31:00')
+    chain = purchase(conn, bob, 'J2', 250, 2, '2024-03-01 10:00:00')
+    gift = purchase(conn, dan, 'J1', 100, 1, '2024-03-02 15:10:00')
+    conn.commit()
+    assert rollups(conn)['daily_visits'] == [('2024-03-01', 2, 1, 1200, 2), ('2024-03-02', 2, 1, 1800, 1)]
+
+    # Close, edit and move visits
+    conn.execute("UPDATE customers SET exit_time = '2024-03-01 10:15:00' WHERE customer_id = ?", (ann,))
+    conn.execute("UPDATE customers SET entry_time = '2024-03-03 11:00:00' WHERE customer_id = ?", (cat,))
+    conn.execute("UPDATE customers SET exit_time = '2024-03-03 11:20:00' WHERE customer_id = ?", (cat,))
+    conn.execute("UPDATE customers SET name = 'Daniel' WHERE customer_id = ?", (dan,))
+    # Edit, move and delete purchases
+    conn.execute("UPDATE purchases SET quantity = 3, product_price = 90 WHERE purchase_id = ?", (ring,))
+    conn.execute("UPDATE purchases SET purchase_time = '2024-03-02 10:00:00' WHERE purchase_id = ?", (chain,))
+    conn.execute("UPDATE purchases SET customer_id = ? WHERE purchase_id = ?", (cat, gift))
+    conn.execute("DELETE FROM purchases WHERE customer_id = ? AND product_id = 'J2'", (ann,))
+    # Delete a visit with its purchases, the way the dashboard does
+    conn.execute("DELETE FROM purchases WHERE customer_id = ?", (bob,))
+    conn.execute("DELETE FROM customers WHERE customer_id = ?", (bob,))
+    conn.commit()
+
+    kept = rollups(conn)
+    assert kept == rebuilt(conn)
+    assert kept['daily_visits'] == [('2024-03-01', 1, 1, 3600, 1), ('2024-03-02', 1, 1, 1800, 0),
+                                    ('2024-03-03', 1, 1, 1200, 1)]
+
+
+def test_archiving_leaves_the_rollups_alone(terminal):
+    conn = terminal.conn
+    for day in ('01', '02', '03'):
+        customer_id = visit(conn, 'Ann', f"2020-01-{day} 10:00:00", f"2020-01-{day} 10:30:00")
+        purchase(conn, customer_id, 'J1', 100, 1, f"2020-01-{day} 10:10:00")
+    conn.commit()
+    before = rollups(conn)
+
+    assert archive_batch(conn, int(time.time())) == 2
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM rollup_hold").fetchone() == (0,)
+    assert rollups(conn) == before
+    assert rebuilt(conn, ('main', ARCHIVE_SCHEMA)) == before
+
+    # Deletes after the hold is released count again
+    conn.execute("DELETE FROM purchases")
+    conn.execute("DELETE FROM customers")
+    conn.commit()
+    assert rollups(conn)['daily_visits'] == [row for row in before['daily_visits'] if row[0] != '2020-01-03']
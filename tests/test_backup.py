@@ -0,0 +1,40 @@
+from backup import backup_all, prune_failed, rotate
+
+
+def touch(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(b"copy")
+
+
+def test_rotate_keeps_only_the_latest_failed_copies(tmp_path):
+    touch(tmp_path,
+          'jewelry_shop-20240101T100000.db.failed',
+          'jewelry_shop-20240102T100000.db.failed',
+          'jewelry_inventory-20240102T100000.db.failed',
+          'jewelry_shop-20240103T100000.db')
+    deleted = rotate(str(tmp_path), keep_daily=1, keep_weekly=1)
+    assert deleted == ['jewelry_shop-20240101T100000.db.failed']
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        'jewelry_inventory-20240102T100000.db.failed',
+        'jewelry_shop-20240102T100000.db.failed',
+        'jewelry_shop-20240103T100000.db',
+    ]
+
+
+def test_prune_failed_leaves_verified_backups_alone(tmp_path):
+    touch(tmp_path,
+          'jewelry_shop-20240101T100000.db',
+          'jewelry_shop-20240102T100000.db.failed',
+          'jewelry_shop-20240103T100000.db.failed')
+    assert prune_failed(str(tmp_path)) == ['jewelry_shop-20240102T100000.db.failed']
+
+
+def test_backup_set_is_verified_and_rotated(terminal, tmp_path):
+    dest = tmp_path / 'backups'
+    dest.mkdir()
+    touch(dest, 'jewelry_shop-20000101T100000.db', 'jewelry_shop-20000101T100000.db.failed')
+    reports = backup_all(str(dest), databases={'main': terminal.paths['shop']}, pause=0,
+                         keep_daily=1, keep_weekly=1)
+    assert [report['ok'] for report in reports] == [True]
+    assert sorted(path.name for path in dest.iterdir()) == sorted(
+        ['jewelry_shop-20000101T100000.db.failed', reports[0]['file'].rsplit('/', 1)[-1]])
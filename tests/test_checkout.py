@@ -0,0 +1,66 @@
+import pytest
+
+from checkout import INVENTORY_SCHEMA, OutOfStockError, checkout, reconcile_sales
+
+
+def sell(terminal, items):
+    def write(conn):
+        conn.execute("INSERT INTO customers (name, entry_time) VALUES ('Ann', datetime('now'))")
+        customer_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return checkout(conn, customer_id, items, terminal.id)
+    return terminal.writer.submit(write).result()
+
+
+def count(terminal, table):
+    return terminal.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_out_of_stock_line_rolls_back_the_whole_checkout(terminal):
+    with pytest.raises(OutOfStockError) as raised:
+        sell(terminal, [('J1', 2), ('J2', 2)])
+    assert raised.value.product_ids == ['J2']
+    assert (terminal.stock('J1'), terminal.stock('J2')) == (5, 1)
+    assert count(terminal, 'customers') == 0
+    for table in ('sales', 'purchases', f"{INVENTORY_SCHEMA}.stock_movements"):
+        assert count(terminal, table) == 0
+
+
+def test_multi_line_cart_takes_each_product_once(terminal):
+    sale_id = sell(terminal, [('J1', 1), ('J2', 1), ('J1', 2)])
+    assert (terminal.stock('J1'), terminal.stock('J2')) == (2, 0)
+    assert terminal.conn.execute("""
+        SELECT product_id, quantity FROM purchases WHERE sale_id = ? ORDER BY product_id
+    """, (sale_id,)).fetchall() == [('J1', 3), ('J2', 1)]
+    assert terminal.conn.execute(f"""
+        SELECT product_id, quantity FROM {INVENTORY_SCHEMA}.stock_movements ORDER BY product_id
+    """).fetchall() == [('J1', 3), ('J2', 1)]
+    assert terminal.conn.execute("SELECT exit_time IS NOT NULL FROM customers").fetchone() == (1,)
+    assert reconcile_sales(terminal.conn, terminal.id) == 0
+
+
+def test_reconcile_takes_stock_for_a_sale_only_the_shop_recorded(terminal):
+    sale_id = sell(terminal, [('J1', 2), ('J2', 1)])
+    # The inventory side of the commit was lost
+    terminal.conn.execute(f"DELETE FROM {INVENTORY_SCHEMA}.stock_movements")
+    terminal.conn.execute(f"UPDATE {INVENTORY_SCHEMA}.inventory SET quantity = quantity + 2 WHERE product_id = 'J1'")
+    terminal.conn.execute(f"UPDATE {INVENTORY_SCHEMA}.inventory SET quantity = quantity + 1 WHERE product_id = 'J2'")
+    terminal.conn.commit()
+
+    assert reconcile_sales(terminal.conn, terminal.id) == 2
+    assert (terminal.stock('J1'), terminal.stock('J2')) == (3, 0)
+    assert terminal.conn.execute(f"""
+        SELECT DISTINCT sale_id FROM {INVENTORY_SCHEMA}.stock_movements
+    """).fetchall() == [(sale_id,)]
+    assert reconcile_sales(terminal.conn, terminal.id) == 0
+
+
+def test_reconcile_returns_stock_of_a_sale_only_the_inventory_recorded(terminal):
+    sell(terminal, [('J1', 2)])
+    # The shop side of the commit was lost
+    terminal.conn.execute("DELETE FROM purchases")
+    terminal.conn.execute("DELETE FROM sales")
+    terminal.conn.commit()
+
+    assert reconcile_sales(terminal.conn, terminal.id) == 1
+    assert terminal.stock('J1') == 5
+    assert count(terminal, f"{INVENTORY_SCHEMA}.stock_movements") == 0
@@ -0,0 +1,48 @@
+import csv
+import gzip
+import time
+
+from export import export_history
+from retention import archive_batch
+
+
+def exported_ids(out_dir, result, table='customers'):
+    if not result[table]:
+        return []
+    path = sorted(out_dir.glob(f"{table}-*.csv.gz"))[-1]
+    with gzip.open(path, 'rt', newline='') as f:
+        return [int(row[f"{table[:-1]}_id"]) for row in csv.DictReader(f)]
+
+
+def test_incremental_export_picks_up_exits_timed_before_the_last_run(terminal, tmp_path):
+    out_dir = tmp_path / 'export'
+    conn = terminal.conn
+    conn.execute("INSERT INTO customers (name, entry_time) VALUES ('Ann', datetime('now', '-2 hours'))")
+    conn.commit()
+    first = export_history(str(out_dir), terminal.paths['shop'], 'csv', archive_path=terminal.paths['archive'])
+    assert exported_ids(out_dir, first) == [1]
+
+    time.sleep(1)  # run names have one-second resolution
+    # The exit sweep closes a visit at its last sighting, before the last export
+    conn.execute("UPDATE customers SET exit_time = datetime('now', '-1 hour') WHERE customer_id = 1")
+    conn.commit()
+    second = export_history(str(out_dir), terminal.paths['shop'], 'csv', archive_path=terminal.paths['archive'])
+    assert exported_ids(out_dir, second) == [1]
+
+
+def test_full_export_includes_archived_visits(terminal, tmp_path):
+    conn = terminal.conn
+    for days in (800, 700):
+        conn.execute("""
+            INSERT INTO customers (name, entry_time, exit_time)
+            VALUES ('Ann', datetime('now', ?), datetime('now', ?))
+        """, (f"-{days} days", f"-{days} days"))
+    conn.execute("INSERT INTO purchases (customer_id, product_id, purchase_time) VALUES (1, 'J1', datetime('now'))")
+    assert archive_batch(conn, int(time.time()) - 365 * 86400) == 1
+    conn.commit()
+
+    out_dir = tmp_path / 'export'
+    result = export_history(str(out_dir), terminal.paths['shop'], 'csv', full=True,
+                            archive_path=terminal.paths['archive'])
+    assert exported_ids(out_dir, result) == [1, 2]
+    assert exported_ids(out_dir, result, 'purchases') == [1]
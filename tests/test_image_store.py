@@ -0,0 +1,83 @@
+import csv
+import io
+
+from PIL import Image
+
+from db_pool import ConnectionPool, connect
+from db_writer import DatabaseWriter
+from image_store import MAX_DIMENSION, ImageStore, normalize_image, warm_thumbnails
+from inventory import create_inventory_table, export_catalogue
+
+
+def jpeg(size, quality):
+    output = io.BytesIO()
+    Image.new('RGB', size, (200, 10, 10)).save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+
+def test_oversized_jpeg_is_downscaled_even_when_small_in_bytes():
+    data = jpeg((2 * MAX_DIMENSION, 2 * MAX_DIMENSION), quality=20)
+    with Image.open(io.BytesIO(normalize_image(data))) as img:
+        assert max(img.size) == MAX_DIMENSION
+
+
+def test_jpeg_within_bounds_keeps_its_size():
+    data = jpeg((800, 600), quality=20)
+    with Image.open(io.BytesIO(normalize_image(data))) as img:
+        assert img.size == (800, 600)
+
+
+def test_thumbnail_is_stored_through_the_writer(tmp_path):
+    path = str(tmp_path / 'inventory.db')
+    conn = connect(path)
+    store = ImageStore(conn)
+    image_hash = store.ingest(jpeg((400, 300), quality=85))
+    conn.commit()
+    writer = DatabaseWriter(path, connect=lambda: connect(path))
+    writer.start()
+    try:
+        assert store.thumbnail(image_hash, 40, writer=writer)
+        assert not conn.in_transaction
+    finally:
+        writer.close()
+    assert conn.execute("SELECT COUNT(*) FROM thumbnails WHERE image_hash = ? AND size = 40",
+                        (image_hash,)).fetchone() == (1,)
+    conn.close()
+
+
+def test_warm_up_queues_thumbnails_on_the_pool_writer(tmp_path):
+    path = str(tmp_path / 'inventory.db')
+    conn = connect(path)
+    image_hash = ImageStore(conn).ingest(jpeg((400, 300), quality=85))
+    conn.execute("DELETE FROM thumbnails")
+    conn.commit()
+    db = ConnectionPool(path).start()
+    try:
+        assert warm_thumbnails(db, sizes=(40, 80)) == 2
+        db.writer.submit(lambda conn: None).result()
+        assert db.writer.metrics()['writes'] >= 2
+    finally:
+        db.close()
+    assert conn.execute("SELECT size FROM thumbnails WHERE image_hash = ? ORDER BY size",
+                        (image_hash,)).fetchall() == [(40,), (80,)]
+    conn.close()
+
+
+def test_export_names_images_after_their_stored_format(tmp_path):
+    db_path = str(tmp_path / 'inventory.db')
+    conn = connect(db_path)
+    create_inventory_table(conn)
+    output = io.BytesIO()
+    Image.new('RGBA', (50, 50), (0, 0, 255, 128)).save(output, format='PNG')
+    image_hash = ImageStore(conn).put(output.getvalue())
+    conn.execute("INSERT INTO inventory (product_id, product_name, price, quantity, image_hash) "
+                 "VALUES ('P1', 'Pendant', 50, 1, ?)", (image_hash,))
+    conn.commit()
+    conn.close()
+
+    path = tmp_path / 'catalogue.csv'
+    export_catalogue(str(path), image_dir=str(tmp_path / 'images'), db_path=db_path)
+    with open(path, newline='') as f:
+        assert [row['image'] for row in csv.DictReader(f)] == [image_hash + '.png']
+    with Image.open(tmp_path / 'images' / (image_hash + '.png')) as img:
+        assert img.format == 'PNG'
@@ -0,0 +1,16 @@
+from inventory import import_catalogue
+
+
+def test_import_reports_rejected_records_by_file_line(tmp_path, capsys):
+    catalogue = tmp_path / 'catalogue.csv'
+    catalogue.write_text("product_id,product_name,price,quantity\n"
+                         "J1,Ring,100,1\n"
+                         "J2,,100,1\n"
+                         "\n"
+                         "J3,Chain,100,1\n"
+                         "J4,Bangle,-5,1\n")
+    imported = import_catalogue(str(catalogue), image_dir=str(tmp_path), db_path=str(tmp_path / 'inventory.db'),
+                                chunk_size=2)
+    assert imported == 2
+    skipped = [line for line in capsys.readouterr().out.splitlines() if line.startswith("Skipping")]
+    assert [line.split(':')[0] for line in skipped] == ["Skipping line 3", "Skipping line 6"]
@@ -0,0 +1,28 @@
+import sqlite3
+
+from inventory import create_inventory_table
+from product_search import search_products
+
+
+def catalogue(rows):
+    conn = sqlite3.connect(':memory:')
+    create_inventory_table(conn)
+    conn.executemany("""
+        INSERT INTO inventory (product_id, product_name, price, quantity, category)
+        VALUES (?, ?, 100, ?, ?)
+    """, rows)
+    return conn
+
+
+def test_short_prefix_finds_in_stock_matches_past_many_sold_out_ones():
+    rows = [(f"J{i:04d}", "Gold Ring", 0, 'Rings') for i in range(300)]
+    rows.append(('J9999', "Gold Ring", 3, 'Rings'))
+    conn = catalogue(rows)
+    assert [row[0] for row in search_products(conn, "ring")] == ['J9999']
+
+
+def test_best_ranked_match_wins_over_earlier_rows():
+    rows = [(f"J{i:04d}", "Silver Bracelet", 1, 'Gold jewellery') for i in range(300)]
+    rows.append(('J9999', "Gold Ring", 1, 'Rings'))
+    conn = catalogue(rows)
+    assert search_products(conn, "gold", limit=3)[0][0] == 'J9999'
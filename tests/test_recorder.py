@@ -0,0 +1,61 @@
+import os
+import time
+
+import numpy as np
+
+from db_pool import connect
+from recorder import EventRecorder
+
+
+def record(recorder, name):
+    frame = np.full((48, 64, 3), 128, dtype=np.uint8)
+    recorder._encode({'kind': 'check_in', 'name': name, 'camera': None, 'ts': time.time(),
+                      'snapshot': frame, 'frames': [frame]})
+    recorder.writer.submit(lambda conn: None).result()
+
+
+def test_startup_only_removes_its_own_orphaned_recordings(tmp_path):
+    (tmp_path / 'notes.txt').write_text("keep me")
+    (tmp_path / 'exports').mkdir()
+    (tmp_path / '20240101-120000-check_in-0123abcd.jpg').write_bytes(b"orphan")
+    EventRecorder(str(tmp_path)).close()
+    assert sorted(name for name in os.listdir(tmp_path) if not name.startswith('events.db')) == \
+        ['exports', 'notes.txt']
+
+
+def test_evicted_files_outlive_a_rolled_back_index(tmp_path):
+    recorder = EventRecorder(str(tmp_path))
+    try:
+        record(recorder, 'Ann')
+        recorder.max_bytes = recorder.stats()['bytes']
+        (snapshot, clip), = recorder.writer.submit(
+            lambda conn: conn.execute("SELECT snapshot, clip FROM events").fetchall()).result()
+    finally:
+        recorder.close()
+
+    conn = connect(recorder.index_path)
+    conn.execute("BEGIN IMMEDIATE")
+    used, evicted = recorder._index(conn, {'kind': 'check_in', 'name': 'Bob', 'camera': None, 'ts': 0},
+                                    None, None, 10)
+    conn.rollback()
+    assert evicted == [(snapshot, clip)]
+    assert os.path.exists(recorder.path(snapshot))
+    assert conn.execute("SELECT snapshot FROM events").fetchall() == [(snapshot,)]
+    conn.close()
+
+
+def test_eviction_deletes_files_once_committed(tmp_path):
+    recorder = EventRecorder(str(tmp_path))
+    try:
+        record(recorder, 'Ann')
+        recorder.max_bytes = recorder.stats()['bytes'] * 3 // 2
+        first = set(os.listdir(tmp_path))
+        record(recorder, 'Bob')
+        rows = recorder.find()
+    finally:
+        recorder.close()
+    assert [row[2] for row in rows] == ['Bob']
+    recordings = {name for name in os.listdir(tmp_path) if not name.startswith('events.db')}
+    assert recordings == {name for name in rows[0][5:7] if name}
+    assert not recordings & first
+    assert recorder.stats()['evicted'] == 1
@@ -0,0 +1,24 @@
+from checkout import checkout, reconcile_sales
+from sync import sync_once
+
+
+def test_reconcile_leaves_stock_of_replicated_sales_alone(terminals, tmp_path):
+    a, b = terminals
+    sync_dir = str(tmp_path / 'sync')
+
+    def sell(conn):
+        conn.execute("INSERT INTO customers (name, entry_time) VALUES ('Ann', datetime('now'))")
+        customer_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return checkout(conn, customer_id, [('J1', 2)], a.id)
+
+    sale_id = a.writer.submit(sell).result()
+    assert a.stock('J1') == 3
+
+    sync_once(a.writer, sync_dir)
+    assert sync_once(b.writer, sync_dir)[1] > 0
+    assert b.conn.execute("SELECT quantity FROM purchases WHERE sale_id = ?", (sale_id,)).fetchone() == (2,)
+
+    assert reconcile_sales(b.conn, b.id) == 0
+    assert b.stock('J1') == 5
+    assert reconcile_sales(a.conn, a.id) == 0
+    assert a.stock('J1') == 3
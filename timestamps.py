@@ -0,0 +1,99 @@
+from datetime import datetime
+
+import numpy as np
+
+# TEXT timestamp columns and the integer epoch column that shadows each one
+EPOCH_COLUMNS = {
+    'customers': (('entry_time', 'entry_ts'), ('exit_time', 'exit_ts')),
+    'purchases': (('purchase_time', 'purchase_ts'),),
+}
+
+# Display text for every minute of the day, indexed by minute, so formatting
+# a whole column is a table lookup plus one string concatenation
+TIME_OF_DAY = np.array([
+    f" {(minute // 60 + 11) % 12 + 1:02d}:{minute % 60:02d} {'AM' if minute < 720 else 'PM'}"
+    for minute in range(1440)
+])
+SHORT_DURATIONS = np.array([f"{minutes} minutes" for minutes in range(60)])
+MINUTES_SECONDS = np.array([f":{second // 60:02d}:{second % 60:02d}" for second in range(3600)])
+
+
+def epoch_sql(column):
+    """SQL converting a stored datetime('now') string to seconds since the epoch"""
+    return f"CAST(strftime('%s', {column}) AS INTEGER)"
+
+
+def setup_epoch_columns(conn):
+    """Add integer epoch columns next to the TEXT timestamps and keep them filled.
+
+    Existing rows are backfilled once; afterwards triggers derive the epoch
+    columns from whatever is written to the TEXT ones, so no write path has
+    to change.  Rows whose text does not parse get NULL.
+    """
+    cursor = conn.cursor()
+    for table, pairs in EPOCH_COLUMNS.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [col[1] for col in cursor.fetchall()]
+        for text_column, epoch_column in pairs:
+            if epoch_column not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {epoch_column} INTEGER")
+
+        assignments = ", ".join(f"{epoch} = {epoch_sql(text)}" for text, epoch in pairs)
+        stale = " OR ".join(f"({text} IS NOT NULL AND {epoch} IS NULL)" for text, epoch in pairs)
+        cursor.execute(f"UPDATE {table} SET {assignments} WHERE {stale}")
+
+        new_assignments = ", ".join(f"{epoch} = {epoch_sql('new.' + text)}" for text, epoch in pairs)
+        cursor.executescript(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_epoch_insert AFTER INSERT ON {table} BEGIN
+                UPDATE {table} SET {new_assignments} WHERE rowid = new.rowid;
+            END;
+            CREATE TRIGGER IF NOT EXISTS {table}_epoch_update
+            AFTER UPDATE OF {', '.join(text for text, _ in pairs)} ON {table} BEGIN
+                UPDATE {table} SET {new_assignments} WHERE rowid = new.rowid;
+            END;
+        """)
+    conn.commit()
+
+
+def format_timestamp(value):
+    """Format a stored DATETIME string for display"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %I:%M %p') if value else "-"
+    except (TypeError, ValueError):
+        return "-"
+
+
+def to_epochs(values):
+    """Return epoch seconds as a float array with NaN for missing values"""
+    return np.fromiter((np.nan if value is None else value for value in values),
+                       dtype=np.float64, count=len(values))
+
+
+def format_epochs(values):
+    """Format a column of epoch seconds like format_timestamp, '-' where missing"""
+    seconds = to_epochs(values)
+    missing = np.isnan(seconds)
+    seconds = np.where(missing, 0, seconds).astype(np.int64)
+    dates = np.datetime_as_string((seconds // 86400).astype('datetime64[D]'))
+    text = np.char.add(dates, TIME_OF_DAY[seconds % 86400 // 60])
+    return np.where(missing, "-", text).tolist()
+
+
+def format_durations(entries, exits):
+    """Format visit lengths for columns of entry and exit epochs.
+
+    Under an hour reads "N minutes", longer visits follow str(timedelta);
+    open visits are "In Progress" and unparseable ones "-".
+    """
+    entry, exit_ = to_epochs(entries), to_epochs(exits)
+    in_progress = np.isnan(exit_)
+    invalid = ~in_progress & (np.isnan(entry) | (exit_ < entry))
+    seconds = np.where(in_progress | invalid, 0, exit_ - entry).astype(np.int64)
+
+    days = seconds // 86400
+    clock = np.char.add((seconds % 86400 // 3600).astype(str), MINUTES_SECONDS[seconds % 3600])
+    day_prefix = np.char.add(days.astype(str), np.where(days == 1, " day, ", " days, "))
+    long_form = np.where(days > 0, np.char.add(day_prefix, clock), clock)
+    text = np.where(seconds < 3600, SHORT_DURATIONS[np.minimum(seconds // 60, 59)], long_form)
+    text = np.where(invalid, "-", text)
+    return np.where(in_progress, "In Progress", text).tolist()